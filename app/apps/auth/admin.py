@@ -6,7 +6,7 @@ from django.urls import reverse
 from django.utils.safestring import mark_safe
 from .models import (
     User, ResourcePermission, UserPermission,
-    GroupResourcePermission, PermissionLog
+    GroupResourcePermission, EffectiveUserPermission, PermissionLog
 )
 
 
@@ -109,13 +109,17 @@ class GroupResourcePermissionAdmin(admin.ModelAdmin):
     This class is responsible for managing group resource permission assignments in the admin interface.
     """
     list_display = ('group', 'resource_permission', 'region_display', 'created_at')
-    list_filter = ('created_at', 'resource_permission__permission_type', 'region')
+    list_filter = ('created_at', 'resource_permission__permission_type', 'region', 'scope_level')
     search_fields = ('group__name', 'resource_permission__name', 'region__name')
     ordering = ('group__name', 'resource_permission__resource_name', 'region__name')
     autocomplete_fields = ['region']
     
     def region_display(self, obj):
-        return obj.region.name if obj.region else "GLOBAL"
+        if obj.region:
+            return obj.region.name
+        if obj.scope_id is not None:
+            return f"{obj.get_scope_level_display()} {obj.scope_id}"
+        return "GLOBAL"
     region_display.short_description = "Region Scope"
     region_display.admin_order_field = "region__name"
     
@@ -123,6 +127,38 @@ class GroupResourcePermissionAdmin(admin.ModelAdmin):
         return super().get_queryset(request).select_related('group', 'resource_permission', 'region')
 
 
+@admin.register(EffectiveUserPermission)
+class EffectiveUserPermissionAdmin(admin.ModelAdmin):
+    """
+    This class is responsible for displaying materialized effective permissions (read-only).
+    Rows are maintained automatically; use the rebuild_effective_permissions command to resync.
+    """
+    list_display = ('user', 'resource_name', 'permission_type', 'scope_display', 'expires_at')
+    list_filter = ('permission_type', 'resource_name', 'scope_level')
+    search_fields = ('user__email', 'user__username', 'resource_name')
+    ordering = ('user__email', 'resource_name', 'permission_type')
+    readonly_fields = ('user', 'resource_name', 'permission_type', 'scope_level', 'scope_id', 'expires_at')
+    
+    def scope_display(self, obj):
+        if obj.scope_id is None:
+            return "GLOBAL"
+        return f"{obj.get_scope_level_display()} {obj.scope_id}"
+    scope_display.short_description = "Scope"
+    scope_display.admin_order_field = "scope_level"
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user')
+
+
 @admin.register(PermissionLog)
 class PermissionLogAdmin(admin.ModelAdmin):
     """
@@ -1,10 +1,10 @@
+from asgiref.sync import iscoroutinefunction
 from django.core.exceptions import PermissionDenied
 from django.shortcuts import redirect
 from django.contrib import messages
-from django.utils import timezone
-from django.db import models
 from functools import wraps
-from .models import UserPermission, GroupResourcePermission
+from apps.cities.hierarchy import geo_hierarchy
+from .permissions import aget_permission_set, get_permission_set
 import logging
 
 logger = logging.getLogger(__name__)
@@ -22,34 +22,7 @@ def check_resource_permission(user, resource_name, permission_type, region=None)
     if user.is_superuser:
         return True
     
-    # Check direct user permissions (not region-scoped)
-    user_perms = user.custom_permissions.filter(
-        resource_permission__resource_name=resource_name,
-        resource_permission__permission_type=permission_type,
-        is_active=True
-    ).filter(
-        models.Q(expires_at__isnull=True) | models.Q(expires_at__gt=timezone.now())
-    )
-    
-    if user_perms.exists():
-        return True
-
-    # Check group permissions
-    user_groups = user.groups.values_list('id', flat=True)
-    
-    group_perms = GroupResourcePermission.objects.filter(
-        group__in=user_groups,
-        resource_permission__resource_name=resource_name,
-        resource_permission__permission_type=permission_type
-    )
-
-    if region:
-        # Filter: global (null) OR matching region
-        group_perms = group_perms.filter(
-            models.Q(region__isnull=True) | models.Q(region=region)
-        )
-
-    return group_perms.exists()
+    return get_permission_set(user).has_permission(resource_name, permission_type, region=region)
 
 
 def get_user_permitted_regions(user, resource_name, permission_type):
@@ -64,83 +37,93 @@ def get_user_permitted_regions(user, resource_name, permission_type):
     if user.is_superuser:
         return None
     
-    # Check direct user permissions (grants global access)
-    user_perms = user.custom_permissions.filter(
-        resource_permission__resource_name=resource_name,
-        resource_permission__permission_type=permission_type,
-        is_active=True
-    ).filter(
-        models.Q(expires_at__isnull=True) | models.Q(expires_at__gt=timezone.now())
-    )
+    return get_permission_set(user).get_permitted_regions(resource_name, permission_type)
+
+
+def get_user_permitted_scopes(user, resource_name, permission_type):
+    """
+    This function is responsible for returning the (level, id) hierarchy nodes the user can access
+    for a resource/permission. Returns None if user has global access (no region restriction).
+    """
+    if not user.is_authenticated:
+        return []
+    
+    # Superusers have global access
+    if user.is_superuser:
+        return None
+    
+    return get_permission_set(user).get_permitted_scopes(resource_name, permission_type)
+
+
+async def acheck_resource_permission(user, resource_name, permission_type, region=None):
+    """
+    This function is responsible for the async counterpart of check_resource_permission().
+    Pass the user from `await request.auser()`; the lazy `request.user` can't load in async code.
+    """
+    if not user.is_authenticated:
+        return False
     
-    if user_perms.exists():
-        return None  # Global access
+    # Superusers have all permissions
+    if user.is_superuser:
+        return True
     
-    user_groups = user.groups.values_list('id', flat=True)
+    if hasattr(region, '_meta'):
+        # Resolving an instance's ancestors needs a current hierarchy snapshot
+        await geo_hierarchy.aget()
     
-    group_perms = GroupResourcePermission.objects.filter(
-        group__in=user_groups,
-        resource_permission__resource_name=resource_name,
-        resource_permission__permission_type=permission_type
-    )
+    permission_set = await aget_permission_set(user)
+    return permission_set.has_permission(resource_name, permission_type, region=region)
+
+
+async def aget_user_permitted_regions(user, resource_name, permission_type):
+    """
+    This function is responsible for the async counterpart of get_user_permitted_regions().
+    """
+    if not user.is_authenticated:
+        return []
     
-    # If any permission has null region, user has global access
-    if group_perms.filter(region__isnull=True).exists():
+    # Superusers have global access
+    if user.is_superuser:
         return None
     
-    # Return specific region IDs
-    return list(group_perms.values_list('region_id', flat=True).distinct())
+    permission_set = await aget_permission_set(user)
+    return permission_set.get_permitted_regions(resource_name, permission_type)
 
 
 def permission_required(resource_name, permission_type='view', raise_exception=True):
     """
     This decorator is responsible for checking resource-based permissions.
     Checks both direct user permissions and group permissions via Django's built-in Group model.
+    Works on both sync and async views; async views are checked without leaving the event loop.
     """
+    def denied(request, authenticated):
+        if not authenticated:
+            if raise_exception:
+                raise PermissionDenied("Authentication required.")
+            return redirect('auth:login')
+        
+        if raise_exception:
+            raise PermissionDenied(f"You don't have {permission_type} permission for {resource_name}.")
+        
+        messages.error(request, f"You don't have {permission_type} permission for {resource_name}.")
+        return redirect('core:main')
+    
     def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def wrapper(request, *args, **kwargs):
+                user = await request.auser()
+                if await acheck_resource_permission(user, resource_name, permission_type):
+                    return await view_func(request, *args, **kwargs)
+                return denied(request, user.is_authenticated)
+            
+            return wrapper
+        
         @wraps(view_func)
         def wrapper(request, *args, **kwargs):
-            if not request.user.is_authenticated:
-                if raise_exception:
-                    raise PermissionDenied("Authentication required.")
-                return redirect('auth:login')
-            
-            # Superusers have all permissions
-            if request.user.is_superuser:
+            if check_resource_permission(request.user, resource_name, permission_type):
                 return view_func(request, *args, **kwargs)
-            
-            # Check direct user permissions
-            user_perms = request.user.custom_permissions.filter(
-                resource_permission__resource_name=resource_name,
-                resource_permission__permission_type=permission_type,
-                is_active=True
-            )
-            
-            # Check if any permission has expired
-            active_user_perms = user_perms.filter(
-                models.Q(expires_at__isnull=True) | models.Q(expires_at__gt=timezone.now())
-            )
-            
-            if active_user_perms.exists():
-                return view_func(request, *args, **kwargs)
-            
-            # Check group permissions via Django's built-in Group model
-            user_groups = request.user.groups.values_list('id', flat=True)
-            
-            group_perms = GroupResourcePermission.objects.filter(
-                group__in=user_groups,
-                resource_permission__resource_name=resource_name,
-                resource_permission__permission_type=permission_type
-            )
-            
-            if group_perms.exists():
-                return view_func(request, *args, **kwargs)
-            
-            if raise_exception:
-                raise PermissionDenied(f"You don't have {permission_type} permission for {resource_name}.")
-            
-            messages.error(request, f"You don't have {permission_type} permission for {resource_name}.")
-            return redirect('core:main')
+            return denied(request, request.user.is_authenticated)
         
         return wrapper
     return decorator
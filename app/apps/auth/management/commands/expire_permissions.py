@@ -0,0 +1,81 @@
+"""
+This management command is responsible for deactivating expired direct user permissions.
+Runs once, or with --watch as the periodic sweep started by scripts/run.sh; permission checks
+compare expires_at themselves, so the sweep only tidies EffectiveUserPermission and the log.
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import models
+from django.utils import timezone
+
+from apps.auth.models import EffectiveUserPermission, UserPermission
+from apps.auth.permissions import expire_user_permissions, watch_expired_permissions
+from apps.cities.models import Municipality
+
+
+class Command(BaseCommand):
+    help = 'Deactivate expired user permissions and log the revocations'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--watch',
+            action='store_true',
+            help='Keep running, sweeping every --interval seconds',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=300,
+            help='Seconds between sweeps in --watch mode (default: 300)',
+        )
+        parser.add_argument(
+            '--explain',
+            action='store_true',
+            help='Print the active-grant plan before and after the sweep, then the plans of the live queries',
+        )
+
+    def handle(self, *args, **options):
+        if options['explain']:
+            self._explain()
+
+        if options['watch']:
+            self.stdout.write(f"Sweeping expired permissions every {options['interval']}s...")
+            watch_expired_permissions(interval=options['interval'], log=self.stdout.write)
+            return
+
+        expired_count = expire_user_permissions()
+        self.stdout.write(self.style.SUCCESS(f'✓ {expired_count} expired permission(s) deactivated'))
+
+    def _explain(self):
+        """
+        Print the before/after comparison of the active-grant lookup: the old is_active + expiry
+        OR predicate next to the is_active-only predicate served by the auth_user_perm_active_idx
+        partial index. Then print the plans of the queries that run now: the sweep, and the two
+        EffectiveUserPermission reads of the request path (the per-user PermissionSet snapshot and
+        the for_user() grant subquery).
+        """
+        user_id = UserPermission.objects.values_list('user_id', flat=True).first() or 0
+        active = UserPermission.objects.filter(user_id=user_id, is_active=True)
+        before = active.filter(
+            models.Q(expires_at__isnull=True) | models.Q(expires_at__gt=timezone.now())
+        )
+
+        self.stdout.write(self.style.WARNING('Before (is_active + expiry OR predicate):'))
+        self.stdout.write(before.explain())
+        self.stdout.write(self.style.WARNING('After (is_active only, partial index):'))
+        self.stdout.write(active.explain())
+
+        sweep = UserPermission.objects.filter(is_active=True, expires_at__lte=timezone.now())
+        user_id = EffectiveUserPermission.objects.values_list('user_id', flat=True).first() or 0
+        snapshot = EffectiveUserPermission.objects.filter(user_id=user_id).values_list(
+            'resource_name', 'permission_type', 'scope_level', 'scope_id', 'expires_at'
+        )
+        user = get_user_model()(pk=user_id)
+        scoped = Municipality.objects.for_user(user, 'view', resource_name='cities.city').values('id')
+
+        self.stdout.write(self.style.WARNING('Sweep (UserPermission, is_active partial index):'))
+        self.stdout.write(sweep.explain())
+        self.stdout.write(self.style.WARNING('PermissionSet.load (EffectiveUserPermission by user):'))
+        self.stdout.write(snapshot.explain())
+        self.stdout.write(self.style.WARNING('for_user() grant subqueries (EffectiveUserPermission):'))
+        self.stdout.write(scoped.explain())
@@ -0,0 +1,30 @@
+"""
+This management command is responsible for rebuilding the materialized EffectiveUserPermission table.
+"""
+from django.core.management.base import BaseCommand
+
+from apps.auth.permissions import rebuild_effective_permissions
+
+
+class Command(BaseCommand):
+    help = 'Rebuild effective user permissions from direct and group grants'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='Only rebuild the given user ID (can be repeated)',
+        )
+
+    def handle(self, *args, **options):
+        user_ids = options.get('user_ids')
+
+        if user_ids:
+            self.stdout.write(f'Rebuilding effective permissions for {len(user_ids)} user(s)...')
+        else:
+            self.stdout.write('Rebuilding effective permissions for all users...')
+
+        row_count = rebuild_effective_permissions(user_ids)
+        self.stdout.write(self.style.SUCCESS(f'✓ {row_count} effective permission rows written'))
@@ -2,6 +2,7 @@
 This middleware is responsible for enforcing authentication across the entire application.
 Only whitelisted URLs are accessible without authentication.
 """
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.shortcuts import redirect
 from django.urls import reverse
 from django.conf import settings
@@ -11,9 +12,16 @@ class LoginRequiredMiddleware:
     """
     Middleware that requires users to be authenticated for all views
     except those explicitly whitelisted.
+    Sync and async capable, so an ASGI deployment runs async views without a thread hop here.
     """
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
         
         # URLs that can be accessed without authentication
         self.whitelist = [
@@ -23,26 +31,23 @@ class LoginRequiredMiddleware:
             '/admin/login/',  # Django admin login
         ]
     
+    def is_public(self, request):
+        # Whitelisted URLs, static and media files, and the login page itself (avoids redirect loops)
+        return request.path in self.whitelist or request.path.startswith(('/static/', '/media/'))
+    
+    def login_redirect(self, request):
+        # Redirect with next parameter to return after login
+        return redirect(f'/auth/login/?next={request.path}')
+    
     def __call__(self, request):
-        # Allow whitelisted URLs
-        if request.path in self.whitelist:
-            return self.get_response(request)
-        
-        # Allow static and media files
-        if request.path.startswith('/static/') or request.path.startswith('/media/'):
-            return self.get_response(request)
+        if self.async_mode:
+            return self.__acall__(request)
         
-        # If user is authenticated, allow access
-        if request.user.is_authenticated:
+        if self.is_public(request) or request.user.is_authenticated:
             return self.get_response(request)
-        
-        # Redirect to login page with next parameter
-        login_url = '/auth/login/'
-        
-        # Avoid redirect loops
-        if request.path == login_url:
-            return self.get_response(request)
-        
-        # Redirect with next parameter to return after login
-        return redirect(f'{login_url}?next={request.path}')
-
+        return self.login_redirect(request)
+    
+    async def __acall__(self, request):
+        if self.is_public(request) or (await request.auser()).is_authenticated:
+            return await self.get_response(request)
+        return self.login_redirect(request)
@@ -0,0 +1,85 @@
+# Generated by Django 5.2.7 on 2026-10-16 19:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def populate_effective_permissions(apps, schema_editor):
+    """
+    This function is responsible for materializing existing direct and group grants.
+    """
+    UserPermission = apps.get_model('custom_auth', 'UserPermission')
+    GroupResourcePermission = apps.get_model('custom_auth', 'GroupResourcePermission')
+    EffectiveUserPermission = apps.get_model('custom_auth', 'EffectiveUserPermission')
+    User = apps.get_model('custom_auth', 'User')
+    Membership = User.groups.through
+
+    grants = {}
+    direct_perms = UserPermission.objects.filter(
+        is_active=True,
+        resource_permission__is_active=True
+    ).filter(
+        models.Q(expires_at__isnull=True) | models.Q(expires_at__gt=timezone.now())
+    ).values_list('user_id', 'resource_permission__resource_name', 'resource_permission__permission_type', 'expires_at')
+    for user_id, resource_name, permission_type, expires_at in direct_perms:
+        key = (user_id, resource_name, permission_type, None)
+        if key in grants and (grants[key] is None or expires_at is None):
+            grants[key] = None
+        else:
+            grants[key] = max(grants[key], expires_at) if key in grants else expires_at
+
+    members = {}
+    for user_id, group_id in Membership.objects.values_list('user_id', 'group_id'):
+        members.setdefault(group_id, []).append(user_id)
+
+    group_perms = GroupResourcePermission.objects.filter(
+        resource_permission__is_active=True
+    ).values_list('group_id', 'resource_permission__resource_name', 'resource_permission__permission_type', 'region_id')
+    for group_id, resource_name, permission_type, region_id in group_perms:
+        for user_id in members.get(group_id, []):
+            grants[(user_id, resource_name, permission_type, region_id)] = None
+
+    EffectiveUserPermission.objects.bulk_create(
+        [
+            EffectiveUserPermission(
+                user_id=user_id,
+                resource_name=resource_name,
+                permission_type=permission_type,
+                region_id=region_id,
+                expires_at=expires_at
+            )
+            for (user_id, resource_name, permission_type, region_id), expires_at in grants.items()
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cities', '0012_update_seaf_category_range'),
+        ('custom_auth', '0003_add_region_to_group_permission'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EffectiveUserPermission',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource_name', models.CharField(max_length=100)),
+                ('permission_type', models.CharField(choices=[('view', 'View'), ('add', 'Add'), ('change', 'Change'), ('delete', 'Delete'), ('download', 'Download'), ('export', 'Export'), ('import', 'Import')], max_length=20)),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+                ('region', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='effective_user_permissions', to='cities.region')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='effective_permissions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Effective User Permission',
+                'verbose_name_plural': 'Effective User Permissions',
+                'db_table': 'auth_effective_user_permission',
+                'indexes': [models.Index(fields=['user', 'resource_name', 'permission_type', 'region', 'expires_at'], name='auth_eff_perm_lookup_idx')],
+            },
+        ),
+        migrations.RunPython(populate_effective_permissions, migrations.RunPython.noop),
+    ]
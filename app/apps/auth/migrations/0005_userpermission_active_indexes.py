@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-16 19:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('custom_auth', '0004_effectiveuserpermission'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userpermission',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['user', 'resource_permission'], name='auth_user_perm_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userpermission',
+            index=models.Index(condition=models.Q(('expires_at__isnull', False), ('is_active', True)), fields=['expires_at'], name='auth_user_perm_expiring_idx'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.7 on 2026-10-16 19:43
+
+from django.db import migrations, models
+
+
+def copy_region_to_scope(apps, schema_editor):
+    """
+    This function is responsible for carrying region-scoped effective rows over to the generic scope columns.
+    """
+    EffectiveUserPermission = apps.get_model('custom_auth', 'EffectiveUserPermission')
+    EffectiveUserPermission.objects.filter(region__isnull=False).update(
+        scope_level='region',
+        scope_id=models.F('region_id')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cities', '0014_geoclosure'),
+        ('custom_auth', '0005_userpermission_active_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='groupresourcepermission',
+            name='scope_id',
+            field=models.PositiveBigIntegerField(blank=True, help_text='ID of the hierarchy node (state, intermediate/immediate region or municipality).', null=True),
+        ),
+        migrations.AddField(
+            model_name='groupresourcepermission',
+            name='scope_level',
+            field=models.CharField(blank=True, choices=[('region', 'Region'), ('state', 'State'), ('intermediateregion', 'Intermediate Region'), ('immediateregion', 'Immediate Region'), ('municipality', 'Municipality')], help_text='Level of the hierarchy node this permission is scoped to, when narrower than a region.', max_length=20),
+        ),
+        migrations.AlterUniqueTogether(
+            name='groupresourcepermission',
+            unique_together={('group', 'resource_permission', 'region', 'scope_level', 'scope_id')},
+        ),
+        migrations.AddField(
+            model_name='effectiveuserpermission',
+            name='scope_id',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='effectiveuserpermission',
+            name='scope_level',
+            field=models.CharField(blank=True, choices=[('region', 'Region'), ('state', 'State'), ('intermediateregion', 'Intermediate Region'), ('immediateregion', 'Immediate Region'), ('municipality', 'Municipality')], max_length=20),
+        ),
+        migrations.RunPython(copy_region_to_scope, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='effectiveuserpermission',
+            name='auth_eff_perm_lookup_idx',
+        ),
+        migrations.RemoveField(
+            model_name='effectiveuserpermission',
+            name='region',
+        ),
+        migrations.AddIndex(
+            model_name='effectiveuserpermission',
+            index=models.Index(fields=['user', 'resource_name', 'permission_type', 'scope_level', 'scope_id', 'expires_at'], name='auth_eff_perm_scope_idx'),
+        ),
+    ]
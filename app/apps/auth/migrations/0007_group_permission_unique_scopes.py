@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-16 20:36
+
+from django.db import migrations, models
+
+
+def remove_duplicate_grants(apps, schema_editor):
+    """
+    This function is responsible for keeping the oldest of grants the old unique_together let
+    through twice (NULL scopes never collided), so the new constraints can be created.
+    """
+    GroupResourcePermission = apps.get_model('custom_auth', 'GroupResourcePermission')
+    # GROUP BY treats NULLs as equal, unlike the unique index did
+    oldest = GroupResourcePermission.objects.values(
+        'group', 'resource_permission', 'region', 'scope_level', 'scope_id'
+    ).annotate(oldest_id=models.Min('id')).values('oldest_id')
+    GroupResourcePermission.objects.exclude(id__in=oldest).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('cities', '0019_seaf_rollup'),
+        ('custom_auth', '0006_permission_scopes'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='groupresourcepermission',
+            unique_together=set(),
+        ),
+        migrations.RunPython(remove_duplicate_grants, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='groupresourcepermission',
+            constraint=models.UniqueConstraint(condition=models.Q(('region__isnull', True), ('scope_id__isnull', True)), fields=('group', 'resource_permission'), name='auth_group_perm_unique_global'),
+        ),
+        migrations.AddConstraint(
+            model_name='groupresourcepermission',
+            constraint=models.UniqueConstraint(condition=models.Q(('region__isnull', False)), fields=('group', 'resource_permission', 'region'), name='auth_group_perm_unique_region'),
+        ),
+        migrations.AddConstraint(
+            model_name='groupresourcepermission',
+            constraint=models.UniqueConstraint(condition=models.Q(('scope_id__isnull', False)), fields=('group', 'resource_permission', 'scope_level', 'scope_id'), name='auth_group_perm_unique_node'),
+        ),
+    ]
@@ -1,10 +1,10 @@
+from asgiref.sync import sync_to_async
 from django.core.exceptions import PermissionDenied
 from django.shortcuts import redirect
 from django.contrib import messages
 from django.http import JsonResponse
-from django.utils import timezone
-from django.db import models
-from .models import UserPermission, GroupResourcePermission, PermissionLog
+from .models import PermissionLog
+from .permissions import aget_permission_set, get_permission_set
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,6 +13,7 @@ logger = logging.getLogger(__name__)
 class PermissionRequiredMixin:
     """
     Mixin to check if user has required permission for a resource.
+    Views whose handlers are async are checked with the async ORM.
     """
     permission_required = None
     permission_type = 'view'
@@ -21,10 +22,32 @@ class PermissionRequiredMixin:
     redirect_url = None
     
     def dispatch(self, request, *args, **kwargs):
+        if self.view_is_async:
+            return self.adispatch(request, *args, **kwargs)
         if not self.has_permission():
             return self.handle_no_permission()
         return super().dispatch(request, *args, **kwargs)
     
+    async def adispatch(self, request, *args, **kwargs):
+        if self.overrides_sync_permission_check():
+            allowed = await sync_to_async(self.has_permission)()
+        else:
+            allowed = await self.ahas_permission()
+        if not allowed:
+            return self.handle_no_permission()
+        return await super().dispatch(request, *args, **kwargs)
+    
+    @classmethod
+    def overrides_sync_permission_check(cls):
+        """
+        This method is responsible for telling whether a subclass customised has_permission()
+        without a matching ahas_permission(), in which case the async path must run the sync one.
+        """
+        mro = cls.__mro__
+        sync_owner = next(klass for klass in mro if 'has_permission' in vars(klass))
+        async_owner = next(klass for klass in mro if 'ahas_permission' in vars(klass))
+        return mro.index(sync_owner) < mro.index(async_owner)
+    
     def has_permission(self):
         if not self.permission_required and not self.resource_name:
             return True
@@ -42,6 +65,22 @@ class PermissionRequiredMixin:
         
         return False
     
+    async def ahas_permission(self):
+        """
+        This method is responsible for the async counterpart of has_permission().
+        """
+        if not self.permission_required and not self.resource_name:
+            return True
+        
+        user = await self.request.auser()
+        if not user.is_authenticated:
+            return False
+        
+        if self.permission_required:
+            return await user.ahas_perm(self.permission_required)
+        
+        return await self.acheck_resource_permission(self.resource_name, self.permission_type)
+    
     def check_resource_permission(self, resource_name, permission_type, region=None):
         """
         This method is responsible for checking if user has permission for specific resource and action.
@@ -54,78 +93,44 @@ class PermissionRequiredMixin:
         if user.is_superuser:
             return True
         
-        # Check direct user permissions (not region-scoped)
-        user_perms = user.custom_permissions.filter(
-            resource_permission__resource_name=resource_name,
-            resource_permission__permission_type=permission_type,
-            is_active=True
-        )
-        
-        # Check if any permission has expired
-        active_user_perms = user_perms.filter(
-            models.Q(expires_at__isnull=True) | models.Q(expires_at__gt=timezone.now())
-        )
-        
-        if active_user_perms.exists():
+        if get_permission_set(user).has_permission(resource_name, permission_type, region=region):
             logger.debug(f"User {user.email} accessed {resource_name} with {permission_type}")
             return True
 
-        # Check group permissions via Django's built-in Group model
-        user_groups = user.groups.values_list('id', flat=True)
-
-        group_perms = GroupResourcePermission.objects.filter(
-            group__in=user_groups,
-            resource_permission__resource_name=resource_name,
-            resource_permission__permission_type=permission_type
-        )
-
-        if region:
-            # Filter: global (null) OR matching region
-            group_perms = group_perms.filter(
-                models.Q(region__isnull=True) | models.Q(region=region)
-            )
-
-        if group_perms.exists():
-            logger.debug(f"User {user.email} accessed {resource_name} with {permission_type} via group")
-            return True
-
         # Only log access denials to the database for security auditing
         self.log_permission_access(resource_name, permission_type, False)
         return False
     
+    async def acheck_resource_permission(self, resource_name, permission_type, region=None):
+        """
+        This method is responsible for the async counterpart of check_resource_permission().
+        """
+        user = await self.request.auser()
+        
+        if user.is_superuser:
+            return True
+        
+        permission_set = await aget_permission_set(user)
+        if permission_set.has_permission(resource_name, permission_type, region=region):
+            logger.debug(f"User {user.email} accessed {resource_name} with {permission_type}")
+            return True
+
+        await self.alog_permission_access(resource_name, permission_type, False)
+        return False
+    
     def get_user_permitted_regions(self, resource_name, permission_type):
         """
         This method is responsible for returning all regions a user has access to for a resource/permission.
         Returns None if user has global access (no region restriction).
         """
-        user = self.request.user
-        
-        # Check direct user permissions (grants global access)
-        user_perms = user.custom_permissions.filter(
-            resource_permission__resource_name=resource_name,
-            resource_permission__permission_type=permission_type,
-            is_active=True
-        ).filter(
-            models.Q(expires_at__isnull=True) | models.Q(expires_at__gt=timezone.now())
-        )
-        
-        if user_perms.exists():
-            return None  # Global access
-        
-        user_groups = user.groups.values_list('id', flat=True)
-        
-        group_perms = GroupResourcePermission.objects.filter(
-            group__in=user_groups,
-            resource_permission__resource_name=resource_name,
-            resource_permission__permission_type=permission_type
-        )
-        
-        # If any permission has null region, user has global access
-        if group_perms.filter(region__isnull=True).exists():
-            return None
-        
-        # Return specific regions
-        return list(group_perms.values_list('region_id', flat=True).distinct())
+        return get_permission_set(self.request.user).get_permitted_regions(resource_name, permission_type)
+    
+    async def aget_user_permitted_regions(self, resource_name, permission_type):
+        """
+        This method is responsible for the async counterpart of get_user_permitted_regions().
+        """
+        permission_set = await aget_permission_set(await self.request.auser())
+        return permission_set.get_permitted_regions(resource_name, permission_type)
     
     def log_permission_access(self, resource_name, permission_type, granted):
         """
@@ -146,6 +151,23 @@ class PermissionRequiredMixin:
         except Exception as e:
             logger.error(f"Failed to log permission denial: {e}")
     
+    async def alog_permission_access(self, resource_name, permission_type, granted):
+        """
+        This method is responsible for the async counterpart of log_permission_access().
+        """
+        try:
+            if not granted:
+                await PermissionLog.objects.acreate(
+                    user=await self.request.auser(),
+                    action='access_denied',
+                    resource=f"{resource_name}.{permission_type}",
+                    details=f"Access denied for {resource_name}",
+                    ip_address=self.get_client_ip(),
+                    user_agent=self.request.META.get('HTTP_USER_AGENT', '')
+                )
+        except Exception as e:
+            logger.error(f"Failed to log permission denial: {e}")
+    
     def get_client_ip(self):
         """
         Get client IP address from request.
@@ -179,9 +201,6 @@ class DownloadPermissionMixin(PermissionRequiredMixin):
     Mixin specifically for download permissions.
     """
     permission_type = 'download'
-    
-    def has_permission(self):
-        return super().has_permission()
 
 
 class EditPermissionMixin(PermissionRequiredMixin):
@@ -189,9 +208,6 @@ class EditPermissionMixin(PermissionRequiredMixin):
     Mixin specifically for edit permissions.
     """
     permission_type = 'change'
-    
-    def has_permission(self):
-        return super().has_permission()
 
 
 class ViewPermissionMixin(PermissionRequiredMixin):
@@ -199,9 +215,6 @@ class ViewPermissionMixin(PermissionRequiredMixin):
     Mixin specifically for view permissions.
     """
     permission_type = 'view'
-    
-    def has_permission(self):
-        return super().has_permission()
 
 
 
@@ -1,8 +1,11 @@
 from django.contrib.auth.models import AbstractUser, Group
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth.models import Permission
 from django.contrib.contenttypes.models import ContentType
 
+from apps.cities.models import GeoClosure
+
 
 class User(AbstractUser):
     """
@@ -77,6 +80,20 @@ class UserPermission(models.Model):
         verbose_name = 'User Permission'
         verbose_name_plural = 'User Permissions'
         unique_together = ['user', 'resource_permission']
+        indexes = [
+            # Active grants only; expired rows are flipped to inactive by the expire_permissions command
+            models.Index(
+                fields=['user', 'resource_permission'],
+                condition=models.Q(is_active=True),
+                name='auth_user_perm_active_idx'
+            ),
+            # Lets the sweeper find grants due to expire without scanning the table
+            models.Index(
+                fields=['expires_at'],
+                condition=models.Q(is_active=True, expires_at__isnull=False),
+                name='auth_user_perm_expiring_idx'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.user.email} - {self.resource_permission}"
@@ -85,7 +102,8 @@ class UserPermission(models.Model):
 class GroupResourcePermission(models.Model):
     """
     This class is responsible for linking Django's built-in Group model to resource permissions.
-    Optionally scoped to a specific region (null = access to all regions).
+    Optionally scoped to a specific region, or to any node of the geographic hierarchy through
+    scope_level/scope_id (neither set = access to all regions).
     """
     group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='resource_permissions')
     resource_permission = models.ForeignKey(ResourcePermission, on_delete=models.CASCADE)
@@ -97,17 +115,88 @@ class GroupResourcePermission(models.Model):
         related_name='group_permissions',
         help_text="If set, permission applies only to this region. If null, applies to all regions."
     )
+    scope_level = models.CharField(
+        max_length=20,
+        choices=GeoClosure.LEVELS,
+        blank=True,
+        help_text="Level of the hierarchy node this permission is scoped to, when narrower than a region."
+    )
+    scope_id = models.PositiveBigIntegerField(
+        null=True,
+        blank=True,
+        help_text="ID of the hierarchy node (state, intermediate/immediate region or municipality)."
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         db_table = 'auth_group_resource_permission'
         verbose_name = 'Group-Permission Assignment'
         verbose_name_plural = 'Group-Permission Assignments'
-        unique_together = ['group', 'resource_permission', 'region']
+        # One constraint per kind of scope: NULLs never collide in a plain unique constraint,
+        # which would let unscoped and region grants be duplicated
+        constraints = [
+            models.UniqueConstraint(
+                fields=['group', 'resource_permission'],
+                condition=models.Q(region__isnull=True, scope_id__isnull=True),
+                name='auth_group_perm_unique_global',
+            ),
+            models.UniqueConstraint(
+                fields=['group', 'resource_permission', 'region'],
+                condition=models.Q(region__isnull=False),
+                name='auth_group_perm_unique_region',
+            ),
+            models.UniqueConstraint(
+                fields=['group', 'resource_permission', 'scope_level', 'scope_id'],
+                condition=models.Q(scope_id__isnull=False),
+                name='auth_group_perm_unique_node',
+            ),
+        ]
+    
+    def __str__(self):
+        if self.region:
+            scope_str = f" [{self.region.name}]"
+        elif self.scope_id is not None:
+            scope_str = f" [{self.get_scope_level_display()} {self.scope_id}]"
+        else:
+            scope_str = " [ALL]"
+        return f"{self.group.name} - {self.resource_permission}{scope_str}"
+    
+    def clean(self):
+        if bool(self.scope_level) != (self.scope_id is not None):
+            raise ValidationError("Scope level and scope ID must be set together.")
+        if self.region_id and self.scope_id is not None:
+            raise ValidationError("Scope to either a region or a hierarchy node, not both.")
+
+
+class EffectiveUserPermission(models.Model):
+    """
+    This class is responsible for storing the materialized union of a user's direct and group grants.
+    One row per (user, resource, type, scope); the scope is a GeoClosure (level, id) node and a null
+    scope_id means all regions. Rows are rebuilt per user by
+    apps.auth.permissions.rebuild_effective_permissions whenever grants or memberships change.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='effective_permissions')
+    resource_name = models.CharField(max_length=100)
+    permission_type = models.CharField(max_length=20, choices=ResourcePermission.PERMISSION_TYPES)
+    scope_level = models.CharField(max_length=20, choices=GeoClosure.LEVELS, blank=True)
+    scope_id = models.PositiveBigIntegerField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'auth_effective_user_permission'
+        verbose_name = 'Effective User Permission'
+        verbose_name_plural = 'Effective User Permissions'
+        indexes = [
+            # Covers every permission check: lookups never touch the heap
+            models.Index(
+                fields=['user', 'resource_name', 'permission_type', 'scope_level', 'scope_id', 'expires_at'],
+                name='auth_eff_perm_scope_idx'
+            ),
+        ]
     
     def __str__(self):
-        region_str = f" [{self.region.name}]" if self.region else " [ALL]"
-        return f"{self.group.name} - {self.resource_permission}{region_str}"
+        scope_str = f" [{self.scope_level} {self.scope_id}]" if self.scope_id is not None else " [ALL]"
+        return f"{self.user.email} - {self.permission_type} {self.resource_name}{scope_str}"
 
 
 class PermissionLog(models.Model):
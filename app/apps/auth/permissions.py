@@ -0,0 +1,433 @@
+"""
+This module is responsible for maintaining the materialized EffectiveUserPermission table and
+compiling it into an in-memory snapshot that every permission check of a request answers from,
+shared across workers through the Django cache.
+"""
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+from .models import EffectiveUserPermission, UserPermission, GroupResourcePermission, PermissionLog
+
+
+def _merge_expiry(current, expires_at):
+    """
+    Keep the most permissive expiry of two overlapping grants (None never expires).
+    """
+    if current is None or expires_at is None:
+        return None
+    return max(current, expires_at)
+
+
+def compute_effective_permissions(user_ids=None):
+    """
+    This function is responsible for computing effective grants from direct and group grants.
+    Returns {(user_id, resource_name, permission_type, scope): expires_at} for the given users,
+    or for every user when user_ids is None; scope is a (level, id) hierarchy node or None for
+    all regions. Inactive resources and expired grants are skipped.
+    """
+    # Expired grants are deactivated by expire_user_permissions(), so the query only needs
+    # the is_active partial index; stragglers not swept yet are skipped below.
+    now = timezone.now()
+    direct_perms = UserPermission.objects.filter(
+        is_active=True,
+        resource_permission__is_active=True
+    )
+    # One filter() call on group__user, so membership is joined once and shared with the values_list()
+    group_members = {'group__user__isnull': False}
+    if user_ids is not None:
+        direct_perms = direct_perms.filter(user_id__in=user_ids)
+        group_members = {'group__user__in': user_ids}
+    group_perms = GroupResourcePermission.objects.filter(
+        resource_permission__is_active=True,
+        **group_members
+    )
+
+    grants = {}
+    for user_id, resource_name, permission_type, expires_at in direct_perms.values_list(
+        'user_id',
+        'resource_permission__resource_name',
+        'resource_permission__permission_type',
+        'expires_at'
+    ):
+        if expires_at is not None and expires_at <= now:
+            continue
+        key = (user_id, resource_name, permission_type, None)
+        grants[key] = _merge_expiry(grants[key], expires_at) if key in grants else expires_at
+
+    for user_id, resource_name, permission_type, region_id, scope_level, scope_id in group_perms.values_list(
+        'group__user',
+        'resource_permission__resource_name',
+        'resource_permission__permission_type',
+        'region_id',
+        'scope_level',
+        'scope_id'
+    ):
+        if region_id is not None:
+            scope = ('region', region_id)
+        elif scope_id is not None:
+            scope = (scope_level, scope_id)
+        else:
+            scope = None
+        grants[(user_id, resource_name, permission_type, scope)] = None
+
+    return grants
+
+
+def rebuild_effective_permissions(user_ids=None):
+    """
+    This function is responsible for replacing the EffectiveUserPermission rows of the given users
+    (all users when user_ids is None) and invalidating their cached permission sets.
+    Returns the number of rows written.
+    """
+    if user_ids is not None:
+        user_ids = set(user_ids)
+        if not user_ids:
+            return 0
+
+    grants = compute_effective_permissions(user_ids)
+    with transaction.atomic():
+        rows = EffectiveUserPermission.objects.all()
+        if user_ids is not None:
+            rows = rows.filter(user_id__in=user_ids)
+        rows.delete()
+        EffectiveUserPermission.objects.bulk_create(
+            [
+                EffectiveUserPermission(
+                    user_id=user_id,
+                    resource_name=resource_name,
+                    permission_type=permission_type,
+                    scope_level=scope[0] if scope else '',
+                    scope_id=scope[1] if scope else None,
+                    expires_at=expires_at
+                )
+                for (user_id, resource_name, permission_type, scope), expires_at in grants.items()
+            ],
+            batch_size=1000
+        )
+
+    def invalidate():
+        if user_ids is None:
+            permission_cache.bump_global()
+        else:
+            for user_id in user_ids:
+                permission_cache.bump_user(user_id)
+
+    # Invalidate again on commit so a worker reloading in between can't keep pre-commit rows cached
+    invalidate()
+    transaction.on_commit(invalidate)
+    return len(grants)
+
+
+def expire_user_permissions(now=None):
+    """
+    This function is responsible for deactivating direct grants whose expiry has passed,
+    logging each revocation in bulk and dropping them from the effective permissions.
+    Returns the number of grants expired.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        expired = list(
+            UserPermission.objects.select_for_update(of=('self',)).filter(
+                is_active=True,
+                expires_at__lte=now
+            ).values_list(
+                'id',
+                'user_id',
+                'resource_permission__resource_name',
+                'resource_permission__permission_type'
+            )
+        )
+        if not expired:
+            return 0
+
+        UserPermission.objects.filter(id__in=[row[0] for row in expired]).update(is_active=False)
+        PermissionLog.objects.bulk_create(
+            [
+                PermissionLog(
+                    user_id=user_id,
+                    action='revoked',
+                    resource=f"{resource_name}.{permission_type}",
+                    details='Permission expired'
+                )
+                for _, user_id, resource_name, permission_type in expired
+            ],
+            batch_size=1000
+        )
+        rebuild_effective_permissions({row[1] for row in expired})
+
+    return len(expired)
+
+
+def watch_expired_permissions(interval=300, log=None, iterations=None):
+    """
+    This function is responsible for sweeping expired grants every `interval` seconds, so they
+    leave EffectiveUserPermission and are logged as revoked shortly after expiring. Checks never
+    wait on it: every reader compares expires_at at read time. A failed sweep is logged and
+    retried on the next one.
+    """
+    log = log or (lambda message: None)
+    while iterations is None or iterations > 0:
+        try:
+            expired_count = expire_user_permissions()
+            if expired_count:
+                log(f"{expired_count} expired permission(s) deactivated")
+        except Exception as e:
+            log(f"Expired permission sweep failed: {e!r}")
+        if iterations is not None:
+            iterations -= 1
+        time.sleep(interval)
+
+
+class PermissionSet:
+    """
+    This class is responsible for holding the effective resource grants of a single user.
+    Grants are global (scope None) or scoped to a (level, id) hierarchy node, and may expire.
+    """
+
+    def __init__(self, grants=None):
+        # (resource_name, permission_type) -> {scope: expires_at}, scope None meaning all regions
+        self.grants = grants or {}
+
+    @classmethod
+    def load(cls, user):
+        """
+        This method is responsible for building the snapshot with a single index lookup
+        on the user's EffectiveUserPermission rows.
+        """
+        grants = {}
+        # Expiry is checked in memory by _active_regions, keeping this a plain user_id index scan
+        rows = EffectiveUserPermission.objects.filter(
+            user=user
+        ).values_list('resource_name', 'permission_type', 'scope_level', 'scope_id', 'expires_at')
+        for resource_name, permission_type, scope_level, scope_id, expires_at in rows:
+            scope = (scope_level, scope_id) if scope_id is not None else None
+            grants.setdefault((resource_name, permission_type), {})[scope] = expires_at
+
+        return cls(grants)
+
+    @classmethod
+    async def aload(cls, user):
+        """
+        This method is responsible for the async counterpart of load(), iterating the same query
+        with the async ORM so async views never hop to a thread for it.
+        """
+        grants = {}
+        rows = EffectiveUserPermission.objects.filter(
+            user=user
+        ).values_list('resource_name', 'permission_type', 'scope_level', 'scope_id', 'expires_at')
+        async for resource_name, permission_type, scope_level, scope_id, expires_at in rows:
+            scope = (scope_level, scope_id) if scope_id is not None else None
+            grants.setdefault((resource_name, permission_type), {})[scope] = expires_at
+
+        return cls(grants)
+
+    def _active_scopes(self, resource_name, permission_type):
+        """
+        This method is responsible for returning the scopes whose grant is still unexpired.
+        Expiry is re-checked at call time so cached snapshots never outlive a grant.
+        """
+        now = timezone.now()
+        return {
+            scope
+            for scope, expires_at in self.grants.get((resource_name, permission_type), {}).items()
+            if expires_at is None or expires_at > now
+        }
+
+    @staticmethod
+    def _path_for(region):
+        """
+        This method is responsible for listing the hierarchy nodes a check target sits under:
+        a region ID, or any Region/State/.../Municipality instance.
+        """
+        if not hasattr(region, '_meta'):
+            return [('region', region)]
+        if region._meta.model_name == 'region':
+            return [('region', region.pk)]
+
+        from apps.cities.hierarchy import geo_hierarchy
+
+        return geo_hierarchy.lookup(lambda hierarchy: hierarchy.path_for(region), default=[])
+
+    def has_permission(self, resource_name, permission_type, region=None):
+        """
+        This method is responsible for checking a resource/action, optionally within a region.
+        `region` may be a region ID or any hierarchy instance; a grant on the instance or on any
+        of its ancestors covers it. Without a region, any grant (global or scoped) is enough.
+        """
+        scopes = self._active_scopes(resource_name, permission_type)
+        if not scopes:
+            return False
+        if region is None or None in scopes:
+            return True
+
+        return any(node in scopes for node in self._path_for(region))
+
+    def get_permitted_scopes(self, resource_name, permission_type):
+        """
+        This method is responsible for returning the (level, id) nodes granted for a resource/action.
+        Returns None if the user has global access (no region restriction).
+        """
+        scopes = self._active_scopes(resource_name, permission_type)
+        if None in scopes:
+            return None
+        return sorted(scopes)
+
+    def get_permitted_regions(self, resource_name, permission_type):
+        """
+        This method is responsible for returning the region IDs granted whole for a resource/action.
+        Returns None if the user has global access (no region restriction). Grants on narrower
+        nodes are not listed; use get_permitted_scopes() or RegionScopedQuerySet.for_user() for those.
+        """
+        scopes = self.get_permitted_scopes(resource_name, permission_type)
+        if scopes is None:
+            return None
+        return [node_id for level, node_id in scopes if level == 'region']
+
+
+class PermissionCache:
+    """
+    This class is responsible for sharing compiled PermissionSets across workers through the Django cache.
+    Entries are keyed by a global and a per-user version token; bumping a token orphans every entry
+    built under the old one, and the orphans expire after `timeout`. Tokens are stored without
+    a TTL. Grant expiry is re-checked on every call.
+    """
+    key_prefix = 'effective_perms'
+    timeout = 60 * 60 * 24
+
+    def __init__(self, alias=None):
+        self.alias = alias
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def cache(self):
+        return caches[self.alias or getattr(settings, 'PERMISSION_CACHE_ALIAS', 'default')]
+
+    def _global_version_key(self):
+        return f"{self.key_prefix}:version:global"
+
+    def _user_version_key(self, user_id):
+        return f"{self.key_prefix}:version:user:{user_id}"
+
+    def _get_versions(self, user_id):
+        """
+        This method is responsible for reading both version tokens, creating any that are missing.
+        A missing token gets a fresh random value so an evicted token can never resurrect old entries.
+        """
+        global_key = self._global_version_key()
+        user_key = self._user_version_key(user_id)
+        versions = self.cache.get_many([global_key, user_key])
+        for key in (global_key, user_key):
+            if key not in versions:
+                self.cache.add(key, uuid.uuid4().hex, None)
+                versions[key] = self.cache.get(key)
+        return versions[global_key], versions[user_key]
+
+    async def _aget_versions(self, user_id):
+        global_key = self._global_version_key()
+        user_key = self._user_version_key(user_id)
+        versions = await self.cache.aget_many([global_key, user_key])
+        for key in (global_key, user_key):
+            if key not in versions:
+                await self.cache.aadd(key, uuid.uuid4().hex, None)
+                versions[key] = await self.cache.aget(key)
+        return versions[global_key], versions[user_key]
+
+    def _set_key(self, user_id, global_version, user_version):
+        return f"{self.key_prefix}:set:{user_id}:{global_version}:{user_version}"
+
+    def get(self, user):
+        """
+        This method is responsible for returning the user's PermissionSet from the cache or the database.
+        """
+        key = self._set_key(user.pk, *self._get_versions(user.pk))
+
+        grants = self.cache.get(key)
+        if grants is not None:
+            self.hits += 1
+            return PermissionSet(grants)
+
+        self.misses += 1
+        permission_set = PermissionSet.load(user)
+        self.cache.set(key, permission_set.grants, self.timeout)
+        return permission_set
+
+    async def aget(self, user):
+        """
+        This method is responsible for the async counterpart of get(), sharing its cache entries.
+        """
+        key = self._set_key(user.pk, *await self._aget_versions(user.pk))
+
+        grants = await self.cache.aget(key)
+        if grants is not None:
+            self.hits += 1
+            return PermissionSet(grants)
+
+        self.misses += 1
+        permission_set = await PermissionSet.aload(user)
+        await self.cache.aset(key, permission_set.grants, self.timeout)
+        return permission_set
+
+    def bump_user(self, user_id):
+        """
+        This method is responsible for invalidating the cached permissions of a single user.
+        """
+        self.cache.set(self._user_version_key(user_id), uuid.uuid4().hex, None)
+
+    def bump_global(self):
+        """
+        This method is responsible for invalidating the cached permissions of every user.
+        """
+        self.cache.set(self._global_version_key(), uuid.uuid4().hex, None)
+
+    def stats(self):
+        """
+        This method is responsible for reporting the hit/miss counters of the current worker.
+        """
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+        }
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+
+permission_cache = PermissionCache()
+
+
+def get_permission_set(user):
+    """
+    This function is responsible for returning the user's PermissionSet, building it on first use.
+    The snapshot is cached on the user instance, which Django shares across a whole request,
+    and in the shared permission cache between requests.
+    """
+    if not hasattr(user, '_resource_permission_set'):
+        user._resource_permission_set = permission_cache.get(user)
+    return user._resource_permission_set
+
+
+async def aget_permission_set(user):
+    """
+    This function is responsible for the async counterpart of get_permission_set(),
+    sharing the same per-instance snapshot.
+    """
+    if not hasattr(user, '_resource_permission_set'):
+        user._resource_permission_set = await permission_cache.aget(user)
+    return user._resource_permission_set
+
+
+def clear_permission_set(user):
+    """
+    This function is responsible for dropping the cached snapshot so the next check reloads it.
+    """
+    if hasattr(user, '_resource_permission_set'):
+        del user._resource_permission_set
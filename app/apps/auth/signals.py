@@ -1,7 +1,9 @@
-from django.db.models.signals import post_save, pre_delete
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
-from .models import PermissionLog, UserPermission, UserGroup
+from django.contrib.auth.models import Group
+from .models import PermissionLog, ResourcePermission, UserPermission, GroupResourcePermission
+from .permissions import permission_cache, rebuild_effective_permissions
 
 User = get_user_model()
 
@@ -12,6 +14,8 @@ def log_user_creation(sender, instance, created, **kwargs):
     Log when a new user is created.
     """
     if created:
+        # A new account may reuse the ID of a deleted one
+        permission_cache.bump_user(instance.pk)
         PermissionLog.objects.create(
             user=instance,
             action='granted',
@@ -47,29 +51,106 @@ def log_permission_revoked(sender, instance, **kwargs):
     )
 
 
-@receiver(post_save, sender=UserGroup)
-def log_group_assignment(sender, instance, created, **kwargs):
+@receiver(m2m_changed, sender=User.groups.through)
+def log_group_membership(sender, instance, action, reverse, pk_set, **kwargs):
     """
-    Log when a user is added to a group.
+    Log when users are added to or removed from a group.
     """
-    if created:
-        PermissionLog.objects.create(
-            user=instance.user,
-            action='group_added',
-            resource=instance.group.name,
-            details=f"Added to group by {instance.added_by.email if instance.added_by else 'System'}"
-        )
+    if action not in ('post_add', 'post_remove') or not pk_set:
+        return
+    log_action = 'group_added' if action == 'post_add' else 'group_removed'
 
+    if reverse:
+        users = User.objects.filter(pk__in=pk_set)
+        group_names = [instance.name]
+    else:
+        users = [instance]
+        group_names = Group.objects.filter(pk__in=pk_set).values_list('name', flat=True)
 
-@receiver(pre_delete, sender=UserGroup)
-def log_group_removal(sender, instance, **kwargs):
+    PermissionLog.objects.bulk_create([
+        PermissionLog(user=user, action=log_action, resource=group_name)
+        for user in users
+        for group_name in group_names
+    ])
+
+
+@receiver(post_save, sender=UserPermission)
+@receiver(post_delete, sender=UserPermission)
+def sync_user_permission(sender, instance, **kwargs):
     """
-    Log when a user is removed from a group.
+    Rebuild the effective permissions of the user owning a direct grant.
     """
-    PermissionLog.objects.create(
-        user=instance.user,
-        action='group_removed',
-        resource=instance.group.name,
-        details=f"Removed from group"
+    rebuild_effective_permissions([instance.user_id])
+
+
+@receiver(pre_save, sender=GroupResourcePermission)
+@receiver(pre_delete, sender=GroupResourcePermission)
+def collect_group_permission_users(sender, instance, **kwargs):
+    """
+    Remember the members of the group a grant belonged to before it changes or disappears.
+    Runs before cascades remove the group's memberships.
+    """
+    group_ids = {instance.group_id}
+    if instance.pk:
+        group_ids.update(
+            GroupResourcePermission.objects.filter(pk=instance.pk).values_list('group_id', flat=True)
+        )
+    instance._affected_user_ids = set(
+        User.groups.through.objects.filter(group_id__in=group_ids).values_list('user_id', flat=True)
     )
 
+
+@receiver(post_save, sender=GroupResourcePermission)
+@receiver(post_delete, sender=GroupResourcePermission)
+def sync_group_permission(sender, instance, **kwargs):
+    """
+    Rebuild the effective permissions of every member of the affected group(s).
+    """
+    rebuild_effective_permissions(getattr(instance, '_affected_user_ids', set()))
+
+
+@receiver(pre_save, sender=ResourcePermission)
+@receiver(pre_delete, sender=ResourcePermission)
+def collect_resource_permission_users(sender, instance, **kwargs):
+    """
+    Remember every user holding a resource, directly or through a group, before it changes.
+    """
+    if not instance.pk:
+        instance._affected_user_ids = set()
+        return
+    direct_users = UserPermission.objects.filter(
+        resource_permission_id=instance.pk
+    ).values_list('user_id', flat=True)
+    group_users = User.groups.through.objects.filter(
+        group__resource_permissions__resource_permission_id=instance.pk
+    ).values_list('user_id', flat=True)
+    instance._affected_user_ids = set(direct_users) | set(group_users)
+
+
+@receiver(post_save, sender=ResourcePermission)
+@receiver(post_delete, sender=ResourcePermission)
+def sync_resource_permission(sender, instance, **kwargs):
+    """
+    Rebuild effective permissions when a resource is renamed, (de)activated or removed.
+    """
+    rebuild_effective_permissions(getattr(instance, '_affected_user_ids', set()))
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def sync_group_membership(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Rebuild effective permissions of users whose group membership changed.
+    """
+    if action == 'pre_clear' and reverse:
+        # group.user_set.clear() does not report which users were affected
+        instance._cleared_user_ids = set(instance.user_set.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        rebuild_effective_permissions([instance.pk])
+    elif action == 'post_clear':
+        rebuild_effective_permissions(getattr(instance, '_cleared_user_ids', set()))
+    else:
+        rebuild_effective_permissions(pk_set or set())
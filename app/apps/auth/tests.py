@@ -1,3 +1,537 @@
-from django.test import TestCase
+"""
+This module is responsible for testing the resource permission snapshot and the checks built on it.
+"""
+import json
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser, Group
+from django.core.management import call_command
+from django.core.exceptions import PermissionDenied
+from django.db import IntegrityError, connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.views import View
+
+from apps.auth.decorators import (
+    acheck_resource_permission,
+    aget_user_permitted_regions,
+    check_resource_permission,
+    get_user_permitted_regions,
+    permission_required,
+)
+from apps.auth.middleware import LoginRequiredMiddleware
+from apps.auth.views import CheckPermissionsBatchAPIView
+from apps.auth.mixins import PermissionRequiredMixin, ViewPermissionMixin
+from apps.auth.models import (
+    EffectiveUserPermission,
+    GroupResourcePermission,
+    PermissionLog,
+    ResourcePermission,
+    UserPermission,
+)
+from apps.auth.permissions import (
+    PermissionSet,
+    compute_effective_permissions,
+    expire_user_permissions,
+    get_permission_set,
+    permission_cache,
+    watch_expired_permissions,
+)
+from apps.cities.models import Region
+
+User = get_user_model()
+
+
+class ResourcePermissionTestCase(TestCase):
+    """
+    This class is responsible for setting up regions, resources, a group and a user for permission tests.
+    """
+
+    def setUp(self):
+        self.region_ne = Region.objects.create(code="NE", name="Nordeste")
+        self.region_s = Region.objects.create(code="S", name="Sul")
+
+        self.view_perm = ResourcePermission.objects.create(
+            name="View City",
+            codename="view_cities_city",
+            permission_type="view",
+            resource_name="cities.city",
+        )
+        self.download_perm = ResourcePermission.objects.create(
+            name="Download City",
+            codename="download_cities_city",
+            permission_type="download",
+            resource_name="cities.city",
+        )
+
+        self.group_ne = Group.objects.create(name="Region - Nordeste")
+        self.user = User.objects.create_user(
+            email="user@example.com",
+            username="testuser",
+            password="password",
+        )
+
+
+class PermissionSetTests(ResourcePermissionTestCase):
+    """
+    This class is responsible for testing that PermissionSet answers every check from memory.
+    """
+
+    def test_checks_cost_one_query_regardless_of_count(self):
+        self.user.groups.add(self.group_ne)
+        GroupResourcePermission.objects.create(
+            group=self.group_ne,
+            resource_permission=self.view_perm,
+            region=self.region_ne,
+        )
+
+        with self.assertNumQueries(1):
+            for _ in range(10):
+                self.assertTrue(
+                    check_resource_permission(self.user, "cities.city", "view", region=self.region_ne)
+                )
+                self.assertFalse(
+                    check_resource_permission(self.user, "cities.city", "view", region=self.region_s)
+                )
+                self.assertEqual(
+                    get_user_permitted_regions(self.user, "cities.city", "view"),
+                    [self.region_ne.id],
+                )
+
+    def test_direct_grant_is_global(self):
+        UserPermission.objects.create(user=self.user, resource_permission=self.download_perm)
+
+        permission_set = PermissionSet.load(self.user)
+        self.assertTrue(permission_set.has_permission("cities.city", "download", region=self.region_s))
+        self.assertIsNone(permission_set.get_permitted_regions("cities.city", "download"))
+
+    def test_expired_and_inactive_direct_grants_are_ignored(self):
+        UserPermission.objects.create(
+            user=self.user,
+            resource_permission=self.view_perm,
+            expires_at=timezone.now() - timedelta(minutes=1),
+        )
+        UserPermission.objects.create(
+            user=self.user,
+            resource_permission=self.download_perm,
+            is_active=False,
+        )
+
+        permission_set = PermissionSet.load(self.user)
+        self.assertFalse(permission_set.has_permission("cities.city", "view"))
+        self.assertFalse(permission_set.has_permission("cities.city", "download"))
+
+    def test_grant_expiring_after_load_is_rechecked(self):
+        permission_set = PermissionSet(
+            {("cities.city", "view"): {None: timezone.now() - timedelta(seconds=1)}}
+        )
+        self.assertFalse(permission_set.has_permission("cities.city", "view"))
+
+    def test_snapshot_is_shared_by_the_user_instance(self):
+        self.assertIs(get_permission_set(self.user), get_permission_set(self.user))
+
+
+class PermissionCacheTests(ResourcePermissionTestCase):
+    """
+    This class is responsible for testing the shared permission cache and its signal-driven invalidation.
+    """
+
+    def _fresh_user(self):
+        # A new instance behaves like the user object of a new request
+        return User.objects.get(pk=self.user.pk)
+
+    def test_second_request_is_served_from_cache(self):
+        get_permission_set(self._fresh_user())
+        permission_cache.reset_stats()
+
+        with self.assertNumQueries(1):
+            user = self._fresh_user()
+            self.assertFalse(check_resource_permission(user, "cities.city", "view"))
+        self.assertEqual(permission_cache.stats()["hits"], 1)
+        self.assertEqual(permission_cache.stats()["misses"], 0)
+
+    def test_versioned_entries_expire_but_tokens_persist(self):
+        with mock.patch.object(permission_cache.cache, "set", wraps=permission_cache.cache.set) as cache_set, \
+                mock.patch.object(permission_cache.cache, "add", wraps=permission_cache.cache.add) as cache_add:
+            permission_cache.bump_user(self.user.pk)
+            get_permission_set(self._fresh_user())
+        timeouts = {call.args[0].split(":")[1]: call.args[2] for call in cache_set.call_args_list + cache_add.call_args_list}
+        self.assertEqual(timeouts["set"], permission_cache.timeout)
+        self.assertIsNone(timeouts["version"])
+
+    def test_group_grant_invalidates_cache(self):
+        self.user.groups.add(self.group_ne)
+        self.assertFalse(check_resource_permission(self._fresh_user(), "cities.city", "view"))
+
+        GroupResourcePermission.objects.create(
+            group=self.group_ne,
+            resource_permission=self.view_perm,
+            region=None,
+        )
+        self.assertTrue(check_resource_permission(self._fresh_user(), "cities.city", "view"))
+
+    def test_group_membership_invalidates_cache(self):
+        GroupResourcePermission.objects.create(
+            group=self.group_ne,
+            resource_permission=self.view_perm,
+            region=self.region_ne,
+        )
+        self.assertFalse(check_resource_permission(self._fresh_user(), "cities.city", "view"))
+
+        self.group_ne.user_set.add(self.user)
+        self.assertTrue(check_resource_permission(self._fresh_user(), "cities.city", "view"))
+
+        self.user.groups.remove(self.group_ne)
+        self.assertFalse(check_resource_permission(self._fresh_user(), "cities.city", "view"))
+
+    def test_direct_grant_revocation_invalidates_cache(self):
+        grant = UserPermission.objects.create(user=self.user, resource_permission=self.download_perm)
+        self.assertTrue(check_resource_permission(self._fresh_user(), "cities.city", "download"))
+
+        grant.is_active = False
+        grant.save()
+        self.assertFalse(check_resource_permission(self._fresh_user(), "cities.city", "download"))
+
+    def test_cached_grant_expires_without_invalidation(self):
+        UserPermission.objects.create(
+            user=self.user,
+            resource_permission=self.download_perm,
+            expires_at=timezone.now() + timedelta(hours=1),
+        )
+        self.assertTrue(check_resource_permission(self._fresh_user(), "cities.city", "download"))
+
+        with mock.patch("apps.auth.permissions.timezone.now", return_value=timezone.now() + timedelta(hours=2)):
+            self.assertFalse(check_resource_permission(self._fresh_user(), "cities.city", "download"))
+
+
+class EffectiveUserPermissionTests(ResourcePermissionTestCase):
+    """
+    This class is responsible for testing that the materialized permission table follows grant changes.
+    """
+
+    def _rows(self):
+        return set(
+            EffectiveUserPermission.objects.filter(user=self.user).values_list(
+                "resource_name", "permission_type", "scope_id"
+            )
+        )
+
+    def test_direct_and_group_grants_are_materialized(self):
+        UserPermission.objects.create(user=self.user, resource_permission=self.download_perm)
+        self.user.groups.add(self.group_ne)
+        GroupResourcePermission.objects.create(
+            group=self.group_ne,
+            resource_permission=self.view_perm,
+            region=self.region_ne,
+        )
+
+        self.assertEqual(
+            self._rows(),
+            {("cities.city", "download", None), ("cities.city", "view", self.region_ne.id)},
+        )
+
+    def test_deactivating_resource_removes_rows(self):
+        UserPermission.objects.create(user=self.user, resource_permission=self.download_perm)
+
+        self.download_perm.is_active = False
+        self.download_perm.save()
+
+        self.assertEqual(self._rows(), set())
+
+    def test_deleting_group_removes_rows(self):
+        self.user.groups.add(self.group_ne)
+        GroupResourcePermission.objects.create(
+            group=self.group_ne,
+            resource_permission=self.view_perm,
+            region=None,
+        )
+
+        self.group_ne.delete()
+
+        self.assertEqual(self._rows(), set())
+
+    def test_clearing_group_members_removes_rows(self):
+        self.user.groups.add(self.group_ne)
+        GroupResourcePermission.objects.create(
+            group=self.group_ne,
+            resource_permission=self.view_perm,
+            region=None,
+        )
+
+        self.group_ne.user_set.clear()
+
+        self.assertEqual(self._rows(), set())
+
+    def test_per_user_rebuild_joins_group_membership_once(self):
+        self.user.groups.add(self.group_ne)
+        with CaptureQueriesContext(connection) as queries:
+            compute_effective_permissions(user_ids=[self.user.id])
+        group_query = next(query["sql"] for query in queries if "auth_group_resource_permission" in query["sql"])
+        self.assertEqual(group_query.count("JOIN \"auth_user_groups\""), 1)
+
+    def test_group_grants_are_unique_per_scope_including_unscoped(self):
+        GroupResourcePermission.objects.create(group=self.group_ne, resource_permission=self.view_perm)
+        GroupResourcePermission.objects.create(
+            group=self.group_ne, resource_permission=self.view_perm, region=self.region_ne
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            GroupResourcePermission.objects.create(group=self.group_ne, resource_permission=self.view_perm)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            GroupResourcePermission.objects.create(
+                group=self.group_ne, resource_permission=self.view_perm, region=self.region_ne
+            )
+
+    def test_rebuild_command_restores_rows(self):
+        UserPermission.objects.create(user=self.user, resource_permission=self.download_perm)
+        EffectiveUserPermission.objects.all().delete()
+
+        call_command("rebuild_effective_permissions", stdout=StringIO())
+
+        self.assertEqual(self._rows(), {("cities.city", "download", None)})
+
+
+class CheckPermissionsBatchApiTests(ResourcePermissionTestCase):
+    """
+    This class is responsible for testing the batch permission check endpoint.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user.groups.add(self.group_ne)
+        GroupResourcePermission.objects.create(
+            group=self.group_ne,
+            resource_permission=self.view_perm,
+            region=self.region_ne,
+        )
+        self.client.force_login(self.user)
+        self.url = reverse("auth:check_permissions_batch_api")
+
+    def test_post_returns_matrix_in_input_order(self):
+        checks = [
+            {"resource": "cities.city", "type": "view", "region": self.region_ne.id},
+            {"resource": "cities.city", "type": "view", "region": self.region_s.id},
+            {"resource": "cities.city", "type": "download"},
+        ]
+        response = self.client.post(self.url, {"checks": checks}, content_type="application/json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [result["has_permission"] for result in response.json()["results"]],
+            [True, False, False],
+        )
+
+    def test_get_accepts_repeated_check_params(self):
+        response = self.client.get(
+            self.url, {"check": ["cities.city:view", f"cities.city:view:{self.region_s.id}"]}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [result["has_permission"] for result in response.json()["results"]],
+            [True, False],
+        )
+
+    def test_rejects_invalid_region(self):
+        response = self.client.post(
+            self.url,
+            {"checks": [{"resource": "cities.city", "region": "north"}]},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejects_checks_of_the_wrong_type(self):
+        for check in (
+            {"resource": ["cities.city"], "type": "view"},
+            {"resource": "cities.city", "type": ["view"]},
+            {"resource": "cities.city", "region": True},
+            {"resource": "cities.city", "region": [1]},
+            {"resource": "cities.city", "region": 1.5},
+        ):
+            response = self.client.post(self.url, {"checks": [check]}, content_type="application/json")
+            self.assertEqual(response.status_code, 400, check)
+
+
+class ExpirePermissionsTests(ResourcePermissionTestCase):
+    """
+    This class is responsible for testing the expired-permission sweeper.
+    """
+
+    def test_expired_grants_are_deactivated_and_logged(self):
+        expired = UserPermission.objects.create(
+            user=self.user,
+            resource_permission=self.view_perm,
+            expires_at=timezone.now() + timedelta(minutes=5),
+        )
+        current = UserPermission.objects.create(
+            user=self.user,
+            resource_permission=self.download_perm,
+            expires_at=timezone.now() + timedelta(days=1),
+        )
+
+        expired_count = expire_user_permissions(now=timezone.now() + timedelta(hours=1))
+
+        self.assertEqual(expired_count, 1)
+        expired.refresh_from_db()
+        current.refresh_from_db()
+        self.assertFalse(expired.is_active)
+        self.assertTrue(current.is_active)
+        self.assertTrue(
+            PermissionLog.objects.filter(
+                user=self.user, action="revoked", resource="cities.city.view"
+            ).exists()
+        )
+        self.assertFalse(
+            EffectiveUserPermission.objects.filter(user=self.user, permission_type="view").exists()
+        )
+
+    def test_command_reports_and_explains(self):
+        UserPermission.objects.create(user=self.user, resource_permission=self.view_perm)
+        out = StringIO()
+        call_command("expire_permissions", "--explain", stdout=out)
+        self.assertIn("0 expired permission(s) deactivated", out.getvalue())
+        self.assertIn("Before (is_active + expiry OR predicate)", out.getvalue())
+        self.assertIn("After (is_active only, partial index)", out.getvalue())
+        self.assertIn("PermissionSet.load (EffectiveUserPermission by user)", out.getvalue())
+        self.assertIn("auth_effective_user_perm", out.getvalue())
+
+    def test_watch_sweeps_periodically(self):
+        UserPermission.objects.create(
+            user=self.user,
+            resource_permission=self.view_perm,
+            expires_at=timezone.now() + timedelta(minutes=5),
+        )
+        messages = []
+        with mock.patch("apps.auth.permissions.time.sleep") as sleep:
+            watch_expired_permissions(interval=60, log=messages.append, iterations=1)
+            self.assertEqual(messages, [])
+            with mock.patch("apps.auth.permissions.timezone.now", return_value=timezone.now() + timedelta(hours=1)):
+                watch_expired_permissions(interval=60, log=messages.append, iterations=1)
+        sleep.assert_called_with(60)
+        self.assertEqual(messages, ["1 expired permission(s) deactivated"])
+        self.assertFalse(EffectiveUserPermission.objects.filter(user=self.user).exists())
+
+
+class AsyncPermissionTests(ResourcePermissionTestCase):
+    """
+    This class is responsible for testing the async permission helpers against their sync counterparts.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user.groups.add(self.group_ne)
+        GroupResourcePermission.objects.create(
+            group=self.group_ne,
+            resource_permission=self.view_perm,
+            region=self.region_ne,
+        )
+
+    async def test_async_checks_match_sync_checks(self):
+        user = await User.objects.aget(pk=self.user.pk)
+
+        self.assertTrue(await acheck_resource_permission(user, "cities.city", "view", region=self.region_ne))
+        self.assertFalse(await acheck_resource_permission(user, "cities.city", "view", region=self.region_s))
+        self.assertFalse(await acheck_resource_permission(user, "cities.city", "download"))
+        self.assertEqual(await aget_user_permitted_regions(user, "cities.city", "view"), [self.region_ne.id])
+
+    async def test_permission_required_wraps_async_views(self):
+        @permission_required("cities.city", "download")
+        async def view(request):
+            return HttpResponse("ok")
+
+        request = RequestFactory().get("/")
+        user = await User.objects.aget(pk=self.user.pk)
+
+        async def auser():
+            return user
+
+        request.auser = auser
+        with self.assertRaises(PermissionDenied):
+            await view(request)
+
+    async def test_async_views_honour_overridden_sync_checks(self):
+        class DenyingView(PermissionRequiredMixin, View):
+            resource_name = "cities.city"
+
+            def has_permission(self):
+                return False
+
+            async def get(self, request):
+                return HttpResponse("ok")
+
+        class GrantedView(ViewPermissionMixin, View):
+            resource_name = "cities.city"
+
+            async def get(self, request):
+                return HttpResponse("ok")
+
+        self.assertTrue(DenyingView.overrides_sync_permission_check())
+        self.assertFalse(GrantedView.overrides_sync_permission_check())
+
+        user = await User.objects.aget(pk=self.user.pk)
+        request = RequestFactory().get("/")
+        request.user = user
+
+        async def auser():
+            return user
+
+        request.auser = auser
+        with self.assertRaises(PermissionDenied):
+            await DenyingView.as_view()(request)
+        response = await GrantedView.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+
+    async def test_login_middleware_runs_in_async_mode(self):
+        async def get_response(request):
+            return HttpResponse("ok")
+
+        middleware = LoginRequiredMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+
+        request = RequestFactory().get("/cities/")
+
+        async def anonymous():
+            return AnonymousUser()
+
+        request.auser = anonymous
+        response = await middleware(request)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response["Location"], "/auth/login/?next=/cities/")
+
+    async def test_check_apis_run_async_under_asgi(self):
+        user = await User.objects.aget(pk=self.user.pk)
+
+        async def auser():
+            return user
+
+        checks = [
+            {"resource": "cities.city", "region": self.region_ne.id},
+            {"resource": "cities.city", "type": "download"},
+        ]
+        request = RequestFactory().post("/", {"checks": checks}, content_type="application/json")
+        request.auser = auser
+        with override_settings(ASGI_DEPLOYMENT=True):
+            view = CheckPermissionsBatchAPIView.as_view()
+            self.assertTrue(iscoroutinefunction(view))
+            response = await view(request)
+        results = json.loads(response.content)["results"]
+        self.assertEqual([result["has_permission"] for result in results], [True, False])
+
+        self.assertFalse(iscoroutinefunction(CheckPermissionsBatchAPIView.as_view()))
+
+    def test_check_permission_api(self):
+        self.client.force_login(self.user)
+
+        response = self.client.get(
+            reverse("auth:check_permission_api"),
+            {"resource": "cities.city", "type": "view", "region": self.region_s.id},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()["has_permission"])
@@ -19,5 +19,6 @@ urlpatterns = [
     
     # API URLs
     path('api/check-permission/', views.check_permission_api, name='check_permission_api'),
+    path('api/check-permissions/', views.check_permissions_batch_api, name='check_permissions_batch_api'),
 ]
 
@@ -3,19 +3,23 @@ from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
+from django.conf import settings
+from django.utils.functional import classproperty
+from django.views import View
 from django.views.generic import ListView, DetailView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.paginator import Paginator
 from django.db.models import Q
-from django.utils import timezone
-from django.db import models
 from django_ratelimit.decorators import ratelimit
 from .models import (
     User, ResourcePermission, UserPermission,
     GroupResourcePermission, PermissionLog
 )
+from apps.core.serialization import FastJsonResponse
+from .permissions import aget_permission_set, get_permission_set
 from .mixins import PermissionRequiredMixin, APIResponseMixin
 from .forms import UserRegistrationForm, PermissionAssignmentForm, GroupResourcePermissionForm
+import json
 import logging
 
 logger = logging.getLogger(__name__)
@@ -310,54 +314,154 @@ def revoke_permission_view(request, permission_id):
     return render(request, 'auth/revoke_permission.html', {'permission': user_permission})
 
 
-@login_required
-def check_permission_api(request):
+MAX_BATCH_PERMISSION_CHECKS = 100
+
+
+def _parse_region(value):
+    """
+    Parse an optional region ID from a query string or JSON value.
+    Raises ValueError for anything that isn't empty, an integer or an integer string;
+    booleans are rejected although Python counts them as integers.
+    """
+    if value in (None, '', 'null'):
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(value)
+    return int(value)
+
+
+class PermissionCheckAPIView(PermissionRequiredMixin, View):
     """
-    API endpoint to check user permissions.
+    This view is responsible for answering (resource, type, region) checks for the requesting
+    user; subclasses read the checks from the request in read_checks() and shape the response in
+    render(). Under ASGI (settings.ASGI_DEPLOYMENT) the handlers are async: the mixin's adispatch
+    runs them and the snapshot comes from the async ORM (PermissionSet.aload behind the shared
+    cache). Under WSGI they stay sync, so each request is spared an async_to_sync thread hop.
     """
-    if request.method != 'GET':
-        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    http_method_names = ['get']
     
-    resource_name = request.GET.get('resource')
-    permission_type = request.GET.get('type', 'view')
+    @classproperty
+    def view_is_async(cls):
+        return settings.ASGI_DEPLOYMENT
     
-    if not resource_name:
-        return JsonResponse({'error': 'Resource name required'}, status=400)
+    def read_checks(self, request):
+        """
+        This method is responsible for the (resource, type, region) checks of the request,
+        raising ValueError with the error message for invalid input.
+        """
+        raise NotImplementedError
     
-    # Check permission using the same logic as mixin
-    user_perms = request.user.custom_permissions.filter(
-        resource_permission__resource_name=resource_name,
-        resource_permission__permission_type=permission_type,
-        is_active=True
-    )
+    def render(self, results):
+        return FastJsonResponse({'results': results})
     
-    # Check if any permission has expired
-    active_user_perms = user_perms.filter(
-        models.Q(expires_at__isnull=True) | models.Q(expires_at__gt=timezone.now())
-    )
+    def get(self, request, *args, **kwargs):
+        return self.aanswer(request) if self.view_is_async else self.answer(request)
     
-    has_permission = active_user_perms.exists()
+    def answer(self, request):
+        try:
+            checks = self.read_checks(request)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        user = request.user
+        return self.render(self.results(user, None if user.is_superuser else get_permission_set(user), checks))
     
-    if not has_permission:
-        # Check group permissions
-        user_groups = UserGroup.objects.filter(
-            user=request.user,
-            is_active=True
-        ).values_list('group', flat=True)
+    async def aanswer(self, request):
+        try:
+            checks = self.read_checks(request)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        user = await request.auser()
+        permission_set = None if user.is_superuser else await aget_permission_set(user)
+        return self.render(self.results(user, permission_set, checks))
+    
+    @staticmethod
+    def results(user, permission_set, checks):
+        # Superusers have all permissions
+        return [
+            {
+                'resource': resource_name,
+                'permission_type': permission_type,
+                'region': region,
+                'has_permission': user.is_superuser or permission_set.has_permission(
+                    resource_name, permission_type, region=region
+                ),
+            }
+            for resource_name, permission_type, region in checks
+        ]
+
+
+class CheckPermissionAPIView(PermissionCheckAPIView):
+    """
+    API endpoint to check user permissions: GET ?resource=&type=&region=.
+    """
+    
+    def read_checks(self, request):
+        resource_name = request.GET.get('resource')
+        if not resource_name:
+            raise ValueError('Resource name required')
+        try:
+            region = _parse_region(request.GET.get('region'))
+        except ValueError:
+            raise ValueError('Invalid region')
+        return [(resource_name, request.GET.get('type', 'view'), region)]
+    
+    def render(self, results):
+        return FastJsonResponse(results[0])
+
+
+class CheckPermissionsBatchAPIView(PermissionCheckAPIView):
+    """
+    API endpoint to check many (resource, type, region) combinations in one round trip.
+    All checks are answered from the user's permission snapshot (at most two queries).
+
+    GET: ?check=cities.city:view&check=cities.city:change:3
+    POST (JSON): {"checks": [{"resource": "cities.city", "type": "view", "region": 3}, ...]}
+    """
+    http_method_names = ['get', 'post']
+    
+    def read_checks(self, request):
+        if request.method == 'GET':
+            checks = []
+            for raw in request.GET.getlist('check'):
+                parts = raw.split(':')
+                if len(parts) > 3:
+                    raise ValueError(f'Invalid check: {raw}')
+                parts += [None] * (3 - len(parts))
+                checks.append({'resource': parts[0], 'type': parts[1] or 'view', 'region': parts[2]})
+        else:
+            try:
+                checks = json.loads(request.body or b'{}').get('checks')
+            except (ValueError, AttributeError):
+                raise ValueError('Invalid JSON body')
+            if not isinstance(checks, list):
+                raise ValueError('checks must be a list')
         
-        group_perms = GroupPermission.objects.filter(
-            group__in=user_groups,
-            resource_permission__resource_name=resource_name,
-            resource_permission__permission_type=permission_type
-        )
+        if not checks:
+            raise ValueError('At least one check required')
+        if len(checks) > MAX_BATCH_PERMISSION_CHECKS:
+            raise ValueError(f'At most {MAX_BATCH_PERMISSION_CHECKS} checks per request')
         
-        has_permission = group_perms.exists()
+        parsed = []
+        for check in checks:
+            if not isinstance(check, dict) or not check.get('resource'):
+                raise ValueError('Each check requires a resource')
+            if not isinstance(check['resource'], str):
+                raise ValueError('resource must be a string')
+            if not isinstance(check.get('type') or 'view', str):
+                raise ValueError('type must be a string')
+            try:
+                region = _parse_region(check.get('region'))
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid region: {check.get('region')}")
+            parsed.append((check['resource'], check.get('type') or 'view', region))
+        return parsed
     
-    return JsonResponse({
-        'has_permission': has_permission,
-        'resource': resource_name,
-        'permission_type': permission_type
-    })
+    def post(self, request, *args, **kwargs):
+        return self.get(request, *args, **kwargs)
+
+
+check_permission_api = login_required(CheckPermissionAPIView.as_view())
+check_permissions_batch_api = login_required(CheckPermissionsBatchAPIView.as_view())
 
 
 def get_client_ip(request):
@@ -1,7 +1,9 @@
 from django.contrib import admin
 
+from .hierarchy import geo_hierarchy
+from .indicators import INDICATOR_SOURCES
 from .mixins import RegionScopedAdminMixin
-from .models import Region, State, IntermediateRegion, ImmediateRegion, Municipality, MunicipalityLog
+from .models import Region, State, IntermediateRegion, ImmediateRegion, Municipality, MunicipalityLog, MunicipalityWikiProfile
 
 
 @admin.register(Region)
@@ -39,29 +41,49 @@ class ImmediateRegionAdmin(RegionScopedAdminMixin, admin.ModelAdmin):
     ordering = ['name']
     
     def state_name(self, obj):
-        return obj.intermediate_region.state.name
+        state = geo_hierarchy.lookup(
+            lambda hierarchy: hierarchy.state_for_intermediate_region(obj.intermediate_region_id)
+        )
+        return state.name if state else '-'
     state_name.short_description = 'State'
 
 
-@admin.register(Municipality)
-class MunicipalityAdmin(RegionScopedAdminMixin, admin.ModelAdmin):
-    list_display = ['code', 'name', 'is_capital', 'seaf_category', 'mayor_name', 'mayor_party', 'mayor_mandate_period', 'state_name']
-    list_filter = ['is_capital', 'seaf_category', 'immediate_region__intermediate_region__state', 'timezone', 'mayor_party']
-    search_fields = ['code', 'name', 'siafi_id', 'area_code', 'immediate_region__name', 'mayor_name', 'mayor_party']
-    ordering = ['name']
-    list_editable = ['is_capital']
-    readonly_fields = ['mayor_data_updated_at', 'wiki_data_updated_at']
+class PopulationRangeFilter(admin.SimpleListFilter):
+    """
+    This class is responsible for filtering municipalities by population band on the indexed population column.
+    """
+    title = 'population'
+    parameter_name = 'population_band'
+    bands = {
+        'lt20k': ('Até 20 mil', None, 20000),
+        '20k-100k': ('20 mil a 100 mil', 20000, 100000),
+        '100k-500k': ('100 mil a 500 mil', 100000, 500000),
+        'gte500k': ('500 mil ou mais', 500000, None),
+    }
+    
+    def lookups(self, request, model_admin):
+        return [(key, label) for key, (label, _, _) in self.bands.items()]
+    
+    def queryset(self, request, queryset):
+        if self.value() not in self.bands:
+            return queryset
+        _, minimum, maximum = self.bands[self.value()]
+        if minimum is not None:
+            queryset = queryset.filter(population__gte=minimum)
+        if maximum is not None:
+            queryset = queryset.filter(population__lt=maximum)
+        return queryset
+
+
+class MunicipalityWikiProfileInline(admin.StackedInline):
+    """
+    This class is responsible for editing the Wikipedia profile on the municipality change page.
+    """
+    model = MunicipalityWikiProfile
+    can_delete = False
+    readonly_fields = ['wiki_data_updated_at']
     
     fieldsets = (
-        ('Basic Information', {
-            'fields': ('code', 'name', 'is_capital', 'siafi_id', 'immediate_region', 'seaf_category')
-        }),
-        ('Location', {
-            'fields': ('latitude', 'longitude', 'area_code', 'timezone')
-        }),
-        ('Mayor Information', {
-            'fields': ('mayor_name', 'mayor_party', 'mayor_mandate_start', 'mayor_mandate_end', 'wikipedia_url', 'mayor_data_updated_at')
-        }),
         ('Wikipedia - Basic Data', {
             'fields': ('wiki_demonym', 'wiki_climate', 'wiki_altitude', 'wiki_total_area', 'wiki_population', 'wiki_density'),
             'classes': ('collapse',)
@@ -83,9 +105,39 @@ class MunicipalityAdmin(RegionScopedAdminMixin, admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+
+@admin.register(Municipality)
+class MunicipalityAdmin(RegionScopedAdminMixin, admin.ModelAdmin):
+    list_display = ['code', 'name', 'is_capital', 'seaf_category', 'population', 'idh', 'mayor_name', 'mayor_party', 'mayor_mandate_period', 'state_name']
+    list_filter = ['is_capital', 'seaf_category', PopulationRangeFilter, 'state', 'timezone', 'mayor_party']
+    search_fields = ['code', 'name', 'siafi_id', 'area_code', 'immediate_region__name', 'mayor_name', 'mayor_party']
+    ordering = ['name']
+    list_editable = ['is_capital']
+    readonly_fields = ['mayor_data_updated_at', *INDICATOR_SOURCES]
+    inlines = [MunicipalityWikiProfileInline]
+    
+    fieldsets = (
+        ('Basic Information', {
+            'fields': ('code', 'name', 'is_capital', 'siafi_id', 'immediate_region', 'seaf_category')
+        }),
+        ('Location', {
+            'fields': ('latitude', 'longitude', 'area_code', 'timezone')
+        }),
+        ('Mayor Information', {
+            'fields': ('mayor_name', 'mayor_party', 'mayor_mandate_start', 'mayor_mandate_end', 'wikipedia_url', 'mayor_data_updated_at')
+        }),
+        ('Indicators (parsed from Wikipedia)', {
+            'fields': tuple(INDICATOR_SOURCES),
+            'classes': ('collapse',)
+        }),
+    )
     
     def state_name(self, obj):
-        return obj.immediate_region.intermediate_region.state.name
+        state = geo_hierarchy.lookup(
+            lambda hierarchy: hierarchy.state_for_immediate_region(obj.immediate_region_id)
+        )
+        return state.name if state else '-'
     state_name.short_description = 'State'
     
     def mayor_mandate_period(self, obj):
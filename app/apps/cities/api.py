@@ -0,0 +1,46 @@
+"""
+This module is responsible for the field catalogue of the municipality read API.
+Clients pick fields with ?fields=; only the columns (and joins) behind those fields are queried,
+so the Wikipedia profile is only joined when one of its fields is asked for.
+"""
+from .exports import EXPORT_COLUMNS
+from .models import MunicipalityWikiProfile
+
+# Field key -> queryset lookup
+API_FIELDS = {
+    'id': 'id',
+    **{column: lookup for column, (_, lookup) in EXPORT_COLUMNS.items()},
+    'wikipedia_url': 'wikipedia_url',
+    'mayor_data_updated_at': 'mayor_data_updated_at',
+    **{
+        field.name: f"wiki_profile__{field.name}"
+        for field in MunicipalityWikiProfile._meta.concrete_fields
+        if field.name.startswith('wiki_')
+    },
+}
+
+DEFAULT_API_FIELDS = ['id', 'code', 'name', 'state_abbreviation', 'seaf_category']
+
+
+def parse_fields(value):
+    """
+    This function is responsible for reading a comma-separated ?fields= value: the field keys, or
+    'all'. Raises ValueError naming the unknown ones.
+    """
+    if not value:
+        return list(DEFAULT_API_FIELDS)
+    if value == 'all':
+        return list(API_FIELDS)
+    fields = list(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in API_FIELDS]
+    if unknown or not fields:
+        raise ValueError(f"Unknown fields: {', '.join(unknown) or value}")
+    return fields
+
+
+def page_lookups(fields, sort_field):
+    """
+    This function is responsible for the lookups to select for a page: the requested fields plus
+    the primary key and sort column that keyset cursors are built from.
+    """
+    return list(dict.fromkeys([*(API_FIELDS[field] for field in fields), 'id', sort_field]))
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class CitiesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.cities"
+
+    def ready(self):
+        """
+        Import signal handlers when the app is ready.
+        """
+        import apps.cities.signals  # noqa: F401
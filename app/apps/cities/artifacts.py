@@ -0,0 +1,288 @@
+"""
+This module is responsible for pre-built municipality export files.
+For every dataset version and every distinct download scope in use, the full export (all
+columns, no filters) is written once per format under MEDIA_ROOT/exports/<version>/, and
+downloads are answered with that file instead of re-querying the table.
+
+The version is a fingerprint of the exported content itself, so files are only rewritten when
+the exported rows change. manifest.json, replaced atomically after each build, lists the files of
+that version together with the shared dataset_version() it was built at; downloads only use it
+while that is still the live version and the manifest is younger than EXPORT_ARTIFACT_MAX_AGE,
+and otherwise fall back to streaming, so a stopped or failing builder never serves stale data.
+"""
+import hashlib
+import importlib.util
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .exports import EXPORT_COLUMNS, export_rows, stream_csv, stream_jsonl, write_xlsx
+from .facets import dataset_version
+
+# Parquet needs pyarrow, an optional dependency; without it Parquet is not offered at all
+PARQUET_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+ARTIFACT_FORMATS = ['csv', 'jsonl', 'xlsx'] + (['parquet'] if PARQUET_AVAILABLE else [])
+# Versions kept on disk: the current one and its predecessor, which may still be mid-download
+KEPT_VERSIONS = 2
+
+
+def artifact_root():
+    return os.path.join(settings.MEDIA_ROOT, 'exports')
+
+
+def scope_key(scopes):
+    """
+    This function is responsible for naming a download scope: 'all' for unrestricted access,
+    otherwise a digest of the sorted (level, id) nodes.
+    """
+    if scopes is None:
+        return 'all'
+    return hashlib.sha1(repr(sorted(scopes)).encode()).hexdigest()[:16]
+
+
+def dataset_fingerprint():
+    """
+    This function is responsible for hashing the exported content of every municipality, plus the
+    hierarchy link that decides which scopes include it. One pass over narrow tuples.
+    """
+    from .models import Municipality
+
+    digest = hashlib.sha256()
+    columns = list(EXPORT_COLUMNS)
+    rows = Municipality.objects.order_by('id').values_list(
+        'id', 'immediate_region_id', *[EXPORT_COLUMNS[column][1] for column in columns]
+    ).iterator(chunk_size=2000)
+    for row in rows:
+        digest.update(repr(row).encode())
+    return digest.hexdigest()[:16]
+
+
+def download_scopes():
+    """
+    This function is responsible for listing the distinct municipality download scopes in use:
+    unrestricted (always, for superusers) plus every user's set of granted nodes.
+    """
+    from apps.auth.models import EffectiveUserPermission
+    from apps.auth.permissions import PermissionSet
+
+    grants = {}
+    rows = EffectiveUserPermission.objects.filter(
+        resource_name='cities.city',
+        permission_type='download'
+    ).values_list('user_id', 'scope_level', 'scope_id', 'expires_at')
+    for user_id, scope_level, scope_id, expires_at in rows:
+        scope = (scope_level, scope_id) if scope_id is not None else None
+        grants.setdefault(user_id, {})[scope] = expires_at
+
+    scopes = {'all': None}
+    for user_grants in grants.values():
+        permitted = PermissionSet({('cities.city', 'download'): user_grants}).get_permitted_scopes(
+            'cities.city', 'download'
+        )
+        if permitted is None or permitted:
+            scopes[scope_key(permitted)] = permitted
+    return scopes
+
+
+def read_manifest():
+    """
+    This function is responsible for returning the current manifest, or None before the first build.
+    """
+    try:
+        with open(os.path.join(artifact_root(), 'manifest.json')) as manifest:
+            return json.load(manifest)
+    except (OSError, ValueError):
+        return None
+
+
+def manifest_age(manifest):
+    return timezone.now() - datetime.fromisoformat(manifest['built_at'])
+
+
+def manifest_is_current(manifest):
+    """
+    This function is responsible for telling whether a manifest still describes the live data:
+    built at the current dataset_version() and within EXPORT_ARTIFACT_MAX_AGE, which bounds
+    staleness from writes that bypass the version bump (loaddata, queryset updates).
+    """
+    return (
+        manifest.get('dataset_version') == dataset_version()
+        and manifest_age(manifest) < timedelta(seconds=settings.EXPORT_ARTIFACT_MAX_AGE)
+    )
+
+
+def find_artifact(scopes, export_format):
+    """
+    This function is responsible for returning (version, relative path) of the pre-built file for
+    a scope and format, or None if there is none or it may be out of date.
+    """
+    manifest = read_manifest()
+    if not manifest or not manifest_is_current(manifest):
+        return None
+    path = manifest['files'].get(scope_key(scopes), {}).get(export_format)
+    if not path or not os.path.exists(os.path.join(artifact_root(), path)):
+        return None
+    return manifest['version'], path
+
+
+def write_parquet(rows, columns, output):
+    """
+    This function is responsible for writing a Parquet file in row groups of one chunk each.
+    Only called when PARQUET_AVAILABLE.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    from .models import Municipality
+
+    def arrow_type(lookup):
+        model, *path, name = [Municipality, *lookup.split('__')]
+        for relation in path:
+            model = model._meta.get_field(relation).related_model
+        field = model._meta.get_field(name)
+        internal = field.get_internal_type()
+        if internal == 'DecimalField':
+            return pa.decimal128(field.max_digits, field.decimal_places)
+        if internal in ('IntegerField', 'BigIntegerField', 'PositiveIntegerField', 'AutoField', 'BigAutoField'):
+            return pa.int64()
+        if internal == 'BooleanField':
+            return pa.bool_()
+        return pa.string()
+
+    schema = pa.schema([(column, arrow_type(EXPORT_COLUMNS[column][1])) for column in columns])
+    with pq.ParquetWriter(output, schema) as writer:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == 2000:
+                writer.write_table(pa.Table.from_arrays(
+                    [pa.array(values, type=field.type) for values, field in zip(zip(*batch), schema)], schema=schema
+                ))
+                batch = []
+        if batch:
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(zip(*batch), schema)], schema=schema
+            ))
+
+
+def write_artifact(queryset, export_format, path):
+    """
+    This function is responsible for writing one export file next to `path` and moving it into
+    place, so readers never see a partial file.
+    """
+    columns = list(EXPORT_COLUMNS)
+    rows = export_rows(queryset, columns)
+    handle, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        if export_format == 'csv':
+            with os.fdopen(handle, 'w', encoding='utf-8', newline='') as output:
+                output.writelines(stream_csv(rows, columns))
+        elif export_format == 'jsonl':
+            # Already encoded to UTF-8 bytes
+            with os.fdopen(handle, 'wb') as output:
+                output.writelines(stream_jsonl(rows, columns))
+        else:
+            os.close(handle)
+            writer = write_xlsx if export_format == 'xlsx' else write_parquet
+            writer(rows, columns, temporary)
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+
+def build_artifacts(version=None, log=None, live_version=None):
+    """
+    This function is responsible for writing every missing file of the current version, then
+    publishing the manifest and pruning old versions. Returns the manifest.
+    `live_version` is the dataset_version() read before `version` was fingerprinted, so a write
+    landing mid-build leaves the manifest behind the live version rather than ahead of it.
+    """
+    from .models import Municipality
+
+    log = log or (lambda message: None)
+    if version is None:
+        live_version = dataset_version()
+        version = dataset_fingerprint()
+    elif live_version is None:
+        live_version = dataset_version()
+    version_dir = os.path.join(artifact_root(), version)
+    os.makedirs(version_dir, exist_ok=True)
+
+    files = {}
+    for key, scopes in download_scopes().items():
+        queryset = Municipality.objects.within(scopes)
+        for export_format in ARTIFACT_FORMATS:
+            relative = f"{version}/municipios-{key}.{export_format}"
+            path = os.path.join(artifact_root(), relative)
+            if not os.path.exists(path):
+                write_artifact(queryset, export_format, path)
+                log(f"Built {relative}")
+            files.setdefault(key, {})[export_format] = relative
+
+    manifest = {
+        'version': version,
+        'dataset_version': live_version,
+        'built_at': timezone.now().isoformat(),
+        'files': files,
+    }
+    handle, temporary = tempfile.mkstemp(dir=artifact_root(), suffix='.tmp')
+    with os.fdopen(handle, 'w') as output:
+        json.dump(manifest, output)
+    os.replace(temporary, os.path.join(artifact_root(), 'manifest.json'))
+
+    versions = sorted(
+        (entry for entry in os.scandir(artifact_root()) if entry.is_dir()),
+        key=lambda entry: entry.stat().st_mtime,
+        reverse=True
+    )
+    for entry in versions:
+        if entry.name != version and versions.index(entry) >= KEPT_VERSIONS:
+            shutil.rmtree(entry.path, ignore_errors=True)
+    return manifest
+
+
+def watch_artifacts(interval=30, settle=120, log=None, iterations=None):
+    """
+    This function is responsible for rebuilding whenever the dataset has changed and then stayed
+    unchanged for `settle` seconds, so a burst of edits produces one build. The first build and
+    new download scopes of an unchanged dataset are built on the next poll; an unchanged dataset
+    whose manifest is behind the live version or half-way to EXPORT_ARTIFACT_MAX_AGE is
+    republished, reusing its files. A failed poll is logged and retried on the next one.
+    """
+    log = log or (lambda message: None)
+    pending, pending_since = None, None
+    while iterations is None or iterations > 0:
+        try:
+            manifest = read_manifest()
+            live_version = dataset_version()
+            fingerprint = dataset_fingerprint()
+            if manifest is None:
+                build_artifacts(fingerprint, log, live_version)
+            elif fingerprint == manifest['version']:
+                pending = None
+                if (
+                    set(download_scopes()) - set(manifest['files'])
+                    or manifest.get('dataset_version') != live_version
+                    or manifest_age(manifest) >= timedelta(seconds=settings.EXPORT_ARTIFACT_MAX_AGE / 2)
+                ):
+                    build_artifacts(fingerprint, log, live_version)
+            elif fingerprint != pending:
+                pending, pending_since = fingerprint, time.monotonic()
+                log(f"Dataset changed ({fingerprint}); waiting {settle}s for edits to settle")
+            elif time.monotonic() - pending_since >= settle:
+                build_artifacts(fingerprint, log, live_version)
+                pending = None
+        except Exception as e:
+            # Downloads stream meanwhile, since the manifest no longer matches the live data
+            log(f"Export artifact build failed: {e!r}")
+        if iterations is not None:
+            iterations -= 1
+        time.sleep(interval)
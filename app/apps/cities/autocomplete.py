@@ -0,0 +1,126 @@
+"""
+This module is responsible for the in-worker municipality autocomplete index.
+The index is a sorted array of normalized keys (full names, every word start and IBGE codes)
+searched by binary prefix lookup, so keystroke queries never touch the database.
+"""
+from bisect import bisect_left
+from typing import NamedTuple, Optional
+
+from .hierarchy import SnapshotRegistry
+from .search import normalize_search_text
+
+# Key kinds, also the ranking: full-name prefixes before word prefixes before code prefixes
+NAME_PREFIX, WORD_PREFIX, CODE_PREFIX = 0, 1, 2
+
+
+class AutocompleteEntry(NamedTuple):
+    id: int
+    code: str
+    name: str
+    state_abbreviation: Optional[str]
+    # (level, id) nodes from the municipality up to its region, matched against permission scopes
+    path: tuple
+
+
+class AutocompleteIndex:
+    """
+    This class is responsible for holding one immutable autocomplete snapshot.
+    """
+
+    def __init__(self, version, entries):
+        self.version = version
+        self.entries = tuple(entries)
+        self.state_abbreviations = frozenset(
+            entry.state_abbreviation.casefold() for entry in self.entries if entry.state_abbreviation
+        )
+
+        keyed = []
+        for position, entry in enumerate(self.entries):
+            search_name = normalize_search_text(entry.name)
+            keyed.append((search_name, position, NAME_PREFIX))
+            for offset, char in enumerate(search_name):
+                if char == ' ' and offset + 1 < len(search_name):
+                    keyed.append((search_name[offset + 1:], position, WORD_PREFIX))
+            keyed.append((entry.code, position, CODE_PREFIX))
+        keyed.sort()
+        self.keys = [key for key, _, _ in keyed]
+        self.refs = [(position, kind) for _, position, kind in keyed]
+
+    @classmethod
+    def load(cls, version=None):
+        """
+        This method is responsible for building the index with a single query.
+        """
+        from .models import Municipality
+
+        rows = Municipality.objects.order_by().values_list(
+            'id',
+            'code',
+            'name',
+            'state__abbreviation',
+            'immediate_region_id',
+            'immediate_region__intermediate_region_id',
+            'state_id',
+            'region_id'
+        )
+        return cls(version, [
+            AutocompleteEntry(
+                id=pk,
+                code=code,
+                name=name,
+                state_abbreviation=abbreviation,
+                path=(
+                    ('municipality', pk),
+                    ('immediateregion', immediate_id),
+                    ('intermediateregion', intermediate_id),
+                    ('state', state_id),
+                    ('region', region_id),
+                )
+            )
+            for pk, code, name, abbreviation, immediate_id, intermediate_id, state_id, region_id in rows
+        ])
+
+    def search(self, query, limit=10, scopes=None):
+        """
+        This method is responsible for returning up to `limit` entries matching `query`.
+        A trailing state abbreviation narrows the state ("campos sp"). `scopes` is the set of
+        (level, id) nodes the user may see, or None for no restriction.
+        """
+        term = normalize_search_text(query)
+        tokens = term.split(' ')
+        state = None
+        if len(tokens) > 1 and tokens[-1] in self.state_abbreviations:
+            state = tokens.pop()
+            term = ' '.join(tokens)
+        if not term:
+            return []
+
+        best = {}
+        position = bisect_left(self.keys, term)
+        while position < len(self.keys) and self.keys[position].startswith(term):
+            entry_position, kind = self.refs[position]
+            if kind < best.get(entry_position, CODE_PREFIX + 1):
+                best[entry_position] = kind
+            position += 1
+
+        matches = []
+        for entry_position, kind in best.items():
+            entry = self.entries[entry_position]
+            if state and (entry.state_abbreviation or '').casefold() != state:
+                continue
+            if scopes is not None and not scopes.intersection(entry.path):
+                continue
+            matches.append((kind, len(entry.name), entry.name, entry))
+        matches.sort(key=lambda match: match[:3])
+        return [match[3] for match in matches[:limit]]
+
+
+class AutocompleteRegistry(SnapshotRegistry):
+    """
+    This class is responsible for handing out the current AutocompleteIndex of this worker.
+    """
+    version_key = 'cities_autocomplete:version'
+    snapshot_class = AutocompleteIndex
+
+
+municipality_autocomplete = AutocompleteRegistry()
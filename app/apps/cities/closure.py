@@ -0,0 +1,156 @@
+"""
+This module is responsible for maintaining the GeoClosure table, the transitive closure of the
+Region → State → IntermediateRegion → ImmediateRegion → Municipality hierarchy.
+"""
+from django.db import transaction
+
+from .models import GeoClosure, Region, State, IntermediateRegion, ImmediateRegion, Municipality
+
+GEO_MODELS = [Region, State, IntermediateRegion, ImmediateRegion, Municipality]
+
+
+def geo_node(obj):
+    """
+    This function is responsible for returning the (level, id) node of a hierarchy model instance.
+    """
+    return obj._meta.model_name, obj.pk
+
+
+def geo_parent(obj):
+    """
+    This function is responsible for returning the (level, id) node of an instance's parent,
+    or None for roots (regions, and states without a region).
+    """
+    if not obj.geo_parent_field:
+        return None
+    field = obj._meta.get_field(obj.geo_parent_field)
+    parent_id = getattr(obj, field.attname)
+    if parent_id is None:
+        return None
+    return field.related_model._meta.model_name, parent_id
+
+
+def build_closure_rows(parents):
+    """
+    This function is responsible for expanding a {node: parent_node} map into closure rows
+    (ancestor_level, ancestor_id, descendant_level, descendant_id, depth).
+    """
+    rows = []
+    for node in parents:
+        ancestor, depth = node, 0
+        while ancestor is not None:
+            rows.append((ancestor[0], ancestor[1], node[0], node[1], depth))
+            ancestor, depth = parents.get(ancestor), depth + 1
+    return rows
+
+
+def rebuild_geo_closure():
+    """
+    This function is responsible for recomputing the whole closure table from the hierarchy,
+    e.g. after loaddata or bulk updates that bypass signals. Returns the number of rows written.
+    """
+    parents = {}
+    for model in GEO_MODELS:
+        level = model._meta.model_name
+        if model.geo_parent_field is None:
+            parents.update({(level, pk): None for pk in model.objects.values_list('pk', flat=True)})
+            continue
+        field = model._meta.get_field(model.geo_parent_field)
+        parent_level = field.related_model._meta.model_name
+        for pk, parent_id in model.objects.values_list('pk', field.attname):
+            parents[(level, pk)] = (parent_level, parent_id) if parent_id is not None else None
+
+    rows = build_closure_rows(parents)
+    with transaction.atomic():
+        GeoClosure.objects.all().delete()
+        GeoClosure.objects.bulk_create(
+            [
+                GeoClosure(
+                    ancestor_level=ancestor_level,
+                    ancestor_id=ancestor_id,
+                    descendant_level=descendant_level,
+                    descendant_id=descendant_id,
+                    depth=depth
+                )
+                for ancestor_level, ancestor_id, descendant_level, descendant_id, depth in rows
+            ],
+            batch_size=5000
+        )
+    return len(rows)
+
+
+def place_geo_node(obj):
+    """
+    This function is responsible for inserting a node, or moving it with its whole subtree,
+    under its current parent. A no-op when the stored parent already matches.
+    """
+    level, node_id = geo_node(obj)
+    parent = geo_parent(obj)
+
+    with transaction.atomic():
+        ancestors = {
+            depth: (ancestor_level, ancestor_id)
+            for ancestor_level, ancestor_id, depth in GeoClosure.objects.filter(
+                descendant_level=level,
+                descendant_id=node_id,
+                depth__lte=1
+            ).values_list('ancestor_level', 'ancestor_id', 'depth')
+        }
+        if 0 in ancestors and ancestors.get(1) == parent:
+            return
+
+        if 0 not in ancestors:
+            GeoClosure.objects.create(
+                ancestor_level=level, ancestor_id=node_id,
+                descendant_level=level, descendant_id=node_id,
+                depth=0
+            )
+        subtree = list(
+            GeoClosure.objects.filter(
+                ancestor_level=level,
+                ancestor_id=node_id
+            ).values_list('descendant_level', 'descendant_id', 'depth')
+        )
+
+        # Levels are strict, so every descendant k steps below the node shares one level and
+        # its rows deeper than k are exactly the ones pointing above the node
+        by_depth = {}
+        for descendant_level, descendant_id, depth in subtree:
+            by_depth.setdefault((depth, descendant_level), []).append(descendant_id)
+        for (depth, descendant_level), descendant_ids in by_depth.items():
+            GeoClosure.objects.filter(
+                descendant_level=descendant_level,
+                descendant_id__in=descendant_ids,
+                depth__gt=depth
+            ).delete()
+
+        if parent is None:
+            return
+        new_ancestors = GeoClosure.objects.filter(
+            descendant_level=parent[0],
+            descendant_id=parent[1]
+        ).values_list('ancestor_level', 'ancestor_id', 'depth')
+        GeoClosure.objects.bulk_create(
+            [
+                GeoClosure(
+                    ancestor_level=ancestor_level,
+                    ancestor_id=ancestor_id,
+                    descendant_level=descendant_level,
+                    descendant_id=descendant_id,
+                    depth=parent_depth + 1 + depth
+                )
+                for ancestor_level, ancestor_id, parent_depth in new_ancestors
+                for descendant_level, descendant_id, depth in subtree
+            ],
+            batch_size=5000
+        )
+
+
+def remove_geo_node(obj):
+    """
+    This function is responsible for dropping every closure row of a deleted node.
+    Descendants removed by the cascade are cleaned up by their own delete signals.
+    """
+    level, node_id = geo_node(obj)
+    GeoClosure.objects.filter(descendant_level=level, descendant_id=node_id).delete()
+    GeoClosure.objects.filter(ancestor_level=level, ancestor_id=node_id).delete()
@@ -0,0 +1,133 @@
+"""
+This module is responsible for exporting municipalities as CSV, JSON, JSON Lines or XLSX.
+Rows are read as tuples with `.iterator()` and written out as they come, so memory stays flat
+whatever the number of rows: text formats are streamed to the client as they are produced (JSON
+in small batches, encoded by apps.core.serialization), and
+XLSX is written by openpyxl in write-only mode to a temporary file that is then streamed.
+"""
+import csv
+import tempfile
+
+from apps.core.serialization import record_mapper, stream_json_array, stream_json_lines
+
+EXPORT_CHUNK_SIZE = 2000
+
+# Column key -> (header, queryset lookup)
+EXPORT_COLUMNS = {
+    'code': ('Código IBGE', 'code'),
+    'name': ('Município', 'name'),
+    'state': ('Estado', 'state__name'),
+    'state_abbreviation': ('UF', 'state__abbreviation'),
+    'state_code': ('Código UF', 'state__code'),
+    'region': ('Região', 'region__name'),
+    'immediate_region': ('Região Imediata', 'immediate_region__name'),
+    'is_capital': ('Capital', 'is_capital'),
+    'seaf_category': ('Categoria SEAF', 'seaf_category'),
+    'mayor_name': ('Prefeito', 'mayor_name'),
+    'mayor_party': ('Partido', 'mayor_party'),
+    'mayor_mandate_start': ('Início do Mandato', 'mayor_mandate_start'),
+    'mayor_mandate_end': ('Fim do Mandato', 'mayor_mandate_end'),
+    'latitude': ('Latitude', 'latitude'),
+    'longitude': ('Longitude', 'longitude'),
+    'area_code': ('DDD', 'area_code'),
+    'timezone': ('Fuso Horário', 'timezone'),
+    'siafi_id': ('Código SIAFI', 'siafi_id'),
+    'population': ('População', 'population'),
+    'area_km2': ('Área (km²)', 'area_km2'),
+    'density': ('Densidade (hab./km²)', 'density'),
+    'idh': ('IDH', 'idh'),
+    'gini': ('Gini', 'gini'),
+    'gdp': ('PIB (R$)', 'gdp'),
+    'gdp_per_capita': ('PIB per Capita (R$)', 'gdp_per_capita'),
+    'altitude_m': ('Altitude (m)', 'altitude_m'),
+}
+
+# The columns of the original JSON download
+DEFAULT_COLUMNS = ['code', 'name', 'state', 'state_code']
+
+EXPORT_FORMATS = {
+    'json': ('application/json', 'json'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    # Only served from the pre-built artifacts (see artifacts.py)
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def parse_columns(value):
+    """
+    This function is responsible for reading a comma-separated ?columns= value.
+    Returns the column keys, or raises ValueError naming the unknown ones.
+    """
+    if not value:
+        return list(DEFAULT_COLUMNS)
+    if value == 'all':
+        return list(EXPORT_COLUMNS)
+    columns = [column.strip() for column in value.split(',') if column.strip()]
+    unknown = [column for column in columns if column not in EXPORT_COLUMNS]
+    if unknown or not columns:
+        raise ValueError(f"Unknown columns: {', '.join(unknown) or value}")
+    return columns
+
+
+def export_rows(queryset, columns):
+    """
+    This function is responsible for iterating the selected columns as tuples in chunks.
+    """
+    lookups = [EXPORT_COLUMNS[column][1] for column in columns]
+    return queryset.order_by('name', 'id').values_list(*lookups).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+class Echo:
+    """
+    This class is responsible for handing back whatever csv.writer writes, so each row can be yielded.
+    """
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows, columns):
+    writer = csv.writer(Echo())
+    # BOM so spreadsheet software opens the UTF-8 accents correctly
+    yield '\ufeff' + writer.writerow([EXPORT_COLUMNS[column][0] for column in columns])
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_jsonl(rows, columns):
+    return stream_json_lines(map(record_mapper(columns), rows))
+
+
+def stream_json(rows, columns):
+    """
+    This function is responsible for streaming the original {"cities": [...]} document in batches of rows.
+    """
+    return stream_json_array(map(record_mapper(columns), rows), prefix=b'{"cities":[', suffix=b']}')
+
+
+def write_xlsx(rows, columns, output):
+    """
+    This function is responsible for writing an XLSX workbook in openpyxl write-only mode, which
+    flushes each row to disk instead of holding the sheet in memory.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Municípios')
+    sheet.append([EXPORT_COLUMNS[column][0] for column in columns])
+    for row in rows:
+        sheet.append(row)
+    workbook.save(output)
+    return output
+
+
+def xlsx_file(rows, columns):
+    """
+    This function is responsible for returning a rewound temporary file holding the XLSX export.
+    """
+    output = tempfile.TemporaryFile()
+    write_xlsx(rows, columns, output)
+    output.seek(0)
+    return output
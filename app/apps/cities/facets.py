@@ -0,0 +1,137 @@
+"""
+This module is responsible for the result and facet counts of the city list filters.
+All counts for one filter set come from a single GROUP BY query, cached per filter set and
+permission scope under a dataset version that is bumped on every municipality write.
+"""
+import hashlib
+import uuid
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+from typing import NamedTuple, Optional, Union
+
+from django.core.cache import cache
+from django.db import models, transaction
+
+from .indicators import INDICATOR_SOURCES
+from .search import normalize_search_text, search_municipalities
+
+DATASET_VERSION_KEY = 'cities_dataset:version'
+FACET_CACHE_TIMEOUT = 60 * 60
+FACET_FIELDS = ['seaf_category', 'is_capital', 'state_id', 'region_id', 'mayor_party']
+
+
+class CityFilters(NamedTuple):
+    search: str
+    is_capital: bool
+    # A category number, 'null' for municipalities without one, or None for no filter
+    seaf_category: Optional[Union[int, str]]
+    # (indicator, minimum, maximum) bounds from ?<indicator>_min= / ?<indicator>_max=, as Decimals or None
+    ranges: tuple = ()
+
+    @classmethod
+    def from_query(cls, params):
+        """
+        This method is responsible for normalizing the filter query parameters of the city list.
+        """
+        seaf_category = params.get('seaf_category', '')
+        if seaf_category == 'null':
+            category = 'null'
+        elif seaf_category.isdigit():
+            category = int(seaf_category)
+        else:
+            category = None
+        ranges = []
+        for indicator in INDICATOR_SOURCES:
+            bounds = (parse_bound(params.get(f"{indicator}_min")), parse_bound(params.get(f"{indicator}_max")))
+            if bounds != (None, None):
+                ranges.append((indicator, *bounds))
+        return cls(
+            search=normalize_search_text(params.get('search', '')),
+            is_capital=params.get('is_capital', '') == 'true',
+            seaf_category=category,
+            ranges=tuple(ranges)
+        )
+
+    def apply(self, queryset):
+        """
+        This method is responsible for filtering a Municipality queryset; searches come back ranked by relevance.
+        """
+        if self.search:
+            queryset = search_municipalities(queryset, self.search)
+        if self.is_capital:
+            queryset = queryset.filter(is_capital=True)
+        if self.seaf_category == 'null':
+            queryset = queryset.filter(seaf_category__isnull=True)
+        elif self.seaf_category is not None:
+            queryset = queryset.filter(seaf_category=self.seaf_category)
+        for indicator, minimum, maximum in self.ranges:
+            if minimum is not None:
+                queryset = queryset.filter(**{f"{indicator}__gte": minimum})
+            if maximum is not None:
+                queryset = queryset.filter(**{f"{indicator}__lte": maximum})
+        return queryset
+
+
+def parse_bound(value):
+    """
+    This function is responsible for reading a range filter bound, ignoring blank or invalid input.
+    """
+    try:
+        bound = Decimal(value.strip())
+    except (AttributeError, InvalidOperation):
+        return None
+    # Beyond any indicator column's range, and too large for the integer columns' parameters
+    if not bound.is_finite() or abs(bound) >= 10 ** 18:
+        return None
+    return bound.normalize()
+
+
+def dataset_version():
+    version = cache.get(DATASET_VERSION_KEY)
+    if version is None:
+        cache.add(DATASET_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(DATASET_VERSION_KEY)
+    return version
+
+
+def bump_dataset_version():
+    """
+    This function is responsible for orphaning every cached count after municipality data changes.
+    Bumped again on commit so counts cached mid-transaction can't outlive it.
+    """
+    def bump():
+        cache.set(DATASET_VERSION_KEY, uuid.uuid4().hex, None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def compute_facets(queryset):
+    """
+    This function is responsible for counting a filtered queryset per facet value in one query:
+    rows are grouped by every facet column at once and folded into per-facet counts.
+    """
+    counts = {field: Counter() for field in FACET_FIELDS}
+    total = 0
+    for row in queryset.order_by().values(*FACET_FIELDS).annotate(facet_count=models.Count('id')):
+        for field in FACET_FIELDS:
+            counts[field][row[field]] += row['facet_count']
+        total += row['facet_count']
+    return {'total': total, **{field: dict(counter) for field, counter in counts.items()}}
+
+
+def get_facets(queryset, filters, scopes):
+    """
+    This function is responsible for returning the cached facets of `queryset`, which must be the
+    municipalities under `filters` visible through `scopes` (None for unrestricted access).
+    Users with the same scopes share entries.
+    """
+    scope_key = None if scopes is None else sorted(scopes)
+    digest = hashlib.sha1(repr((tuple(filters), scope_key)).encode()).hexdigest()
+    key = f"cities_facets:{dataset_version()}:{digest}"
+
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(queryset)
+        cache.set(key, facets, FACET_CACHE_TIMEOUT)
+    return facets
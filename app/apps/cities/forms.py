@@ -1,35 +1,15 @@
 from django import forms
-from .models import Municipality
+from .models import Municipality, MunicipalityWikiProfile
 
 
-class MunicipalityEditForm(forms.ModelForm):
+class MunicipalityWikiProfileForm(forms.ModelForm):
     """
-    This class is responsible for creating a form to edit municipality data with proper pt_BR labels.
+    This class is responsible for the Wikipedia infobox fields of a municipality with pt_BR labels.
     """
     
-    seaf_category = forms.TypedChoiceField(
-        label='Categoria SEAF',
-        choices=[
-            ('', '---------'),
-            (1, 'Categoria 1'),
-            (2, 'Categoria 2'),
-            (3, 'Categoria 3'),
-            (4, 'Categoria 4'),
-        ],
-        coerce=lambda x: int(x) if x else None,
-        required=False,
-        empty_value=None,
-        widget=forms.Select(attrs={'class': 'form-select'})
-    )
-    
     class Meta:
-        model = Municipality
+        model = MunicipalityWikiProfile
         fields = [
-            'seaf_category',
-            'mayor_name',
-            'mayor_party',
-            'mayor_mandate_start',
-            'mayor_mandate_end',
             'wiki_demonym',
             'wiki_altitude',
             'wiki_total_area',
@@ -50,10 +30,6 @@ class MunicipalityEditForm(forms.ModelForm):
         ]
         
         labels = {
-            'mayor_name': 'Nome do Prefeito',
-            'mayor_party': 'Partido do Prefeito',
-            'mayor_mandate_start': 'Início do Mandato',
-            'mayor_mandate_end': 'Fim do Mandato',
             'wiki_demonym': 'Gentílico',
             'wiki_altitude': 'Altitude',
             'wiki_total_area': 'Área Total',
@@ -74,10 +50,6 @@ class MunicipalityEditForm(forms.ModelForm):
         }
         
         widgets = {
-            'mayor_name': forms.TextInput(attrs={'class': 'form-input', 'placeholder': 'Nome completo do prefeito'}),
-            'mayor_party': forms.TextInput(attrs={'class': 'form-input', 'placeholder': 'Sigla do partido'}),
-            'mayor_mandate_start': forms.NumberInput(attrs={'class': 'form-input', 'placeholder': 'Ano'}),
-            'mayor_mandate_end': forms.NumberInput(attrs={'class': 'form-input', 'placeholder': 'Ano'}),
             'wiki_demonym': forms.TextInput(attrs={'class': 'form-input', 'placeholder': 'Ex: paulistano, carioca'}),
             'wiki_altitude': forms.TextInput(attrs={'class': 'form-input', 'placeholder': 'Ex: 760 m'}),
             'wiki_total_area': forms.TextInput(attrs={'class': 'form-input', 'placeholder': 'Ex: 1521.11 km²'}),
@@ -98,8 +70,6 @@ class MunicipalityEditForm(forms.ModelForm):
         }
         
         help_texts = {
-            'mayor_mandate_start': 'Ano de início do mandato (ex: 2021)',
-            'mayor_mandate_end': 'Ano de término do mandato (ex: 2024)',
             'wiki_idh': 'Índice de Desenvolvimento Humano',
             'wiki_gini': 'Coeficiente de desigualdade social (0 a 1)',
         }
@@ -109,6 +79,74 @@ class MunicipalityEditForm(forms.ModelForm):
         This method is responsible for skipping URL validation for wiki_website field.
         """
         return self.cleaned_data.get('wiki_website', '')
+
+
+class MunicipalityEditForm(forms.ModelForm):
+    """
+    This class is responsible for creating a form to edit municipality data with proper pt_BR labels.
+    """
+    
+    seaf_category = forms.TypedChoiceField(
+        label='Categoria SEAF',
+        choices=[
+            ('', '---------'),
+            (1, 'Categoria 1'),
+            (2, 'Categoria 2'),
+            (3, 'Categoria 3'),
+            (4, 'Categoria 4'),
+        ],
+        coerce=lambda x: int(x) if x else None,
+        required=False,
+        empty_value=None,
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    
+    class Meta:
+        model = Municipality
+        fields = [
+            'seaf_category',
+            'mayor_name',
+            'mayor_party',
+            'mayor_mandate_start',
+            'mayor_mandate_end',
+        ]
+        
+        labels = {
+            'mayor_name': 'Nome do Prefeito',
+            'mayor_party': 'Partido do Prefeito',
+            'mayor_mandate_start': 'Início do Mandato',
+            'mayor_mandate_end': 'Fim do Mandato',
+        }
+        
+        widgets = {
+            'mayor_name': forms.TextInput(attrs={'class': 'form-input', 'placeholder': 'Nome completo do prefeito'}),
+            'mayor_party': forms.TextInput(attrs={'class': 'form-input', 'placeholder': 'Sigla do partido'}),
+            'mayor_mandate_start': forms.NumberInput(attrs={'class': 'form-input', 'placeholder': 'Ano'}),
+            'mayor_mandate_end': forms.NumberInput(attrs={'class': 'form-input', 'placeholder': 'Ano'}),
+        }
+        
+        help_texts = {
+            'mayor_mandate_start': 'Ano de início do mandato (ex: 2021)',
+            'mayor_mandate_end': 'Ano de término do mandato (ex: 2024)',
+        }
+    
+    def __init__(self, *args, **kwargs):
+        """
+        This method is responsible for adding the Wikipedia profile fields, which live in their own
+        table, so the form edits both rows as one.
+        """
+        super().__init__(*args, **kwargs)
+        try:
+            self.wiki_profile = self.instance.wiki_profile
+        except MunicipalityWikiProfile.DoesNotExist:
+            self.wiki_profile = MunicipalityWikiProfile(municipality=self.instance)
+        
+        wiki_form = MunicipalityWikiProfileForm(instance=self.wiki_profile)
+        for field_name, field in wiki_form.fields.items():
+            self.fields[field_name] = field
+            self.initial.setdefault(field_name, wiki_form.initial.get(field_name))
+    
+    clean_wiki_website = MunicipalityWikiProfileForm.clean_wiki_website
     
     def clean(self):
         """
@@ -124,7 +162,20 @@ class MunicipalityEditForm(forms.ModelForm):
                     del self.errors[field_name]
                     # Restore original value for unchanged fields with errors
                     if field_name in cleaned_data:
-                        cleaned_data[field_name] = getattr(self.instance, field_name)
+                        cleaned_data[field_name] = self.initial.get(field_name)
         
         return cleaned_data
+    
+    def save(self, commit=True):
+        """
+        This method is responsible for saving the municipality and its Wikipedia profile; a missing
+        profile is only created once a Wikipedia field is filled in.
+        """
+        municipality = super().save(commit=commit)
+        wiki_fields = MunicipalityWikiProfileForm._meta.fields
+        for field_name in wiki_fields:
+            setattr(self.wiki_profile, field_name, self.cleaned_data.get(field_name))
+        if commit and (not self.wiki_profile._state.adding or set(wiki_fields) & set(self.changed_data)):
+            self.wiki_profile.save()
+        return municipality
 
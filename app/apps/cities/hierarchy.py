@@ -0,0 +1,220 @@
+"""
+This module is responsible for keeping an immutable, versioned in-memory copy of the geographic
+hierarchy (Region → State → IntermediateRegion → ImmediateRegion) in every worker, so region
+resolution and labels never walk foreign keys in the database.
+"""
+import threading
+import time
+import uuid
+from types import MappingProxyType
+from typing import NamedTuple, Optional
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import transaction
+
+
+class RegionNode(NamedTuple):
+    id: int
+    code: str
+    name: str
+
+
+class StateNode(NamedTuple):
+    id: int
+    code: str
+    name: str
+    abbreviation: Optional[str]
+    region_id: Optional[int]
+
+
+class IntermediateRegionNode(NamedTuple):
+    id: int
+    code: str
+    name: str
+    state_id: int
+
+
+class ImmediateRegionNode(NamedTuple):
+    id: int
+    code: str
+    name: str
+    intermediate_region_id: int
+
+
+class GeoHierarchy:
+    """
+    This class is responsible for holding one immutable snapshot of the hierarchy.
+    Lookups raise KeyError for IDs that were not present when the snapshot was loaded.
+    """
+
+    def __init__(self, version, regions, states, intermediate_regions, immediate_regions):
+        self.version = version
+        self.regions = MappingProxyType(regions)
+        self.states = MappingProxyType(states)
+        self.intermediate_regions = MappingProxyType(intermediate_regions)
+        self.immediate_regions = MappingProxyType(immediate_regions)
+
+    @classmethod
+    def load(cls, version=None):
+        """
+        This method is responsible for loading the whole hierarchy with one query per level.
+        """
+        from .models import Region, State, IntermediateRegion, ImmediateRegion
+
+        return cls(
+            version,
+            regions={
+                row[0]: RegionNode(*row)
+                for row in Region.objects.order_by().values_list('id', 'code', 'name')
+            },
+            states={
+                row[0]: StateNode(*row)
+                for row in State.objects.order_by().values_list('id', 'code', 'name', 'abbreviation', 'region_id')
+            },
+            intermediate_regions={
+                row[0]: IntermediateRegionNode(*row)
+                for row in IntermediateRegion.objects.order_by().values_list('id', 'code', 'name', 'state_id')
+            },
+            immediate_regions={
+                row[0]: ImmediateRegionNode(*row)
+                for row in ImmediateRegion.objects.order_by().values_list(
+                    'id', 'code', 'name', 'intermediate_region_id'
+                )
+            },
+        )
+
+    def state_for_intermediate_region(self, intermediate_region_id):
+        return self.states[self.intermediate_regions[intermediate_region_id].state_id]
+
+    def state_for_immediate_region(self, immediate_region_id):
+        immediate = self.immediate_regions[immediate_region_id]
+        return self.state_for_intermediate_region(immediate.intermediate_region_id)
+
+    def region_id_for(self, obj):
+        """
+        This method is responsible for resolving the macro Region ID of any hierarchy model instance,
+        using its foreign key IDs so unsaved instances resolve too.
+        """
+        model_name = obj._meta.model_name
+        if model_name == 'region':
+            return obj.pk
+        if model_name == 'state':
+            return obj.region_id
+        if model_name == 'intermediateregion':
+            return self.states[obj.state_id].region_id
+        if model_name == 'immediateregion':
+            return self.state_for_intermediate_region(obj.intermediate_region_id).region_id
+        if model_name == 'municipality':
+            return self.state_for_immediate_region(obj.immediate_region_id).region_id
+        return None
+
+    def path_for(self, obj):
+        """
+        This method is responsible for listing the (level, id) nodes from an instance up to its
+        macro Region, matching GeoClosure levels. Unsaved instances start at their parent.
+        """
+        model_name = obj._meta.model_name
+        path = [(model_name, obj.pk)] if obj.pk is not None else []
+        if model_name == 'municipality':
+            path.append(('immediateregion', obj.immediate_region_id))
+            obj, model_name = self.immediate_regions[obj.immediate_region_id], 'immediateregion'
+        if model_name == 'immediateregion':
+            path.append(('intermediateregion', obj.intermediate_region_id))
+            obj, model_name = self.intermediate_regions[obj.intermediate_region_id], 'intermediateregion'
+        if model_name == 'intermediateregion':
+            path.append(('state', obj.state_id))
+            obj, model_name = self.states[obj.state_id], 'state'
+        if model_name == 'state' and obj.region_id is not None:
+            path.append(('region', obj.region_id))
+        return path
+
+
+class SnapshotRegistry:
+    """
+    This class is responsible for handing out the current immutable snapshot of this worker.
+    The snapshot (`snapshot_class.load(version)`) is loaded on first use and reloaded when the
+    version token shared through the Django cache changes; the token is checked at most every
+    `check_interval` seconds.
+    """
+    version_key = None
+    snapshot_class = None
+    check_interval = 5
+
+    def __init__(self):
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _shared_version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, uuid.uuid4().hex, None)
+            version = cache.get(self.version_key)
+        return version
+
+    def get(self):
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and now - self._checked_at < self.check_interval:
+            return snapshot
+
+        with self._lock:
+            version = self._shared_version()
+            self._checked_at = now
+            if self._snapshot is None or self._snapshot.version != version:
+                self._snapshot = self.snapshot_class.load(version)
+            return self._snapshot
+
+    async def aget(self):
+        """
+        This method is responsible for the async counterpart of get(); only a reload leaves the event loop.
+        """
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return snapshot
+        return await sync_to_async(self.get)()
+
+    def refresh(self):
+        """
+        This method is responsible for forcing a reload on the next access in this worker.
+        """
+        self._snapshot = None
+        return self.get()
+
+    def invalidate(self):
+        """
+        This method is responsible for publishing a new version so every worker reloads.
+        Published again on commit so a worker reloading mid-transaction can't keep stale data.
+        """
+        def bump():
+            cache.set(self.version_key, uuid.uuid4().hex, None)
+            self._snapshot = None
+
+        bump()
+        transaction.on_commit(bump)
+
+
+class GeoHierarchyRegistry(SnapshotRegistry):
+    """
+    This class is responsible for handing out the current GeoHierarchy of this worker.
+    """
+    version_key = 'geo_hierarchy:version'
+    snapshot_class = GeoHierarchy
+
+    def lookup(self, func, default=None):
+        """
+        This method is responsible for running `func(hierarchy)`, reloading once if it references
+        an ID this worker has not seen yet. Returns `default` if the ID is still unknown.
+        """
+        try:
+            return func(self.get())
+        except KeyError:
+            pass
+        try:
+            return func(self.refresh())
+        except KeyError:
+            return default
+
+
+geo_hierarchy = GeoHierarchyRegistry()
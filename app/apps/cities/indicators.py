@@ -0,0 +1,131 @@
+"""
+This module is responsible for parsing the free-text Wikipedia infobox indicators into numbers.
+Infobox values are pt-BR formatted ("12.325.232", "7.398,26 hab./km²", "R$ 699,28 bilhões"); the
+parsed values are stored in typed, indexed Municipality columns so they can be sorted, filtered
+and aggregated in SQL.
+"""
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection, models
+
+from .search import normalize_search_text
+
+# Municipality column -> MunicipalityWikiProfile source column
+INDICATOR_SOURCES = {
+    'population': 'wiki_population',
+    'area_km2': 'wiki_total_area',
+    'density': 'wiki_density',
+    'idh': 'wiki_idh',
+    'gini': 'wiki_gini',
+    'gdp': 'wiki_gdp',
+    'gdp_per_capita': 'wiki_gdp_per_capita',
+    'altitude_m': 'wiki_altitude',
+}
+
+# Scale words as they appear after accent folding; the longer forms must be tried first
+SCALE_WORDS = [
+    ('trilhoes', 10 ** 12), ('trilhao', 10 ** 12), ('tri', 10 ** 12),
+    ('bilhoes', 10 ** 9), ('bilhao', 10 ** 9), ('bi', 10 ** 9),
+    ('milhoes', 10 ** 6), ('milhao', 10 ** 6), ('mi', 10 ** 6),
+    ('mil', 10 ** 3),
+]
+
+# Digits with separators, including space-grouped thousands ("12 325 232")
+NUMBER_PATTERN = re.compile(r'-?\d(?:[\d.,]|\s(?=\d{3}(?!\d)))*')
+SCALE_PATTERN = re.compile(r'\s*(' + '|'.join(word for word, _ in SCALE_WORDS) + r')\b')
+
+
+def parse_decimal(text):
+    """
+    This function is responsible for reading the first number in pt-BR (or plain) notation,
+    applying a following scale word. Returns a Decimal, or None when there is no number.
+
+    With both separators the last one is the decimal separator. A lone comma is decimal; a lone
+    dot followed by exactly three digits is a thousands separator ("12.325") unless the integer
+    part is zero ("0.805").
+    """
+    folded = normalize_search_text(text)
+    match = NUMBER_PATTERN.search(folded)
+    if not match:
+        return None
+
+    number = re.sub(r'\s', '', match.group()).rstrip('.,')
+    dots, commas = number.count('.'), number.count(',')
+    if dots and commas:
+        decimal_separator = '.' if number.rfind('.') > number.rfind(',') else ','
+    elif commas:
+        # pt-BR decimal comma; several commas can only be (English) thousands separators
+        decimal_separator = ',' if commas == 1 else None
+    elif dots == 1:
+        integer, _, fraction = number.partition('.')
+        decimal_separator = None if len(fraction) == 3 and integer.lstrip('-') != '0' else '.'
+    else:
+        decimal_separator = None
+
+    if decimal_separator:
+        integer, _, fraction = number.rpartition(decimal_separator)
+        number = f"{re.sub(r'[.,]', '', integer)}.{fraction}"
+    else:
+        number = re.sub(r'[.,]', '', number)
+
+    try:
+        value = Decimal(number)
+    except InvalidOperation:
+        return None
+
+    scale = SCALE_PATTERN.match(folded, match.end())
+    if scale:
+        value *= dict(SCALE_WORDS)[scale.group(1)]
+    return value
+
+
+def fit_decimal(value, field):
+    """
+    This function is responsible for converting a parsed value to what `field` can store,
+    returning None when it does not fit.
+    """
+    if value is None:
+        return None
+    if isinstance(field, models.DecimalField):
+        value = value.quantize(Decimal(1).scaleb(-field.decimal_places))
+        if len(value.as_tuple().digits) > field.max_digits:
+            return None
+        return value
+    value = int(value)
+    low, high = connection.ops.integer_field_range(field.get_internal_type())
+    return value if low <= value <= high else None
+
+
+def parse_indicators(values):
+    """
+    This function is responsible for computing every typed indicator column from a mapping (or
+    object) holding the wiki_* source strings. Sources that are missing parse to None.
+    """
+    from .models import Municipality
+
+    get = values.get if isinstance(values, dict) else lambda name: getattr(values, name, None)
+    return {
+        column: fit_decimal(parse_decimal(get(source)), Municipality._meta.get_field(column))
+        for column, source in INDICATOR_SOURCES.items()
+    }
+
+
+def sync_indicator_columns(batch_size=1000):
+    """
+    This function is responsible for recomputing the indicator columns of every municipality
+    from its Wikipedia profile in one read and batched updates. Returns the number of rows changed.
+    """
+    from .models import Municipality
+
+    columns = list(INDICATOR_SOURCES)
+    sources = [f"wiki_profile__{source}" for source in INDICATOR_SOURCES.values()]
+    changed = []
+    for row in Municipality.objects.order_by().values('id', *columns, *sources).iterator(chunk_size=batch_size):
+        parsed = parse_indicators({
+            source: row[f"wiki_profile__{source}"] for source in INDICATOR_SOURCES.values()
+        })
+        if any(parsed[column] != row[column] for column in columns):
+            changed.append(Municipality(id=row['id'], **parsed))
+    Municipality.objects.bulk_update(changed, columns, batch_size=batch_size)
+    return len(changed)
@@ -0,0 +1,43 @@
+"""
+This management command is responsible for building the pre-generated municipality export files
+served by the download view, once or continuously in the background.
+"""
+from django.core.management.base import BaseCommand
+
+from apps.cities.artifacts import build_artifacts, dataset_fingerprint, watch_artifacts
+
+
+class Command(BaseCommand):
+    help = 'Build the versioned CSV/JSONL/XLSX/Parquet municipality exports for every download scope'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--watch',
+            action='store_true',
+            help='Keep running, rebuilding after municipality edits settle',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=30,
+            help='Seconds between dataset checks in --watch mode (default: 30)',
+        )
+        parser.add_argument(
+            '--settle',
+            type=int,
+            default=120,
+            help='Seconds without further edits before rebuilding in --watch mode (default: 120)',
+        )
+
+    def handle(self, *args, **options):
+        log = self.stdout.write
+
+        if options['watch']:
+            self.stdout.write('Watching municipality data for export changes...')
+            watch_artifacts(interval=options['interval'], settle=options['settle'], log=log)
+            return
+
+        version = dataset_fingerprint()
+        self.stdout.write(f'Building export artifacts for dataset version {version}...')
+        manifest = build_artifacts(version, log=log)
+        self.stdout.write(self.style.SUCCESS(f"✓ {len(manifest['files'])} download scopes ready"))
@@ -54,9 +54,7 @@ class Command(BaseCommand):
             self.stdout.write(self.style.WARNING('DRY RUN MODE - No data will be saved'))
 
         # Get municipalities
-        municipalities_qs = Municipality.objects.select_related(
-            'immediate_region__intermediate_region__state'
-        ).all()
+        municipalities_qs = Municipality.objects.select_related('state').all()
         
         if limit:
             municipalities_qs = municipalities_qs[:limit]
@@ -130,7 +128,7 @@ class Command(BaseCommand):
 
     def _query_wikidata_for_municipality(self, sparql, municipality) -> Optional[Dict[str, Any]]:
         """Query Wikidata for a specific municipality's mayor data"""
-        state_abbr = municipality.immediate_region.intermediate_region.state.abbreviation
+        state_abbr = municipality.state.abbreviation
         
         # Build SPARQL query
         query = f"""
@@ -141,7 +139,7 @@ class Command(BaseCommand):
           ?state wdt:P31 wd:Q485258;  # instance of state of Brazil
                  rdfs:label ?stateLabel.
           FILTER(LANG(?stateLabel) = "pt")
-          FILTER(CONTAINS(?stateLabel, "{state_abbr}") || CONTAINS(?stateLabel, "{municipality.immediate_region.intermediate_region.state.name}"))
+          FILTER(CONTAINS(?stateLabel, "{state_abbr}") || CONTAINS(?stateLabel, "{municipality.state.name}"))
           
           ?city wdt:P6 ?mayor.  # head of government
           OPTIONAL {{ ?mayor wdt:P102 ?party. }}
@@ -209,7 +207,7 @@ class Command(BaseCommand):
 
     def _scrape_wikipedia_for_municipality(self, municipality) -> Optional[Dict[str, Any]]:
         """Scrape Wikipedia page for municipality mayor data"""
-        state_abbr = municipality.immediate_region.intermediate_region.state.abbreviation
+        state_abbr = municipality.state.abbreviation
         
         # Try different URL patterns
         url_patterns = [
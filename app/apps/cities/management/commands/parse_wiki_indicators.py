@@ -0,0 +1,28 @@
+"""
+This management command is responsible for backfilling the typed indicator columns of every
+municipality from its Wikipedia profile strings.
+"""
+from django.core.management.base import BaseCommand
+
+from apps.cities.facets import bump_dataset_version
+from apps.cities.indicators import sync_indicator_columns
+
+
+class Command(BaseCommand):
+    help = 'Parse Wikipedia infobox indicators (population, area, IDH, GDP, ...) into numeric columns'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows read and updated per batch (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Parsing Wikipedia indicators for all municipalities...')
+
+        changed = sync_indicator_columns(batch_size=options['batch_size'])
+        if changed:
+            bump_dataset_version()
+        self.stdout.write(self.style.SUCCESS(f'✓ {changed} municipalities updated'))
@@ -0,0 +1,17 @@
+"""
+This management command is responsible for recomputing the SEAF rollup totals of every
+hierarchy node from the municipalities.
+"""
+from django.core.management.base import BaseCommand
+
+from apps.cities.rollups import rebuild_seaf_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the SEAF category totals of every region, state, intermediate and immediate region'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding SEAF rollups...')
+
+        rows = rebuild_seaf_rollups()
+        self.stdout.write(self.style.SUCCESS(f'✓ {rows} rollup rows written'))
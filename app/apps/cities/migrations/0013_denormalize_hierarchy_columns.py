@@ -0,0 +1,60 @@
+# Generated by Django 5.2.7 on 2026-10-16 19:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_hierarchy_columns(apps, schema_editor):
+    """
+    This function is responsible for backfilling the denormalized state/region columns
+    with set-based UPDATEs, top-down so each level reads the one above it.
+    """
+    State = apps.get_model('cities', 'State')
+    IntermediateRegion = apps.get_model('cities', 'IntermediateRegion')
+    ImmediateRegion = apps.get_model('cities', 'ImmediateRegion')
+    Municipality = apps.get_model('cities', 'Municipality')
+
+    IntermediateRegion.objects.update(
+        region_id=models.Subquery(State.objects.filter(pk=models.OuterRef('state_id')).values('region_id')[:1])
+    )
+    ImmediateRegion.objects.update(
+        region_id=models.Subquery(
+            IntermediateRegion.objects.filter(pk=models.OuterRef('intermediate_region_id')).values('region_id')[:1]
+        )
+    )
+    immediate = ImmediateRegion.objects.filter(pk=models.OuterRef('immediate_region_id'))
+    Municipality.objects.update(
+        state_id=models.Subquery(immediate.values('intermediate_region__state_id')[:1]),
+        region_id=models.Subquery(immediate.values('region_id')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cities', '0012_update_seaf_category_range'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='immediateregion',
+            name='region',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='immediate_regions', to='cities.region', verbose_name='Region'),
+        ),
+        migrations.AddField(
+            model_name='intermediateregion',
+            name='region',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='intermediate_regions', to='cities.region', verbose_name='Region'),
+        ),
+        migrations.AddField(
+            model_name='municipality',
+            name='region',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='municipalities', to='cities.region', verbose_name='Region'),
+        ),
+        migrations.AddField(
+            model_name='municipality',
+            name='state',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='municipalities', to='cities.state', verbose_name='State'),
+        ),
+        migrations.RunPython(populate_hierarchy_columns, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.7 on 2026-10-16 19:43
+
+from django.db import migrations, models
+
+GEO_PARENTS = [
+    ('region', None, None),
+    ('state', 'region_id', 'region'),
+    ('intermediateregion', 'state_id', 'state'),
+    ('immediateregion', 'intermediate_region_id', 'intermediateregion'),
+    ('municipality', 'immediate_region_id', 'immediateregion'),
+]
+
+
+def populate_geo_closure(apps, schema_editor):
+    """
+    This function is responsible for building the closure rows of the existing hierarchy.
+    """
+    GeoClosure = apps.get_model('cities', 'GeoClosure')
+
+    parents = {}
+    for level, parent_field, parent_level in GEO_PARENTS:
+        model = apps.get_model('cities', level)
+        if parent_field is None:
+            parents.update({(level, pk): None for pk in model.objects.values_list('pk', flat=True)})
+            continue
+        for pk, parent_id in model.objects.values_list('pk', parent_field):
+            parents[(level, pk)] = (parent_level, parent_id) if parent_id is not None else None
+
+    rows = []
+    for node in parents:
+        ancestor, depth = node, 0
+        while ancestor is not None:
+            rows.append(GeoClosure(
+                ancestor_level=ancestor[0],
+                ancestor_id=ancestor[1],
+                descendant_level=node[0],
+                descendant_id=node[1],
+                depth=depth
+            ))
+            ancestor, depth = parents.get(ancestor), depth + 1
+    GeoClosure.objects.bulk_create(rows, batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cities', '0013_denormalize_hierarchy_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeoClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ancestor_level', models.CharField(choices=[('region', 'Region'), ('state', 'State'), ('intermediateregion', 'Intermediate Region'), ('immediateregion', 'Immediate Region'), ('municipality', 'Municipality')], max_length=20, verbose_name='Ancestor Level')),
+                ('ancestor_id', models.PositiveBigIntegerField(verbose_name='Ancestor ID')),
+                ('descendant_level', models.CharField(choices=[('region', 'Region'), ('state', 'State'), ('intermediateregion', 'Intermediate Region'), ('immediateregion', 'Immediate Region'), ('municipality', 'Municipality')], max_length=20, verbose_name='Descendant Level')),
+                ('descendant_id', models.PositiveBigIntegerField(verbose_name='Descendant ID')),
+                ('depth', models.PositiveSmallIntegerField(verbose_name='Depth')),
+            ],
+            options={
+                'verbose_name': 'Geographic Closure',
+                'verbose_name_plural': 'Geographic Closure',
+                'indexes': [models.Index(fields=['descendant_level', 'descendant_id', 'depth'], name='cities_geo_closure_desc_idx')],
+                'constraints': [models.UniqueConstraint(fields=('ancestor_level', 'ancestor_id', 'descendant_level', 'descendant_id'), name='cities_geo_closure_unique')],
+            },
+        ),
+        migrations.RunPython(populate_geo_closure, migrations.RunPython.noop),
+    ]
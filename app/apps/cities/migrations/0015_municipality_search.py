@@ -0,0 +1,73 @@
+# Generated by Django 5.2.7 on 2026-10-16 19:46
+
+import re
+import unicodedata
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+def normalize(value):
+    if not value:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', value)
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return re.sub(r'\s+', ' ', stripped.casefold()).strip()
+
+
+def populate_search_columns(apps, schema_editor):
+    """
+    This function is responsible for filling the normalized search columns of existing municipalities.
+    """
+    Municipality = apps.get_model('cities', 'Municipality')
+
+    municipalities = list(Municipality.objects.only('id', 'name', 'mayor_name'))
+    for municipality in municipalities:
+        municipality.search_name = normalize(municipality.name)
+        municipality.search_text = ' '.join(filter(None, [municipality.search_name, normalize(municipality.mayor_name)]))
+    Municipality.objects.bulk_update(municipalities, ['search_name', 'search_text'], batch_size=1000)
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """
+    This function is responsible for creating the pg_trgm GIN indexes behind LIKE '%term%' and similarity search.
+    Other backends keep sequential scans.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS cities_muni_search_name_trgm ON cities_municipality USING gin (search_name gin_trgm_ops)'
+    )
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS cities_muni_search_text_trgm ON cities_municipality USING gin (search_text gin_trgm_ops)'
+    )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS cities_muni_search_name_trgm')
+    schema_editor.execute('DROP INDEX IF EXISTS cities_muni_search_text_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cities', '0014_geoclosure'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='municipality',
+            name='search_name',
+            field=models.CharField(blank=True, default='', editable=False, max_length=200, verbose_name='Search Name'),
+        ),
+        migrations.AddField(
+            model_name='municipality',
+            name='search_text',
+            field=models.CharField(blank=True, default='', editable=False, max_length=400, verbose_name='Search Text'),
+        ),
+        migrations.RunPython(populate_search_columns, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
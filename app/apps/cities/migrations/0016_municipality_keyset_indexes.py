@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-16 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cities', '0015_municipality_search'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='municipality',
+            name='cities_muni_name_e6406f_idx',
+        ),
+        migrations.AddIndex(
+            model_name='municipality',
+            index=models.Index(fields=['name', 'id'], name='cities_muni_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='municipality',
+            index=models.Index(fields=['seaf_category', 'id'], name='cities_muni_seaf_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='municipality',
+            index=models.Index(fields=['mayor_name', 'id'], name='cities_muni_mayor_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='municipality',
+            index=models.Index(fields=['mayor_party', 'id'], name='cities_muni_party_id_idx'),
+        ),
+    ]
@@ -0,0 +1,158 @@
+# Generated by Django 5.2.7 on 2026-10-16 19:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+WIKI_FIELDS = [
+    'wiki_demonym', 'wiki_altitude', 'wiki_total_area', 'wiki_population', 'wiki_density', 'wiki_climate',
+    'wiki_idh', 'wiki_gdp', 'wiki_gdp_per_capita', 'wiki_website', 'wiki_metropolitan_region',
+    'wiki_bordering_municipalities', 'wiki_distance_to_capital', 'wiki_foundation_date', 'wiki_council_members',
+    'wiki_postal_code', 'wiki_gini', 'wiki_mayor_mandate_start', 'wiki_mayor_mandate_end', 'wiki_data_updated_at',
+]
+
+
+def copy_wiki_to_profiles(apps, schema_editor):
+    """
+    This function is responsible for moving the Wikipedia columns into profiles.
+    Municipalities without any Wikipedia data get no profile.
+    """
+    Municipality = apps.get_model('cities', 'Municipality')
+    MunicipalityWikiProfile = apps.get_model('cities', 'MunicipalityWikiProfile')
+
+    profiles = [
+        MunicipalityWikiProfile(municipality_id=row['id'], **{field: row[field] for field in WIKI_FIELDS})
+        for row in Municipality.objects.values('id', *WIKI_FIELDS).iterator(chunk_size=1000)
+        if any(row[field] not in (None, '') for field in WIKI_FIELDS)
+    ]
+    MunicipalityWikiProfile.objects.bulk_create(profiles, batch_size=1000)
+
+
+def copy_profiles_to_wiki(apps, schema_editor):
+    Municipality = apps.get_model('cities', 'Municipality')
+    MunicipalityWikiProfile = apps.get_model('cities', 'MunicipalityWikiProfile')
+
+    municipalities = []
+    for row in MunicipalityWikiProfile.objects.values('municipality_id', *WIKI_FIELDS).iterator(chunk_size=1000):
+        municipalities.append(Municipality(id=row['municipality_id'], **{field: row[field] for field in WIKI_FIELDS}))
+    Municipality.objects.bulk_update(municipalities, WIKI_FIELDS, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cities', '0016_municipality_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MunicipalityWikiProfile',
+            fields=[
+                ('municipality', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='wiki_profile', serialize=False, to='cities.municipality')),
+                ('wiki_demonym', models.CharField(blank=True, max_length=100, null=True, verbose_name='Demonym (Wikipedia)')),
+                ('wiki_altitude', models.CharField(blank=True, max_length=100, null=True, verbose_name='Altitude (Wikipedia)')),
+                ('wiki_total_area', models.CharField(blank=True, max_length=100, null=True, verbose_name='Total Area (Wikipedia)')),
+                ('wiki_population', models.CharField(blank=True, max_length=100, null=True, verbose_name='Population (Wikipedia)')),
+                ('wiki_density', models.CharField(blank=True, max_length=100, null=True, verbose_name='Density (Wikipedia)')),
+                ('wiki_climate', models.CharField(blank=True, max_length=200, null=True, verbose_name='Climate (Wikipedia)')),
+                ('wiki_idh', models.CharField(blank=True, max_length=100, null=True, verbose_name='IDH (Wikipedia)')),
+                ('wiki_gdp', models.CharField(blank=True, max_length=100, null=True, verbose_name='GDP (Wikipedia)')),
+                ('wiki_gdp_per_capita', models.CharField(blank=True, max_length=100, null=True, verbose_name='GDP Per Capita (Wikipedia)')),
+                ('wiki_website', models.CharField(blank=True, max_length=500, null=True, verbose_name='Website (Wikipedia)')),
+                ('wiki_metropolitan_region', models.CharField(blank=True, max_length=200, null=True, verbose_name='Metropolitan Region (Wikipedia)')),
+                ('wiki_bordering_municipalities', models.TextField(blank=True, null=True, verbose_name='Bordering Municipalities (Wikipedia)')),
+                ('wiki_distance_to_capital', models.CharField(blank=True, max_length=100, null=True, verbose_name='Distance to Capital (Wikipedia)')),
+                ('wiki_foundation_date', models.CharField(blank=True, max_length=200, null=True, verbose_name='Foundation Date (Wikipedia)')),
+                ('wiki_council_members', models.CharField(blank=True, max_length=50, null=True, verbose_name='Council Members (Wikipedia)')),
+                ('wiki_postal_code', models.CharField(blank=True, max_length=50, null=True, verbose_name='Postal Code (Wikipedia)')),
+                ('wiki_gini', models.CharField(blank=True, max_length=100, null=True, verbose_name='Gini Coefficient (Wikipedia)')),
+                ('wiki_mayor_mandate_start', models.IntegerField(blank=True, null=True, verbose_name='Mayor Mandate Start (Wikipedia)')),
+                ('wiki_mayor_mandate_end', models.IntegerField(blank=True, null=True, verbose_name='Mayor Mandate End (Wikipedia)')),
+                ('wiki_data_updated_at', models.DateTimeField(blank=True, null=True, verbose_name='Wikipedia Data Updated At')),
+            ],
+            options={
+                'verbose_name': 'Municipality Wikipedia Profile',
+                'verbose_name_plural': 'Municipality Wikipedia Profiles',
+            },
+        ),
+        migrations.RunPython(copy_wiki_to_profiles, copy_profiles_to_wiki),
+        migrations.RemoveField(
+            model_name='municipality',
+            name='wiki_altitude',
+        ),
+        migrations.RemoveField(
+            model_name='municipality',
+            name='wiki_bordering_municipalities',
+        ),
+        migrations.RemoveField(
+            model_name='municipality',
+            name='wiki_climate',
+        ),
+        migrations.RemoveField(
+            model_name='municipality',
+            name='wiki_council_members',
+        ),
+        migrations.RemoveField(
+            model_name='municipality',
+            name='wiki_data_updated_at',
+        ),
+        migrations.RemoveField(
+            model_name='municipality',
+            name='wiki_demonym',
+        ),
+        migrations.RemoveField(
+            model_name='municipality',
+            name='wiki_density',
+        ),
+        migrations.RemoveField(
+            model_name='municipality',
+            name='wiki_distance_to_capital',
+        ),
+        migrations.RemoveField(
+            model_name='municipality',
+            name='wiki_foundation_date',
+        ),
+        migrations.RemoveField(
+            model_name='municipality',
+            name='wiki_gdp',
+        ),
+        migrations.RemoveField(
+            model_name='municipality',
+            name='wiki_gdp_per_capita',
+        ),
+        migrations.RemoveField(
+            model_name='municipality',
+            name='wiki_gini',
+        ),
+        migrations.RemoveField(
+            model_name='municipality',
+            name='wiki_idh',
+        ),
+        migrations.RemoveField(
+            model_name='municipality',
+            name='wiki_mayor_mandate_end',
+        ),
+        migrations.RemoveField(
+            model_name='municipality',
+            name='wiki_mayor_mandate_start',
+        ),
+        migrations.RemoveField(
+            model_name='municipality',
+            name='wiki_metropolitan_region',
+        ),
+        migrations.RemoveField(
+            model_name='municipality',
+            name='wiki_population',
+        ),
+        migrations.RemoveField(
+            model_name='municipality',
+            name='wiki_postal_code',
+        ),
+        migrations.RemoveField(
+            model_name='municipality',
+            name='wiki_total_area',
+        ),
+        migrations.RemoveField(
+            model_name='municipality',
+            name='wiki_website',
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.2.7 on 2026-10-16 20:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cities', '0017_municipality_wiki_profile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='municipality',
+            name='altitude_m',
+            field=models.IntegerField(blank=True, editable=False, null=True, verbose_name='Altitude (m)'),
+        ),
+        migrations.AddField(
+            model_name='municipality',
+            name='area_km2',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=12, null=True, verbose_name='Area (km²)'),
+        ),
+        migrations.AddField(
+            model_name='municipality',
+            name='density',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=12, null=True, verbose_name='Density (inhabitants/km²)'),
+        ),
+        migrations.AddField(
+            model_name='municipality',
+            name='gdp',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=18, null=True, verbose_name='GDP (R$)'),
+        ),
+        migrations.AddField(
+            model_name='municipality',
+            name='gdp_per_capita',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=14, null=True, verbose_name='GDP Per Capita (R$)'),
+        ),
+        migrations.AddField(
+            model_name='municipality',
+            name='gini',
+            field=models.DecimalField(blank=True, decimal_places=4, editable=False, max_digits=5, null=True, verbose_name='Gini Coefficient'),
+        ),
+        migrations.AddField(
+            model_name='municipality',
+            name='idh',
+            field=models.DecimalField(blank=True, decimal_places=3, editable=False, max_digits=4, null=True, verbose_name='IDH'),
+        ),
+        migrations.AddField(
+            model_name='municipality',
+            name='population',
+            field=models.BigIntegerField(blank=True, editable=False, null=True, verbose_name='Population'),
+        ),
+        migrations.AddIndex(
+            model_name='municipality',
+            index=models.Index(fields=['population', 'id'], name='cities_muni_population_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='municipality',
+            index=models.Index(fields=['area_km2', 'id'], name='cities_muni_area_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='municipality',
+            index=models.Index(fields=['density', 'id'], name='cities_muni_density_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='municipality',
+            index=models.Index(fields=['idh', 'id'], name='cities_muni_idh_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='municipality',
+            index=models.Index(fields=['gini', 'id'], name='cities_muni_gini_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='municipality',
+            index=models.Index(fields=['gdp', 'id'], name='cities_muni_gdp_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='municipality',
+            index=models.Index(fields=['gdp_per_capita', 'id'], name='cities_muni_gdp_pc_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='municipality',
+            index=models.Index(fields=['altitude_m', 'id'], name='cities_muni_altitude_id_idx'),
+        ),
+    ]
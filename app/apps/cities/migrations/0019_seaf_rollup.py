@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-16 20:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cities', '0018_municipality_indicators'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeafRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.CharField(choices=[('region', 'Region'), ('state', 'State'), ('intermediateregion', 'Intermediate Region'), ('immediateregion', 'Immediate Region')], max_length=20, verbose_name='Level')),
+                ('node_id', models.PositiveBigIntegerField(verbose_name='Node ID')),
+                ('municipalities', models.PositiveIntegerField(default=0, verbose_name='Municipalities')),
+                ('categorized', models.PositiveIntegerField(default=0, verbose_name='Municipalities With Category')),
+                ('category_1', models.PositiveIntegerField(default=0, verbose_name='Category 1')),
+                ('category_2', models.PositiveIntegerField(default=0, verbose_name='Category 2')),
+                ('category_3', models.PositiveIntegerField(default=0, verbose_name='Category 3')),
+                ('category_4', models.PositiveIntegerField(default=0, verbose_name='Category 4')),
+                ('seaf_sum', models.IntegerField(default=0, verbose_name='Category Sum')),
+                ('average', models.FloatField(blank=True, null=True, verbose_name='Average Category')),
+            ],
+            options={
+                'verbose_name': 'SEAF Rollup',
+                'verbose_name_plural': 'SEAF Rollups',
+                'constraints': [models.UniqueConstraint(fields=('level', 'node_id'), name='cities_seaf_rollup_unique')],
+            },
+        ),
+    ]
@@ -5,9 +5,9 @@ import logging
 
 from django.core.exceptions import PermissionDenied
 
-from apps.auth.decorators import check_resource_permission, get_user_permitted_regions
+from apps.auth.decorators import check_resource_permission
 from apps.auth.models import PermissionLog
-from .models import Region, State, IntermediateRegion, ImmediateRegion, Municipality
+from .hierarchy import geo_hierarchy
 
 logger = logging.getLogger(__name__)
 
@@ -15,7 +15,8 @@ logger = logging.getLogger(__name__)
 class RegionScopedAdminMixin:
     """
     This class is responsible for restricting admin actions based on region-scoped permissions.
-    Uses the existing GroupResourcePermission infrastructure with region FK.
+    Uses the existing GroupResourcePermission infrastructure; grants may target a region or any
+    narrower node of the hierarchy.
     
     Configure via class attributes:
         - region_resource_name: Resource name for permission checks (e.g., 'cities.municipality')
@@ -31,29 +32,18 @@ class RegionScopedAdminMixin:
     
     def _resolve_region(self, obj):
         """
-        This method is responsible for extracting the Region from any cities model instance.
+        This method is responsible for extracting the Region ID from any cities model instance.
+        Resolved through the in-memory geographic hierarchy, so it never hits the database.
         """
         if obj is None:
             return None
-        if isinstance(obj, Region):
-            return obj
-        if isinstance(obj, State):
-            return obj.region
-        if isinstance(obj, IntermediateRegion):
-            return obj.state.region if obj.state else None
-        if isinstance(obj, ImmediateRegion):
-            state = obj.intermediate_region.state if obj.intermediate_region else None
-            return state.region if state else None
-        if isinstance(obj, Municipality):
-            immediate = obj.immediate_region
-            if immediate and immediate.intermediate_region:
-                state = immediate.intermediate_region.state
-                return state.region if state else None
-        return None
+        return geo_hierarchy.lookup(lambda hierarchy: hierarchy.region_id_for(obj))
     
-    def _user_can_access_region(self, user, region, permission_type):
+    def _user_can_access_region(self, user, obj, permission_type):
         """
-        This method is responsible for checking if user has permission for a specific region.
+        This method is responsible for checking if user has permission for a specific object,
+        through a grant on the object itself or any of its ancestors. With no object, any grant
+        (global or scoped) is enough.
         """
         if user.is_superuser:
             return True
@@ -61,27 +51,16 @@ class RegionScopedAdminMixin:
             user,
             self.get_region_resource_name(),
             permission_type,
-            region=region
-        )
-    
-    def _get_user_region_ids(self, user, permission_type):
-        """
-        This method is responsible for returning region IDs user can access.
-        Returns None for global access.
-        """
-        if user.is_superuser:
-            return None
-        return get_user_permitted_regions(
-            user,
-            self.get_region_resource_name(),
-            permission_type
+            region=obj
         )
     
     def _log_denied(self, request, obj, action):
         """
         This method is responsible for logging permission denials for audit.
         """
-        region = self._resolve_region(obj)
+        region_id = self._resolve_region(obj)
+        # Without a region there is nothing to look up, and a miss would reload the hierarchy
+        region = None if region_id is None else geo_hierarchy.lookup(lambda hierarchy: hierarchy.regions[region_id])
         try:
             PermissionLog.objects.create(
                 user=request.user,
@@ -99,13 +78,8 @@ class RegionScopedAdminMixin:
         if not base or request.user.is_superuser:
             return base
         
-        # For list view (obj=None), allow if user has any region access
-        if obj is None:
-            region_ids = self._get_user_region_ids(request.user, 'view')
-            return region_ids is None or len(region_ids) > 0
-        
-        region = self._resolve_region(obj)
-        return self._user_can_access_region(request.user, region, 'view')
+        # For list view (obj=None), allow if user has any scoped access
+        return self._user_can_access_region(request.user, obj, 'view')
 
     def has_change_permission(self, request, obj=None):
         base = super().has_change_permission(request, obj)
@@ -114,8 +88,7 @@ class RegionScopedAdminMixin:
         if obj is None:
             return base
         
-        region = self._resolve_region(obj)
-        return self._user_can_access_region(request.user, region, 'change')
+        return self._user_can_access_region(request.user, obj, 'change')
 
     def has_delete_permission(self, request, obj=None):
         base = super().has_delete_permission(request, obj)
@@ -124,63 +97,31 @@ class RegionScopedAdminMixin:
         if obj is None:
             return base
         
-        region = self._resolve_region(obj)
-        return self._user_can_access_region(request.user, region, 'delete')
+        return self._user_can_access_region(request.user, obj, 'delete')
 
     def has_add_permission(self, request):
         base = super().has_add_permission(request)
         if not base or request.user.is_superuser:
             return base
         
-        # Allow add if user has any region with 'add' permission
-        region_ids = self._get_user_region_ids(request.user, 'add')
-        return region_ids is None or len(region_ids) > 0
+        # Allow add if user has 'add' permission anywhere
+        return self._user_can_access_region(request.user, None, 'add')
 
     def get_queryset(self, request):
         qs = super().get_queryset(request)
-        if request.user.is_superuser:
-            return qs
-        
-        region_ids = self._get_user_region_ids(request.user, 'view')
-        if region_ids is None:
-            return qs  # Global access
-        
-        if not region_ids:
-            return qs.none()
-        
-        # Filter queryset by region
-        return self._filter_queryset_by_regions(qs, region_ids)
+        return qs.for_user(request.user, 'view', resource_name=self.get_region_resource_name())
     
-    def _filter_queryset_by_regions(self, qs, region_ids):
-        """
-        This method is responsible for filtering queryset to only include objects in specified regions.
-        """
-        model = qs.model
-        if model == Region:
-            return qs.filter(id__in=region_ids)
-        elif model == State:
-            return qs.filter(region_id__in=region_ids)
-        elif model == IntermediateRegion:
-            return qs.filter(state__region_id__in=region_ids)
-        elif model == ImmediateRegion:
-            return qs.filter(intermediate_region__state__region_id__in=region_ids)
-        elif model == Municipality:
-            return qs.filter(immediate_region__intermediate_region__state__region_id__in=region_ids)
-        return qs
-
     def save_model(self, request, obj, form, change):
         if not request.user.is_superuser:
-            region = self._resolve_region(obj)
             action = 'change' if change else 'add'
-            if not self._user_can_access_region(request.user, region, action):
+            if not self._user_can_access_region(request.user, obj, action):
                 self._log_denied(request, obj, action)
                 raise PermissionDenied(f"You don't have {action} permission for this region.")
         super().save_model(request, obj, form, change)
 
     def delete_model(self, request, obj):
         if not request.user.is_superuser:
-            region = self._resolve_region(obj)
-            if not self._user_can_access_region(request.user, region, 'delete'):
+            if not self._user_can_access_region(request.user, obj, 'delete'):
                 self._log_denied(request, obj, 'delete')
                 raise PermissionDenied("You don't have delete permission for this region.")
         super().delete_model(request, obj)
@@ -189,24 +130,10 @@ class RegionScopedAdminMixin:
         if request.user.is_superuser:
             return super().formfield_for_foreignkey(db_field, request, **kwargs)
         
-        # For 'add' permission, filter FK choices to allowed regions
-        region_ids = self._get_user_region_ids(request.user, 'add')
-        
-        if region_ids is None:
-            return super().formfield_for_foreignkey(db_field, request, **kwargs)
-        
-        if not region_ids:
-            region_ids = []
-        
-        if db_field.name == 'region':
-            kwargs['queryset'] = Region.objects.filter(id__in=region_ids)
-        elif db_field.name == 'state':
-            kwargs['queryset'] = State.objects.filter(region_id__in=region_ids)
-        elif db_field.name == 'intermediate_region':
-            kwargs['queryset'] = IntermediateRegion.objects.filter(state__region_id__in=region_ids)
-        elif db_field.name == 'immediate_region':
-            kwargs['queryset'] = ImmediateRegion.objects.filter(
-                intermediate_region__state__region_id__in=region_ids
+        # For 'add' permission, filter FK choices to the hierarchy nodes the user may add under
+        if db_field.name in ('region', 'state', 'intermediate_region', 'immediate_region'):
+            kwargs['queryset'] = db_field.related_model.objects.for_user(
+                request.user, 'add', resource_name=self.get_region_resource_name()
             )
         
         return super().formfield_for_foreignkey(db_field, request, **kwargs)
@@ -1,5 +1,83 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
+
+from .hierarchy import geo_hierarchy
+from .search import municipality_search_columns
+from .indicators import INDICATOR_SOURCES, parse_indicators
+
+
+class RegionScopedQuerySet(models.QuerySet):
+    """
+    This class is responsible for scoping geographic querysets to the regions a user may access.
+    Each model declares `region_lookup`, the path from its rows to the macro Region ID, and
+    `geo_parent_field`, the foreign key to its parent in the GeoClosure hierarchy.
+    """
+
+    def in_regions(self, region_ids):
+        """Restrict the queryset to rows located in the given macro-regions."""
+        return self.filter(**{f"{self.model.region_lookup}__in": region_ids})
+
+    def under(self, level, node_id):
+        """Restrict the queryset to rows at or below the hierarchy node (level, node_id)."""
+        return self.filter(pk__in=GeoClosure.objects.filter(
+            ancestor_level=level,
+            ancestor_id=node_id,
+            descendant_level=self.model._meta.model_name
+        ).values('descendant_id'))
+
+    def within(self, scopes):
+        """
+        Restrict the queryset to rows at or below any of the (level, id) nodes in `scopes`,
+        as returned by get_permitted_scopes(); None means unrestricted.
+        """
+        if scopes is None:
+            return self
+        if not scopes:
+            return self.none()
+        nodes = models.Q()
+        for level, node_id in scopes:
+            nodes |= models.Q(ancestor_level=level, ancestor_id=node_id)
+        return self.filter(pk__in=GeoClosure.objects.filter(
+            nodes,
+            descendant_level=self.model._meta.model_name
+        ).values('descendant_id'))
+
+    def for_user(self, user, permission_type='view', resource_name=None):
+        """
+        Restrict the queryset to rows the user holds `permission_type` on for `resource_name`
+        (defaults to 'cities.<model_name>'). Grants are resolved against EffectiveUserPermission
+        in SQL subqueries, so scoping costs no extra round trip; scoped grants reach their rows
+        through a single GeoClosure join whatever the level they target.
+        """
+        from apps.auth.models import EffectiveUserPermission
+
+        if not user.is_authenticated:
+            return self.none()
+        if user.is_superuser:
+            return self
+
+        grants = EffectiveUserPermission.objects.filter(
+            user_id=user.pk,
+            resource_name=resource_name or f"cities.{self.model._meta.model_name}",
+            permission_type=permission_type
+        ).filter(
+            models.Q(expires_at__isnull=True) | models.Q(expires_at__gt=timezone.now())
+        )
+
+        covered = GeoClosure.objects.filter(
+            descendant_level=self.model._meta.model_name
+        ).filter(
+            models.Exists(grants.filter(
+                scope_level=models.OuterRef('ancestor_level'),
+                scope_id=models.OuterRef('ancestor_id')
+            ))
+        )
+
+        return self.filter(
+            models.Q(models.Exists(grants.filter(scope_id__isnull=True)))
+            | models.Q(pk__in=covered.values('descendant_id'))
+        )
 
 
 class Region(models.Model):
@@ -7,6 +85,10 @@ class Region(models.Model):
     code = models.CharField(max_length=2, unique=True, verbose_name="Region Code")
     name = models.CharField(max_length=50, unique=True, verbose_name="Region Name")
     
+    objects = RegionScopedQuerySet.as_manager()
+    region_lookup = 'id'
+    geo_parent_field = None
+    
     class Meta:
         verbose_name = "Region"
         verbose_name_plural = "Regions"
@@ -26,6 +108,10 @@ class State(models.Model):
     region = models.ForeignKey(Region, on_delete=models.PROTECT, related_name='states', null=True, blank=True, verbose_name="Region")
     regiao = models.CharField(max_length=50, null=True, blank=True, verbose_name="Região (deprecated)")
     
+    objects = RegionScopedQuerySet.as_manager()
+    region_lookup = 'region_id'
+    geo_parent_field = 'region'
+    
     class Meta:
         verbose_name = "State"
         verbose_name_plural = "States"
@@ -33,6 +119,15 @@ class State(models.Model):
     
     def __str__(self):
         return f"{self.name} ({self.abbreviation})"
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Propagate region moves to the denormalized columns below this state
+        IntermediateRegion.objects.filter(state=self).exclude(region_id=self.region_id).update(region_id=self.region_id)
+        ImmediateRegion.objects.filter(intermediate_region__state=self).exclude(
+            region_id=self.region_id
+        ).update(region_id=self.region_id)
+        Municipality.objects.filter(state=self).exclude(region_id=self.region_id).update(region_id=self.region_id)
 
 
 class IntermediateRegion(models.Model):
@@ -40,6 +135,12 @@ class IntermediateRegion(models.Model):
     code = models.CharField(max_length=4, unique=True, verbose_name="Region Code")
     name = models.CharField(max_length=200, verbose_name="Region Name")
     state = models.ForeignKey(State, on_delete=models.CASCADE, related_name='intermediate_regions')
+    # Denormalized from state.region, kept in sync by save()
+    region = models.ForeignKey(Region, on_delete=models.PROTECT, related_name='intermediate_regions', null=True, blank=True, editable=False, verbose_name="Region")
+    
+    objects = RegionScopedQuerySet.as_manager()
+    region_lookup = 'region_id'
+    geo_parent_field = 'state'
     
     class Meta:
         verbose_name = "Intermediate Region"
@@ -47,7 +148,18 @@ class IntermediateRegion(models.Model):
         ordering = ['name']
     
     def __str__(self):
-        return f"{self.name} - {self.state.name}"
+        state = geo_hierarchy.lookup(lambda hierarchy: hierarchy.states[self.state_id])
+        return f"{self.name} - {state.name if state else self.state.name}"
+    
+    def save(self, *args, **kwargs):
+        self.region_id = State.objects.filter(pk=self.state_id).values_list('region_id', flat=True).first()
+        super().save(*args, **kwargs)
+        ImmediateRegion.objects.filter(intermediate_region=self).exclude(
+            region_id=self.region_id
+        ).update(region_id=self.region_id)
+        Municipality.objects.filter(immediate_region__intermediate_region=self).filter(
+            ~models.Q(state_id=self.state_id) | ~models.Q(region_id=self.region_id)
+        ).update(state_id=self.state_id, region_id=self.region_id)
 
 
 class ImmediateRegion(models.Model):
@@ -55,6 +167,12 @@ class ImmediateRegion(models.Model):
     code = models.CharField(max_length=6, unique=True, verbose_name="Region Code")
     name = models.CharField(max_length=200, verbose_name="Region Name")
     intermediate_region = models.ForeignKey(IntermediateRegion, on_delete=models.CASCADE, related_name='immediate_regions')
+    # Denormalized from intermediate_region.state.region, kept in sync by save()
+    region = models.ForeignKey(Region, on_delete=models.PROTECT, related_name='immediate_regions', null=True, blank=True, editable=False, verbose_name="Region")
+    
+    objects = RegionScopedQuerySet.as_manager()
+    region_lookup = 'region_id'
+    geo_parent_field = 'intermediate_region'
     
     class Meta:
         verbose_name = "Immediate Region"
@@ -62,7 +180,19 @@ class ImmediateRegion(models.Model):
         ordering = ['name']
     
     def __str__(self):
-        return f"{self.name} - {self.intermediate_region.name}"
+        intermediate_name = geo_hierarchy.lookup(
+            lambda hierarchy: hierarchy.intermediate_regions[self.intermediate_region_id].name
+        )
+        return f"{self.name} - {intermediate_name or self.intermediate_region.name}"
+    
+    def save(self, *args, **kwargs):
+        state_id, self.region_id = IntermediateRegion.objects.filter(
+            pk=self.intermediate_region_id
+        ).values_list('state_id', 'region_id').first() or (None, None)
+        super().save(*args, **kwargs)
+        Municipality.objects.filter(immediate_region=self).filter(
+            ~models.Q(state_id=state_id) | ~models.Q(region_id=self.region_id)
+        ).update(state_id=state_id, region_id=self.region_id)
 
 
 class Municipality(models.Model):
@@ -76,6 +206,9 @@ class Municipality(models.Model):
     area_code = models.CharField(max_length=3, null=True, blank=True, verbose_name="Area Code (DDD)")
     timezone = models.CharField(max_length=50, null=True, blank=True, verbose_name="Timezone")
     immediate_region = models.ForeignKey(ImmediateRegion, on_delete=models.CASCADE, related_name='municipalities')
+    # Denormalized from immediate_region, kept in sync by save() and the hierarchy models
+    state = models.ForeignKey(State, on_delete=models.CASCADE, related_name='municipalities', null=True, blank=True, editable=False, verbose_name="State")
+    region = models.ForeignKey(Region, on_delete=models.PROTECT, related_name='municipalities', null=True, blank=True, editable=False, verbose_name="Region")
     
     # Mayor information
     mayor_name = models.CharField(max_length=200, null=True, blank=True, verbose_name="Mayor Name")
@@ -85,7 +218,80 @@ class Municipality(models.Model):
     wikipedia_url = models.URLField(max_length=500, null=True, blank=True, verbose_name="Wikipedia URL")
     mayor_data_updated_at = models.DateTimeField(null=True, blank=True, verbose_name="Mayor Data Updated At")
     
-    # Wikipedia infobox data
+    # SEAF classification
+    seaf_category = models.IntegerField(null=True, blank=True, verbose_name="SEAF Category")
+    
+    # Indicators parsed from the Wikipedia profile strings by apps.cities.indicators, kept in sync
+    # by MunicipalityWikiProfile.save() and the parse_wiki_indicators command
+    population = models.BigIntegerField(null=True, blank=True, editable=False, verbose_name="Population")
+    area_km2 = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, editable=False, verbose_name="Area (km²)")
+    density = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, editable=False, verbose_name="Density (inhabitants/km²)")
+    idh = models.DecimalField(max_digits=4, decimal_places=3, null=True, blank=True, editable=False, verbose_name="IDH")
+    gini = models.DecimalField(max_digits=5, decimal_places=4, null=True, blank=True, editable=False, verbose_name="Gini Coefficient")
+    gdp = models.DecimalField(max_digits=18, decimal_places=2, null=True, blank=True, editable=False, verbose_name="GDP (R$)")
+    gdp_per_capita = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True, editable=False, verbose_name="GDP Per Capita (R$)")
+    altitude_m = models.IntegerField(null=True, blank=True, editable=False, verbose_name="Altitude (m)")
+    
+    # Normalized (unaccented, casefolded) search columns, kept in sync by save().
+    # Trigram GIN indexes on both are created by migration 0015 on PostgreSQL.
+    search_name = models.CharField(max_length=200, blank=True, default='', editable=False, verbose_name="Search Name")
+    search_text = models.CharField(max_length=400, blank=True, default='', editable=False, verbose_name="Search Text")
+    
+    objects = RegionScopedQuerySet.as_manager()
+    region_lookup = 'region_id'
+    geo_parent_field = 'immediate_region'
+    
+    class Meta:
+        verbose_name = "Municipality"
+        verbose_name_plural = "Municipalities"
+        ordering = ['name']
+        indexes = [
+            models.Index(fields=['code']),
+            # (sort column, id) pairs serve keyset pagination of the city list in both directions
+            models.Index(fields=['name', 'id'], name='cities_muni_name_id_idx'),
+            models.Index(fields=['seaf_category', 'id'], name='cities_muni_seaf_id_idx'),
+            models.Index(fields=['mayor_name', 'id'], name='cities_muni_mayor_id_idx'),
+            models.Index(fields=['mayor_party', 'id'], name='cities_muni_party_id_idx'),
+            models.Index(fields=['population', 'id'], name='cities_muni_population_id_idx'),
+            models.Index(fields=['area_km2', 'id'], name='cities_muni_area_id_idx'),
+            models.Index(fields=['density', 'id'], name='cities_muni_density_id_idx'),
+            models.Index(fields=['idh', 'id'], name='cities_muni_idh_id_idx'),
+            models.Index(fields=['gini', 'id'], name='cities_muni_gini_id_idx'),
+            models.Index(fields=['gdp', 'id'], name='cities_muni_gdp_id_idx'),
+            models.Index(fields=['gdp_per_capita', 'id'], name='cities_muni_gdp_pc_id_idx'),
+            models.Index(fields=['altitude_m', 'id'], name='cities_muni_altitude_id_idx'),
+        ]
+    
+    def __str__(self):
+        state = geo_hierarchy.lookup(
+            lambda hierarchy: hierarchy.state_for_immediate_region(self.immediate_region_id)
+        )
+        return f"{self.name} - {state.name if state else self.immediate_region.intermediate_region.state.name}"
+    
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'immediate_region' in update_fields:
+            # Read from the database rather than the hierarchy snapshot, which may lag other workers
+            self.state_id, self.region_id = ImmediateRegion.objects.filter(
+                pk=self.immediate_region_id
+            ).values_list('intermediate_region__state_id', 'region_id').first() or (None, None)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'state', 'region'}
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'name', 'mayor_name'} & set(update_fields):
+            self.search_name, self.search_text = municipality_search_columns(self.name, self.mayor_name)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'search_name', 'search_text'}
+        super().save(*args, **kwargs)
+
+
+class MunicipalityWikiProfile(models.Model):
+    """
+    This class is responsible for the Wikipedia infobox data of a municipality. Kept out of the
+    Municipality row so list pages, exports and APIs scan narrow rows; only the edit page and
+    the admin change view load it.
+    """
+    municipality = models.OneToOneField(Municipality, on_delete=models.CASCADE, primary_key=True, related_name='wiki_profile')
     wiki_demonym = models.CharField(max_length=100, null=True, blank=True, verbose_name="Demonym (Wikipedia)")
     wiki_altitude = models.CharField(max_length=100, null=True, blank=True, verbose_name="Altitude (Wikipedia)")
     wiki_total_area = models.CharField(max_length=100, null=True, blank=True, verbose_name="Total Area (Wikipedia)")
@@ -107,20 +313,106 @@ class Municipality(models.Model):
     wiki_mayor_mandate_end = models.IntegerField(null=True, blank=True, verbose_name="Mayor Mandate End (Wikipedia)")
     wiki_data_updated_at = models.DateTimeField(null=True, blank=True, verbose_name="Wikipedia Data Updated At")
     
-    # SEAF classification
-    seaf_category = models.IntegerField(null=True, blank=True, verbose_name="SEAF Category")
+    class Meta:
+        verbose_name = "Municipality Wikipedia Profile"
+        verbose_name_plural = "Municipality Wikipedia Profiles"
+    
+    def __str__(self):
+        return f"Wikipedia profile of {self.municipality_id}"
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or set(INDICATOR_SOURCES.values()) & set(update_fields):
+            Municipality.objects.filter(pk=self.municipality_id).update(**parse_indicators(self))
+
+
+def sync_hierarchy_columns():
+    """
+    This function is responsible for recomputing every denormalized hierarchy column in three
+    set-based UPDATEs. Needed after loaddata or bulk operations that bypass save().
+    """
+    IntermediateRegion.objects.update(
+        region_id=models.Subquery(State.objects.filter(pk=models.OuterRef('state_id')).values('region_id')[:1])
+    )
+    ImmediateRegion.objects.update(
+        region_id=models.Subquery(
+            IntermediateRegion.objects.filter(pk=models.OuterRef('intermediate_region_id')).values('region_id')[:1]
+        )
+    )
+    immediate = ImmediateRegion.objects.filter(pk=models.OuterRef('immediate_region_id'))
+    Municipality.objects.update(
+        state_id=models.Subquery(immediate.values('intermediate_region__state_id')[:1]),
+        region_id=models.Subquery(immediate.values('region_id')[:1])
+    )
+
+
+class GeoClosure(models.Model):
+    """
+    This class is responsible for storing the transitive closure of the geographic hierarchy:
+    one row per (ancestor, descendant) pair, including each node paired with itself at depth 0.
+    Nodes are (level, id) pairs where level is the model name. Rows are maintained by
+    apps.cities.closure on insert, move and delete.
+    """
+    LEVELS = [
+        ('region', 'Region'),
+        ('state', 'State'),
+        ('intermediateregion', 'Intermediate Region'),
+        ('immediateregion', 'Immediate Region'),
+        ('municipality', 'Municipality'),
+    ]
+    
+    ancestor_level = models.CharField(max_length=20, choices=LEVELS, verbose_name="Ancestor Level")
+    ancestor_id = models.PositiveBigIntegerField(verbose_name="Ancestor ID")
+    descendant_level = models.CharField(max_length=20, choices=LEVELS, verbose_name="Descendant Level")
+    descendant_id = models.PositiveBigIntegerField(verbose_name="Descendant ID")
+    depth = models.PositiveSmallIntegerField(verbose_name="Depth")
     
     class Meta:
-        verbose_name = "Municipality"
-        verbose_name_plural = "Municipalities"
-        ordering = ['name']
+        verbose_name = "Geographic Closure"
+        verbose_name_plural = "Geographic Closure"
+        constraints = [
+            # Also the "everything under node X" index: ancestor first, covering descendant_id
+            models.UniqueConstraint(
+                fields=['ancestor_level', 'ancestor_id', 'descendant_level', 'descendant_id'],
+                name='cities_geo_closure_unique'
+            ),
+        ]
         indexes = [
-            models.Index(fields=['code']),
-            models.Index(fields=['name']),
+            models.Index(fields=['descendant_level', 'descendant_id', 'depth'], name='cities_geo_closure_desc_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.ancestor_level}:{self.ancestor_id} > {self.descendant_level}:{self.descendant_id} ({self.depth})"
+
+
+class SeafRollup(models.Model):
+    """
+    This class is responsible for the SEAF category totals of one hierarchy node: how many of its
+    municipalities fall in each category, their sum and average. Maintained incrementally by
+    apps.cities.rollups on municipality writes, rebuilt by the rebuild_seaf_rollups command.
+    """
+    level = models.CharField(max_length=20, choices=GeoClosure.LEVELS[:-1], verbose_name="Level")
+    node_id = models.PositiveBigIntegerField(verbose_name="Node ID")
+    municipalities = models.PositiveIntegerField(default=0, verbose_name="Municipalities")
+    categorized = models.PositiveIntegerField(default=0, verbose_name="Municipalities With Category")
+    category_1 = models.PositiveIntegerField(default=0, verbose_name="Category 1")
+    category_2 = models.PositiveIntegerField(default=0, verbose_name="Category 2")
+    category_3 = models.PositiveIntegerField(default=0, verbose_name="Category 3")
+    category_4 = models.PositiveIntegerField(default=0, verbose_name="Category 4")
+    seaf_sum = models.IntegerField(default=0, verbose_name="Category Sum")
+    average = models.FloatField(null=True, blank=True, verbose_name="Average Category")
+    
+    class Meta:
+        verbose_name = "SEAF Rollup"
+        verbose_name_plural = "SEAF Rollups"
+        constraints = [
+            # Also serves listing a whole level
+            models.UniqueConstraint(fields=['level', 'node_id'], name='cities_seaf_rollup_unique'),
         ]
     
     def __str__(self):
-        return f"{self.name} - {self.immediate_region.intermediate_region.state.name}"
+        return f"{self.level}:{self.node_id} ({self.categorized}/{self.municipalities})"
 
 
 class MunicipalityLog(models.Model):
@@ -0,0 +1,232 @@
+"""
+This module is responsible for keyset (seek) pagination over a single sort column plus the
+primary key as tie-breaker. Pages are addressed by opaque cursors instead of offsets, so any
+page costs one index range scan of `per_page + 1` rows (two where it crosses from the non-null
+values into the nulls).
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+# Cursor positions that need no sort value: the two ends of the ordering
+FIRST, LAST = 'first', 'last'
+
+
+def encode_cursor(payload):
+    # Decimal sort values are encoded as strings, which their fields' lookups accept back
+    raw = json.dumps(payload, separators=(',', ':'), cls=DjangoJSONEncoder).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    This function is responsible for decoding a cursor, returning None for anything malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    return payload if isinstance(payload, dict) else None
+
+
+class CountedPaginator(Paginator):
+    """
+    This class is responsible for offset pagination with a precomputed total, e.g. a cached
+    count, instead of a COUNT(*) per page.
+    """
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        if count is not None:
+            # Prime the cached_property so the database is never asked
+            self.__dict__['count'] = count
+
+
+class KeysetPage:
+    """
+    This class is responsible for one page of keyset results and the cursors around it.
+    """
+    is_keyset = True
+
+    def __init__(self, paginator, object_list, has_next, has_previous):
+        self.paginator = paginator
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    # An empty page has no row to seek from, so it has no cursors either
+    @property
+    def next_cursor(self):
+        if not self._has_next or not self.object_list:
+            return None
+        return self.paginator.cursor_for(self.object_list[-1], forward=True)
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous or not self.object_list:
+            return None
+        return self.paginator.cursor_for(self.object_list[0], forward=False)
+
+    @property
+    def first_cursor(self):
+        return encode_cursor({'s': self.paginator.sort_key, 'at': FIRST})
+
+    @property
+    def last_cursor(self):
+        return encode_cursor({'s': self.paginator.sort_key, 'at': LAST})
+
+
+class KeysetPaginator:
+    """
+    This class is responsible for paginating a queryset ordered by `field` then `pk`.
+    `count` is the total if already known; otherwise it is counted on first access.
+
+    Ascending order runs NULLS LAST and descending NULLS FIRST, i.e. one is exactly the other
+    reversed, so a single (field, id) B-tree index serves every page in both directions.
+    Cursors are bound to the sort; a cursor for another sort falls back to the first page.
+    """
+
+    def __init__(self, queryset, field, descending=False, per_page=50, count=None):
+        self.queryset = queryset
+        self.field = field
+        self.descending = descending
+        self.per_page = per_page
+        self.sort_key = f"{'-' if descending else ''}{field}"
+        self._count = count
+
+    @property
+    def count(self):
+        if self._count is None:
+            self._count = self.queryset.count()
+        return self._count
+
+    def cursor_for(self, obj, forward):
+        # Rows are model instances, or .values() dicts holding the sort field and 'id'
+        if isinstance(obj, dict):
+            value, pk = obj[self.field], obj['id']
+        else:
+            value, pk = getattr(obj, self.field), obj.pk
+        return encode_cursor({
+            's': self.sort_key,
+            'v': value,
+            'id': pk,
+            'd': 'n' if forward else 'p',
+        })
+
+    def _ordering(self, ascending):
+        """Order along the ascending sequence (non-null values, then nulls) or exactly against it."""
+        if ascending:
+            return [models.F(self.field).asc(nulls_last=True), 'pk']
+        return [models.F(self.field).desc(nulls_first=True), '-pk']
+
+    def _seek_segments(self, value, pk, ascending):
+        """
+        This method is responsible for the predicates selecting rows strictly after (value, pk)
+        along the ascending sequence, or strictly before it when `ascending` is False, split into
+        its non-null and null segments in walking order. Each one is an index range: a bare bound
+        on the field (or IS NULL) leads, and the tie-break on the key only narrows the start of it.
+        """
+        field, isnull = self.field, f"{self.field}__isnull"
+        if ascending:
+            if value is None:
+                return [models.Q(**{isnull: True, 'pk__gt': pk})]
+            return [
+                models.Q(**{f"{field}__gte": value})
+                & (models.Q(**{f"{field}__gt": value}) | models.Q(**{field: value, 'pk__gt': pk})),
+                models.Q(**{isnull: True}),
+            ]
+        if value is None:
+            return [models.Q(**{isnull: True, 'pk__lt': pk}), models.Q(**{isnull: False})]
+        return [
+            models.Q(**{f"{field}__lte": value})
+            & (models.Q(**{f"{field}__lt": value}) | models.Q(**{field: value, 'pk__lt': pk})),
+        ]
+
+    def _sort_value(self, value):
+        """
+        This method is responsible for reading a cursor's sort value as the sort field's Python
+        type, raising ValueError for anything the field would not hold, e.g. a list or a bool.
+        """
+        if value is None:
+            return None
+        if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+            raise ValueError(value)
+        field = self.queryset.model._meta.get_field(self.field)
+        if isinstance(field, (models.CharField, models.TextField)) and not isinstance(value, str):
+            raise ValueError(value)
+        try:
+            return field.to_python(value)
+        except ValidationError as e:
+            raise ValueError(value) from e
+
+    def _seek(self, payload, forward):
+        """
+        This method is responsible for the rows after (forward) or before the cursor position,
+        at most `per_page + 1` of them, in walking order.
+        """
+        # Walking forward in a descending sort walks backwards along the ascending sequence
+        ascending = forward != self.descending
+        ordering = self._ordering(ascending)
+        limit = self.per_page + 1
+        rows = []
+        # The next segment is only read once the page outruns the current one
+        for segment in self._seek_segments(payload['v'], payload['id'], ascending):
+            rows += self.queryset.filter(segment).order_by(*ordering)[:limit - len(rows)]
+            if len(rows) == limit:
+                break
+        return rows
+
+    def page(self, cursor=None):
+        """
+        This method is responsible for returning the KeysetPage a cursor points to. A cursor
+        walking off either end, e.g. once the rows behind it were deleted or filtered out, gets
+        the page at that end.
+        """
+        payload = decode_cursor(cursor) if cursor else None
+        if not payload or payload.get('s') != self.sort_key:
+            payload = {'at': FIRST}
+        elif payload.get('at') not in (FIRST, LAST):
+            pk = payload.get('id')
+            try:
+                if isinstance(pk, bool) or not isinstance(pk, int):
+                    raise ValueError(pk)
+                payload['v'] = self._sort_value(payload.get('v'))
+            except ValueError:
+                payload = {'at': FIRST}
+
+        if payload.get('at') not in (FIRST, LAST):
+            forward = payload.get('d') != 'p'
+            rows = self._seek(payload, forward)
+            if not rows:
+                payload = {'at': LAST if forward else FIRST}
+        if payload.get('at') in (FIRST, LAST):
+            forward = payload['at'] == FIRST
+            ordering = self._ordering(ascending=forward != self.descending)
+            rows = list(self.queryset.order_by(*ordering)[:self.per_page + 1])
+
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if forward:
+            return KeysetPage(self, rows, has_next=has_more, has_previous=payload.get('at') != FIRST)
+        rows.reverse()
+        return KeysetPage(self, rows, has_next=payload.get('at') != LAST, has_previous=has_more)
@@ -0,0 +1,224 @@
+"""
+This module is responsible for the pre-encoded payloads of the map endpoints.
+Each payload is serialized once per data version and permission scope, compressed ahead of time
+(gzip, and brotli when installed) and kept both in the worker and in the shared cache, so
+serving it costs neither a query nor JSON encoding; responses pick an encoding from
+Accept-Encoding.
+"""
+import gzip
+import hashlib
+import struct
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from apps.core.serialization import dumps
+
+from .hierarchy import SnapshotRegistry
+
+try:
+    import brotli
+except ImportError:  # optional, gzip is always available
+    brotli = None
+
+PAYLOAD_CACHE_TIMEOUT = 60 * 60 * 24
+# Preferred first when the client accepts several
+ENCODINGS = ['br', 'gzip', 'identity']
+# Municipality columns the SEAF map payload depends on, besides its place in the hierarchy
+SEAF_FIELDS = frozenset(['code', 'name', 'seaf_category', 'mayor_name', 'mayor_party', 'immediate_region'])
+
+
+def compress_payload(body):
+    """
+    This function is responsible for compressing a serialized body for every supported
+    Content-Encoding. Returns {encoding: bytes}.
+    """
+    encoded = {
+        'identity': body,
+        # mtime=0 keeps the bytes, and so the ETag, identical across workers
+        'gzip': gzip.compress(body, compresslevel=9, mtime=0),
+    }
+    if brotli is not None:
+        encoded['br'] = brotli.compress(body)
+    return encoded
+
+
+def negotiate_encoding(accept_encoding, available):
+    """
+    This function is responsible for choosing the encoding to send for an Accept-Encoding header:
+    the most preferred available one the client accepts with a non-zero q-value.
+    """
+    accepted = {'identity': 1.0}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    for encoding in ENCODINGS:
+        if encoding in available and accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+            return encoding
+    return 'identity'
+
+
+def representation_etag(etag, encoding):
+    """
+    This function is responsible for the strong ETag of one encoding of a payload: each
+    Content-Encoding is a different representation, so it gets its own tag.
+    """
+    if encoding == 'identity':
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def encoded_response(request, encoded, etag, content_type='application/json'):
+    """
+    This function is responsible for answering with the best pre-compressed body for the
+    request, or 304 when the client already holds that representation of this version.
+    """
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding', ''), encoded)
+    etag = representation_etag(etag, encoding)
+    # If-None-Match compares weakly, so a W/ prefix added by a proxy still matches
+    client_etags = {
+        tag.strip().removeprefix('W/') for tag in request.headers.get('If-None-Match', '').split(',')
+    }
+    if etag in client_etags or '*' in client_etags:
+        response = HttpResponse(status=304)
+    else:
+        response = HttpResponse(encoded[encoding], content_type=content_type)
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+
+def seaf_rows(scopes):
+    """
+    This function is responsible for the SEAF map rows of the categorized municipalities visible
+    through `scopes`: (code, name, seaf_category, mayor_name, mayor_party), by code.
+    """
+    from .models import Municipality
+
+    rows = Municipality.objects.within(scopes).filter(
+        seaf_category__isnull=False
+    ).values_list('code', 'name', 'seaf_category', 'mayor_name', 'mayor_party')
+    # Numeric order, which the binary format's code deltas rely on
+    return sorted(rows, key=lambda row: int(row[0]))
+
+
+def seaf_json(rows):
+    """
+    This function is responsible for the original object format: IBGE code -> name, SEAF category and mayor.
+    """
+    return dumps({
+        code: {
+            'name': name,
+            'seaf_category': seaf_category,
+            'mayor_name': mayor_name,
+            'mayor_party': mayor_party
+        }
+        for code, name, seaf_category, mayor_name, mayor_party in rows
+    })
+
+
+def seaf_columnar(rows):
+    """
+    This function is responsible for the columnar format: parallel arrays indexed by row, with
+    numeric codes and parties dictionary-encoded as 1-based indexes into `parties` (0 for none).
+    """
+    parties = sorted({row[4] for row in rows if row[4]})
+    party_index = {party: position for position, party in enumerate(parties, 1)}
+    return dumps({
+        'codes': [int(row[0]) for row in rows],
+        'names': [row[1] for row in rows],
+        'categories': [row[2] for row in rows],
+        'mayor_names': [row[3] or '' for row in rows],
+        'parties': parties,
+        'mayor_parties': [party_index.get(row[4], 0) for row in rows],
+    })
+
+
+def seaf_binary(rows):
+    """
+    This function is responsible for the binary format, little-endian typed arrays read in place
+    by the map:
+
+        header        uint32[4]  magic 'SEAF', row count n, party count p, 0
+        codes         uint32[n]  ascending, each stored as the difference from the previous one
+        mayor_parties uint16[n]  1-based index into the parties, 0 for none
+        categories    uint8[n]   0 for a value outside 1-255, which the map shows as uncategorized
+        strings       UTF-8, newline-separated: p parties, then n names, then n mayor names
+    """
+    parties = sorted({row[4] for row in rows if row[4]})
+    party_index = {party: position for position, party in enumerate(parties, 1)}
+    count = len(rows)
+    codes = [int(row[0]) for row in rows]
+    strings = [
+        *parties,
+        *(row[1] for row in rows),
+        *((row[3] or '') for row in rows),
+    ]
+    return b''.join([
+        struct.pack('<4sIII', b'SEAF', count, len(parties), 0),
+        struct.pack(f'<{count}I', *(code - previous for code, previous in zip(codes, [0, *codes]))),
+        struct.pack(f'<{count}H', *(party_index.get(row[4], 0) for row in rows)),
+        struct.pack(f'<{count}B', *(row[2] if 0 < row[2] < 256 else 0 for row in rows)),
+        '\n'.join(value.replace('\n', ' ') for value in strings).encode(),
+    ])
+
+
+# ?format= -> (serializer, content type)
+SEAF_FORMATS = {
+    'json': (seaf_json, 'application/json'),
+    'columnar': (seaf_columnar, 'application/json'),
+    'binary': (seaf_binary, 'application/octet-stream'),
+}
+
+
+class SeafPayloads:
+    """
+    This class is responsible for holding the encoded SEAF payloads of one data version,
+    filled per permission scope on first request.
+    """
+
+    def __init__(self, version):
+        self.version = version
+        self.payloads = {}
+
+    @classmethod
+    def load(cls, version=None):
+        return cls(version)
+
+    def get(self, scopes, payload_format='json'):
+        """
+        This method is responsible for returning (etag, {encoding: bytes}) of a SEAF_FORMATS
+        format for `scopes`, None meaning unrestricted. Users with the same scopes share entries.
+        """
+        digest = hashlib.sha1(repr(None if scopes is None else sorted(scopes)).encode()).hexdigest()[:16]
+        payload = self.payloads.get((digest, payload_format))
+        if payload is None:
+            key = f"cities_seaf_payload:{self.version}:{digest}:{payload_format}"
+            payload = cache.get(key)
+            if payload is None:
+                serialize = SEAF_FORMATS[payload_format][0]
+                payload = compress_payload(serialize(seaf_rows(scopes)))
+                cache.set(key, payload, PAYLOAD_CACHE_TIMEOUT)
+            self.payloads[(digest, payload_format)] = payload
+        return f'"{self.version}-{digest}-{payload_format}"', payload
+
+
+class SeafPayloadRegistry(SnapshotRegistry):
+    """
+    This class is responsible for handing out the current SeafPayloads of this worker.
+    """
+    version_key = 'cities_seaf:version'
+    snapshot_class = SeafPayloads
+
+
+seaf_payloads = SeafPayloadRegistry()
@@ -0,0 +1,125 @@
+"""
+This module is responsible for ad-hoc crosstabs of municipalities over whitelisted dimensions.
+A pivot is one grouped query over the dimension columns, cached per filter set, permission scope
+and dataset version like the facet counts.
+"""
+import hashlib
+from decimal import Decimal
+from typing import NamedTuple, Optional
+
+from django.core.cache import cache
+from django.db import models
+
+from .facets import FACET_CACHE_TIMEOUT, dataset_version
+from .hierarchy import geo_hierarchy
+from .indicators import INDICATOR_SOURCES
+
+# Dimension -> grouped column; state and region are labelled from the hierarchy snapshot instead of joined
+PIVOT_DIMENSIONS = {
+    'state': 'state_id',
+    'region': 'region_id',
+    'party': 'mayor_party',
+    'seaf_category': 'seaf_category',
+    'is_capital': 'is_capital',
+    'timezone': 'timezone',
+    'area_code': 'area_code',
+}
+
+PIVOT_AGGREGATES = {
+    'count': models.Count,
+    'sum': models.Sum,
+    'avg': models.Avg,
+    'min': models.Min,
+    'max': models.Max,
+}
+
+# Columns the aggregates other than count apply to
+PIVOT_MEASURES = ['seaf_category', *INDICATOR_SOURCES]
+
+
+class PivotSpec(NamedTuple):
+    rows: str
+    columns: Optional[str]
+    aggregate: str
+    measure: Optional[str]
+
+    @classmethod
+    def from_query(cls, params):
+        """
+        This method is responsible for reading ?rows=, ?columns=, ?aggregate= and ?measure=,
+        raising ValueError for anything outside the whitelists.
+        """
+        rows, columns = params.get('rows', ''), params.get('columns') or None
+        aggregate, measure = params.get('aggregate', 'count'), params.get('measure') or None
+        if rows not in PIVOT_DIMENSIONS or (columns is not None and columns not in PIVOT_DIMENSIONS):
+            raise ValueError(f"Dimensions must be among: {', '.join(PIVOT_DIMENSIONS)}")
+        if columns == rows:
+            raise ValueError('rows and columns must be different dimensions')
+        if aggregate not in PIVOT_AGGREGATES:
+            raise ValueError(f"aggregate must be one of: {', '.join(PIVOT_AGGREGATES)}")
+        if aggregate == 'count':
+            measure = None
+        elif measure not in PIVOT_MEASURES:
+            raise ValueError(f"measure must be one of: {', '.join(PIVOT_MEASURES)}")
+        return cls(rows, columns, aggregate, measure)
+
+
+def dimension_label(dimension, value, hierarchy):
+    if value is None:
+        return None
+    # Nodes newer than the hierarchy snapshot fall back to their id, as a string like their siblings
+    if dimension == 'state':
+        state = hierarchy.states.get(value)
+        return (state.abbreviation or state.name) if state else str(value)
+    if dimension == 'region':
+        region = hierarchy.regions.get(value)
+        return region.name if region else str(value)
+    return value
+
+
+def compute_pivot(queryset, spec):
+    """
+    This function is responsible for aggregating `queryset` over the spec's dimensions in one
+    grouped query. Returns the row and column keys and a matrix of values (a flat list when
+    there is no column dimension), None where a combination has no municipalities.
+    """
+    dimensions = [spec.rows] + ([spec.columns] if spec.columns else [])
+    columns = [PIVOT_DIMENSIONS[dimension] for dimension in dimensions]
+    aggregate = PIVOT_AGGREGATES[spec.aggregate](spec.measure or 'id')
+    grouped = queryset.order_by().values(*columns).annotate(pivot_value=aggregate).values_list(*columns, 'pivot_value')
+
+    hierarchy = geo_hierarchy.get()
+    cells = {}
+    for *keys, value in grouped:
+        labels = tuple(dimension_label(dimension, key, hierarchy) for dimension, key in zip(dimensions, keys))
+        cells[labels] = float(value) if isinstance(value, Decimal) else value
+
+    def ordered(keys):
+        # None (no value) last, the rest in natural order; numbers sort before strings if both appear
+        return sorted(set(keys), key=lambda key: (key is None, isinstance(key, str), key))
+
+    row_keys = ordered(labels[0] for labels in cells)
+    if not spec.columns:
+        return {'row_keys': row_keys, 'column_keys': None, 'values': [cells[(key,)] for key in row_keys]}
+    column_keys = ordered(labels[1] for labels in cells)
+    return {
+        'row_keys': row_keys,
+        'column_keys': column_keys,
+        'values': [[cells.get((row, column)) for column in column_keys] for row in row_keys],
+    }
+
+
+def get_pivot(queryset, spec, filters, scopes):
+    """
+    This function is responsible for returning the cached pivot of `queryset`, which must be the
+    municipalities under `filters` visible through `scopes` (None for unrestricted access).
+    """
+    scope_key = None if scopes is None else sorted(scopes)
+    digest = hashlib.sha1(repr((tuple(spec), tuple(filters), scope_key)).encode()).hexdigest()
+    key = f"cities_pivot:{dataset_version()}:{digest}"
+
+    pivot = cache.get(key)
+    if pivot is None:
+        pivot = compute_pivot(queryset, spec)
+        cache.set(key, pivot, FACET_CACHE_TIMEOUT)
+    return pivot
@@ -0,0 +1,142 @@
+"""
+This module is responsible for maintaining SeafRollup, the SEAF category totals of every region,
+state, intermediate and immediate region. A municipality write touches only the rows of its own
+ancestors, in one UPDATE; the full rebuild is two queries and a bulk insert, and runs once per
+transaction however many hierarchy nodes it changes.
+"""
+from collections import defaultdict
+
+from django.db import models, transaction
+from django.db.models.functions import Cast, NullIf
+
+from .models import GeoClosure, Municipality, SeafRollup
+
+SEAF_CATEGORIES = (1, 2, 3, 4)
+ROLLUP_LEVELS = [level for level, _ in SeafRollup._meta.get_field('level').choices]
+
+
+def rollup_nodes(immediate_region_id):
+    """
+    This function is responsible for the (level, id) nodes whose totals include a municipality
+    of the immediate region: the region itself and its ancestors.
+    """
+    return list(GeoClosure.objects.filter(
+        descendant_level='immediateregion',
+        descendant_id=immediate_region_id
+    ).values_list('ancestor_level', 'ancestor_id'))
+
+
+def apply_seaf_delta(immediate_region_id, seaf_category, sign):
+    """
+    This function is responsible for adding (sign=1) or removing (sign=-1) one municipality with
+    `seaf_category` to the totals of its ancestors. Missing rows are created first; the counters
+    then move in a single UPDATE, relative to the stored values so concurrent writes add up.
+    """
+    nodes = rollup_nodes(immediate_region_id)
+    if not nodes:
+        return
+    categorized = sign if seaf_category is not None else 0
+    seaf_sum = sign * (seaf_category or 0)
+    changes = {
+        'municipalities': models.F('municipalities') + sign,
+        'categorized': models.F('categorized') + categorized,
+        'seaf_sum': models.F('seaf_sum') + seaf_sum,
+        # Written from the pre-update values, as every assignment in an UPDATE reads the old row
+        'average': Cast(models.F('seaf_sum') + seaf_sum, models.FloatField()) / NullIf(
+            models.F('categorized') + categorized, 0
+        ),
+    }
+    if seaf_category in SEAF_CATEGORIES:
+        column = f"category_{seaf_category}"
+        changes[column] = models.F(column) + sign
+
+    selected = models.Q()
+    for level, node_id in nodes:
+        selected |= models.Q(level=level, node_id=node_id)
+    with transaction.atomic():
+        SeafRollup.objects.bulk_create(
+            [SeafRollup(level=level, node_id=node_id) for level, node_id in nodes],
+            ignore_conflicts=True
+        )
+        SeafRollup.objects.filter(selected).update(**changes)
+
+
+def rollups_within(level, scopes):
+    """
+    This function is responsible for the rollup rows of a level visible through `scopes`, None
+    meaning unrestricted: only nodes at or below a granted node, since the totals of a wider area
+    would reveal municipalities outside the scope.
+    """
+    rollups = SeafRollup.objects.filter(level=level).order_by('node_id')
+    if scopes is None:
+        return rollups
+    if not scopes:
+        return rollups.none()
+    nodes = models.Q()
+    for scope_level, scope_id in scopes:
+        nodes |= models.Q(ancestor_level=scope_level, ancestor_id=scope_id)
+    return rollups.filter(node_id__in=GeoClosure.objects.filter(
+        nodes,
+        descendant_level=level
+    ).values('descendant_id'))
+
+
+def rebuild_seaf_rollups():
+    """
+    This function is responsible for recomputing every rollup row from the municipalities,
+    e.g. after loaddata or bulk updates that bypass signals. Returns the number of rows written.
+    """
+    per_region = defaultdict(lambda: defaultdict(int))
+    for immediate_region_id, seaf_category, count in Municipality.objects.order_by().values_list(
+        'immediate_region_id', 'seaf_category'
+    ).annotate(count=models.Count('id')):
+        per_region[immediate_region_id][seaf_category] += count
+
+    totals = defaultdict(lambda: defaultdict(int))
+    for level, node_id, immediate_region_id in GeoClosure.objects.filter(
+        descendant_level='immediateregion'
+    ).values_list('ancestor_level', 'ancestor_id', 'descendant_id'):
+        for seaf_category, count in per_region.get(immediate_region_id, {}).items():
+            totals[(level, node_id)][seaf_category] += count
+
+    rows = []
+    for (level, node_id), counts in totals.items():
+        categorized = sum(count for seaf_category, count in counts.items() if seaf_category is not None)
+        seaf_sum = sum(seaf_category * count for seaf_category, count in counts.items() if seaf_category is not None)
+        rows.append(SeafRollup(
+            level=level,
+            node_id=node_id,
+            municipalities=sum(counts.values()),
+            categorized=categorized,
+            seaf_sum=seaf_sum,
+            average=seaf_sum / categorized if categorized else None,
+            **{f"category_{category}": counts.get(category, 0) for category in SEAF_CATEGORIES}
+        ))
+
+    with transaction.atomic():
+        SeafRollup.objects.all().delete()
+        SeafRollup.objects.bulk_create(rows, batch_size=5000)
+    return len(rows)
+
+
+def schedule_seaf_rollup_rebuild():
+    """
+    This function is responsible for rebuilding the rollups once the current transaction commits,
+    at most once per transaction: cascaded deletes and bulk hierarchy edits run a single rebuild
+    instead of one per row. Outside a transaction it rebuilds immediately.
+    """
+    connection = transaction.get_connection()
+    # Shared by every rebuild scheduled until one of them runs; a rolled-back transaction leaves
+    # it pending, so the next commit still rebuilds
+    batch = getattr(connection, 'seaf_rollup_batch', None)
+    if batch is None:
+        batch = connection.seaf_rollup_batch = {'done': False}
+
+    def rebuild():
+        if getattr(connection, 'seaf_rollup_batch', None) is batch:
+            connection.seaf_rollup_batch = None
+        if not batch['done']:
+            batch['done'] = True
+            rebuild_seaf_rollups()
+
+    transaction.on_commit(rebuild)
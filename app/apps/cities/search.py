@@ -0,0 +1,87 @@
+"""
+This module is responsible for accent-insensitive municipality search.
+Names are normalized (unaccented, casefolded) into indexed columns on save; on PostgreSQL the
+columns carry pg_trgm GIN indexes and results are ranked by trigram similarity, elsewhere the
+same filters run as plain LIKE queries ranked by match position.
+"""
+import re
+import unicodedata
+
+from django.db import connection, models
+
+# Below this, pg_trgm similarity matches are mostly noise for short municipality names
+TRIGRAM_THRESHOLD = 0.3
+
+
+def normalize_search_text(value):
+    """
+    This function is responsible for folding text to its searchable form:
+    accents stripped, casefolded and whitespace collapsed ("São  Paulo" -> "sao paulo").
+    """
+    if not value:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', value)
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return re.sub(r'\s+', ' ', stripped.casefold()).strip()
+
+
+def municipality_search_columns(name, mayor_name):
+    """
+    This function is responsible for computing the (search_name, search_text) column values.
+    """
+    search_name = normalize_search_text(name)
+    return search_name, ' '.join(filter(None, [search_name, normalize_search_text(mayor_name)]))
+
+
+def search_municipalities(queryset, query):
+    """
+    This function is responsible for filtering a Municipality queryset by a free-text query over
+    name, mayor name, state abbreviation and IBGE code, ordered by relevance.
+    """
+    term = normalize_search_text(query)
+    if not term:
+        return queryset
+
+    matches = models.Q(search_text__contains=term)
+    rank = models.Case(
+        models.When(search_name=term, then=0),
+        models.When(search_name__startswith=term, then=1),
+        models.When(search_name__contains=f' {term}', then=2),
+        models.When(search_text__contains=term, then=3),
+        default=4,
+        output_field=models.IntegerField()
+    )
+    if term.isdigit():
+        matches |= models.Q(code__startswith=term)
+    if len(term) == 2 and term.isalpha():
+        matches |= models.Q(state__abbreviation__iexact=term)
+
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        # The % operator catches misspellings that LIKE misses, through the same GIN index
+        return queryset.filter(
+            matches | models.Q(search_name__trigram_similar=term)
+        ).annotate(
+            search_rank=rank,
+            search_similarity=TrigramSimilarity('search_name', term)
+        ).order_by('search_rank', '-search_similarity', 'name')
+
+    return queryset.filter(matches).annotate(search_rank=rank).order_by('search_rank', 'name')
+
+
+def sync_search_columns():
+    """
+    This function is responsible for recomputing the search columns of every municipality,
+    e.g. after loaddata, which bypasses Model.save(). Returns the number of rows changed.
+    """
+    from .models import Municipality
+
+    changed = []
+    for municipality in Municipality.objects.only('id', 'name', 'mayor_name', 'search_name', 'search_text'):
+        columns = municipality_search_columns(municipality.name, municipality.mayor_name)
+        if columns != (municipality.search_name, municipality.search_text):
+            municipality.search_name, municipality.search_text = columns
+            changed.append(municipality)
+    Municipality.objects.bulk_update(changed, ['search_name', 'search_text'], batch_size=1000)
+    return len(changed)
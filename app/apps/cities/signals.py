@@ -0,0 +1,171 @@
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from .autocomplete import municipality_autocomplete
+from .closure import place_geo_node, remove_geo_node
+from .facets import bump_dataset_version
+from .indicators import INDICATOR_SOURCES
+from .hierarchy import geo_hierarchy
+from .payloads import SEAF_FIELDS, seaf_payloads
+from .rollups import apply_seaf_delta, schedule_seaf_rollup_rebuild
+from .models import Region, State, IntermediateRegion, ImmediateRegion, Municipality, MunicipalityWikiProfile
+
+
+@receiver(post_save, sender=Region)
+@receiver(post_delete, sender=Region)
+@receiver(post_save, sender=State)
+@receiver(post_delete, sender=State)
+@receiver(post_save, sender=IntermediateRegion)
+@receiver(post_delete, sender=IntermediateRegion)
+@receiver(post_save, sender=ImmediateRegion)
+@receiver(post_delete, sender=ImmediateRegion)
+def invalidate_geo_hierarchy(sender, instance, **kwargs):
+    """
+    Reload the in-memory geographic hierarchy in every worker after a node changes.
+    """
+    geo_hierarchy.invalidate()
+
+
+@receiver(post_save, sender=State)
+@receiver(post_delete, sender=State)
+@receiver(post_save, sender=IntermediateRegion)
+@receiver(post_delete, sender=IntermediateRegion)
+@receiver(post_save, sender=ImmediateRegion)
+@receiver(post_delete, sender=ImmediateRegion)
+@receiver(post_save, sender=Municipality)
+@receiver(post_delete, sender=Municipality)
+def invalidate_municipality_autocomplete(sender, instance, **kwargs):
+    """
+    Rebuild the autocomplete index in every worker after a municipality or its hierarchy changes.
+    """
+    municipality_autocomplete.invalidate()
+
+
+@receiver(post_save, sender=Region)
+@receiver(post_save, sender=State)
+@receiver(post_save, sender=IntermediateRegion)
+@receiver(post_save, sender=ImmediateRegion)
+@receiver(post_save, sender=Municipality)
+@receiver(post_delete, sender=Municipality)
+@receiver(post_save, sender=MunicipalityWikiProfile)
+@receiver(post_delete, sender=MunicipalityWikiProfile)
+def invalidate_city_counts(sender, instance, **kwargs):
+    """
+    Orphan the cached result and facet counts, and the municipality API ETags, after a
+    municipality write. Hierarchy saves and Wikipedia profile saves count too: they update their
+    municipalities' denormalized hierarchy and indicator columns, and the names the API returns.
+    """
+    bump_dataset_version()
+
+
+@receiver(post_save, sender=State)
+@receiver(post_save, sender=IntermediateRegion)
+@receiver(post_save, sender=ImmediateRegion)
+@receiver(post_save, sender=Municipality)
+@receiver(post_delete, sender=Municipality)
+def invalidate_seaf_payloads(sender, instance, update_fields=None, **kwargs):
+    """
+    Re-encode the SEAF map payloads after a write to the data they hold. Hierarchy saves count
+    too: they can move municipalities between permission scopes.
+    """
+    if sender is Municipality and update_fields is not None and not SEAF_FIELDS.intersection(update_fields):
+        return
+    seaf_payloads.invalidate()
+
+
+@receiver(post_save, sender=Region)
+@receiver(post_save, sender=State)
+@receiver(post_save, sender=IntermediateRegion)
+@receiver(post_save, sender=ImmediateRegion)
+@receiver(post_save, sender=Municipality)
+def sync_geo_closure(sender, instance, raw=False, **kwargs):
+    """
+    Insert or move the node in the closure table. Fixture loads (raw) are followed by a
+    full rebuild instead, see load_initial_data.
+    """
+    if not raw:
+        place_geo_node(instance)
+
+
+@receiver(post_delete, sender=Region)
+@receiver(post_delete, sender=State)
+@receiver(post_delete, sender=IntermediateRegion)
+@receiver(post_delete, sender=ImmediateRegion)
+@receiver(post_delete, sender=Municipality)
+def remove_geo_closure(sender, instance, **kwargs):
+    """
+    Drop the node's closure rows and the group grants scoped to it, as a foreign key cascade would.
+    """
+    from apps.auth.models import GroupResourcePermission
+
+    remove_geo_node(instance)
+    for grant in GroupResourcePermission.objects.filter(
+        scope_level=instance._meta.model_name,
+        scope_id=instance.pk
+    ):
+        # Deleted one by one so the auth signals rebuild the members' effective permissions
+        grant.delete()
+
+
+@receiver(post_delete, sender=MunicipalityWikiProfile)
+def clear_municipality_indicators(sender, instance, **kwargs):
+    """
+    Drop the indicators parsed from a deleted Wikipedia profile.
+    """
+    Municipality.objects.filter(pk=instance.municipality_id).update(
+        **{column: None for column in INDICATOR_SOURCES}
+    )
+
+
+@receiver(pre_save, sender=Municipality)
+def remember_seaf_rollup_position(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Note where the municipality was counted in the SEAF rollups before the write.
+    """
+    instance._seaf_rollup_previous = None
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and not {'seaf_category', 'immediate_region'} & set(update_fields):
+        return
+    instance._seaf_rollup_previous = Municipality.objects.filter(pk=instance.pk).values_list(
+        'immediate_region_id', 'seaf_category'
+    ).first()
+
+
+@receiver(post_save, sender=Municipality)
+def update_seaf_rollups(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """
+    Move the municipality between SEAF rollup totals when its category or immediate region changed.
+    Fixture loads (raw) are followed by a full rebuild instead, see load_initial_data.
+    """
+    if raw:
+        return
+    current = (instance.immediate_region_id, instance.seaf_category)
+    previous = getattr(instance, '_seaf_rollup_previous', None)
+    if not created and (previous is None or previous == current):
+        return
+    if previous is not None:
+        apply_seaf_delta(*previous, sign=-1)
+    apply_seaf_delta(*current, sign=1)
+
+
+@receiver(post_delete, sender=Municipality)
+def remove_from_seaf_rollups(sender, instance, **kwargs):
+    """
+    Take a deleted municipality out of the SEAF rollup totals.
+    """
+    apply_seaf_delta(instance.immediate_region_id, instance.seaf_category, sign=-1)
+
+
+@receiver(post_save, sender=State)
+@receiver(post_delete, sender=State)
+@receiver(post_save, sender=IntermediateRegion)
+@receiver(post_delete, sender=IntermediateRegion)
+@receiver(post_save, sender=ImmediateRegion)
+@receiver(post_delete, sender=ImmediateRegion)
+def rebuild_seaf_rollups_after_move(sender, instance, raw=False, **kwargs):
+    """
+    Recompute the SEAF rollups after a hierarchy node changes, as it may carry municipalities
+    between ancestors. Deferred to commit, so it reads the final closure rows, once per transaction.
+    """
+    if not raw:
+        schedule_seaf_rollup_rebuild()
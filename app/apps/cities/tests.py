@@ -1,20 +1,58 @@
 """
 This module is responsible for testing region-scoped permission functionality.
 """
+import gzip
+import json
+import struct
+import tempfile
+from datetime import date
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+
 from django.contrib import admin
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group, Permission
-from django.test import RequestFactory, TestCase
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from openpyxl import load_workbook
 
 from apps.auth.decorators import check_resource_permission, get_user_permitted_regions
-from apps.auth.models import GroupResourcePermission, ResourcePermission
+from apps.auth.models import GroupResourcePermission, PermissionLog, ResourcePermission, UserPermission
+from apps.core import serialization
 from apps.cities.admin import MunicipalityAdmin, StateAdmin
+from apps.cities.artifacts import (
+    ARTIFACT_FORMATS,
+    build_artifacts,
+    dataset_fingerprint,
+    read_manifest,
+    scope_key,
+    watch_artifacts,
+)
+from apps.cities.autocomplete import municipality_autocomplete
+from apps.cities.closure import rebuild_geo_closure
+from apps.cities.facets import CityFilters, bump_dataset_version, get_facets
+from apps.cities.forms import MunicipalityEditForm
+from apps.cities.indicators import parse_decimal
+from apps.cities.hierarchy import geo_hierarchy
+from apps.cities.pagination import KeysetPaginator, encode_cursor
+from apps.cities.rollups import rebuild_seaf_rollups
+from apps.cities.payloads import negotiate_encoding, seaf_binary
+from apps.cities.search import normalize_search_text, search_municipalities
 from apps.cities.models import (
+    GeoClosure,
     ImmediateRegion,
     IntermediateRegion,
     Municipality,
+    MunicipalityWikiProfile,
     Region,
+    SeafRollup,
     State,
+    sync_hierarchy_columns,
 )
 
 User = get_user_model()
@@ -239,6 +277,17 @@ class RegionScopedAdminMixinTests(RegionScopedPermissionTests):
         request = self._make_request()
         self.assertFalse(self.admin_municipality.has_change_permission(request, obj=self.municipality_s))
 
+    def test_denials_without_a_region_do_not_reload_the_hierarchy(self):
+        request = self._make_request()
+        with mock.patch.object(self.admin_municipality, "_resolve_region", return_value=None), \
+                mock.patch.object(geo_hierarchy, "refresh", wraps=geo_hierarchy.refresh) as refresh:
+            self.admin_municipality._log_denied(request, Municipality(code="9999999", name="Nova"), "add")
+
+        refresh.assert_not_called()
+        self.assertTrue(PermissionLog.objects.filter(
+            user=self.user, action="access_denied", details__endswith="region=unknown"
+        ).exists())
+
     def test_queryset_filtered_by_region(self):
         self.user.groups.add(self.group_ne)
         GroupResourcePermission.objects.create(
@@ -266,3 +315,1049 @@ class RegionScopedAdminMixinTests(RegionScopedPermissionTests):
 
         self.assertIn(self.municipality_ne, qs)
         self.assertIn(self.municipality_s, qs)
+
+
+class RegionScopedQuerySetTests(RegionScopedPermissionTests):
+    """
+    This class is responsible for testing the for_user queryset scoping.
+    """
+
+    def test_scoped_group_grant_limits_rows(self):
+        self.user.groups.add(self.group_ne)
+        GroupResourcePermission.objects.create(
+            group=self.group_ne,
+            resource_permission=self.view_perm,
+            region=self.region_ne,
+        )
+
+        self.assertEqual(list(Municipality.objects.for_user(self.user, "view")), [self.municipality_ne])
+        self.assertEqual(list(State.objects.for_user(self.user, "view", "cities.municipality")), [self.state_ne])
+        self.assertEqual(list(Region.objects.for_user(self.user, "view", "cities.municipality")), [self.region_ne])
+
+    def test_global_and_direct_grants_see_everything(self):
+        UserPermission.objects.create(user=self.user, resource_permission=self.change_perm)
+        self.user.groups.add(self.group_global)
+        GroupResourcePermission.objects.create(
+            group=self.group_global,
+            resource_permission=self.view_perm,
+            region=None,
+        )
+
+        self.assertEqual(Municipality.objects.for_user(self.user, "view").count(), 2)
+        self.assertEqual(Municipality.objects.for_user(self.user, "change").count(), 2)
+
+    def test_no_grant_returns_nothing(self):
+        self.assertFalse(Municipality.objects.for_user(self.user, "view").exists())
+
+    def test_scoping_is_a_single_query(self):
+        self.user.groups.add(self.group_ne)
+        GroupResourcePermission.objects.create(
+            group=self.group_ne,
+            resource_permission=self.view_perm,
+            region=self.region_ne,
+        )
+
+        with self.assertNumQueries(1):
+            list(Municipality.objects.for_user(self.user, "view"))
+
+
+class GeoHierarchyTests(RegionScopedPermissionTests):
+    """
+    This class is responsible for testing the in-memory geographic hierarchy registry.
+    """
+
+    def test_resolution_and_labels_do_not_query(self):
+        geo_hierarchy.get()
+        municipality = Municipality.objects.get(pk=self.municipality_ne.pk)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(geo_hierarchy.lookup(lambda h: h.region_id_for(municipality)), self.region_ne.id)
+            self.assertEqual(str(municipality), "City NE - State NE")
+            self.assertEqual(MunicipalityAdmin(Municipality, admin.site).state_name(municipality), "State NE")
+
+    def test_hierarchy_reloads_after_change(self):
+        self.assertEqual(str(self.municipality_s), "City S - State S")
+
+        self.state_s.name = "Renamed S"
+        self.state_s.save()
+
+        self.assertEqual(str(self.municipality_s), "City S - Renamed S")
+
+    def test_unsaved_instance_resolves_through_parent_ids(self):
+        municipality = Municipality(code="1000002", name="New NE", immediate_region=self.immediate_ne)
+        self.assertEqual(geo_hierarchy.lookup(lambda h: h.region_id_for(municipality)), self.region_ne.id)
+
+
+class HierarchyColumnsTests(RegionScopedPermissionTests):
+    """
+    This class is responsible for testing that the denormalized state/region columns stay consistent.
+    """
+
+    def test_columns_are_filled_on_save(self):
+        self.assertEqual(self.municipality_ne.state_id, self.state_ne.id)
+        self.assertEqual(self.municipality_ne.region_id, self.region_ne.id)
+        self.immediate_ne.refresh_from_db()
+        self.assertEqual(self.immediate_ne.region_id, self.region_ne.id)
+
+    def test_moving_a_state_updates_descendants(self):
+        self.state_ne.region = self.region_s
+        self.state_ne.save()
+
+        self.municipality_ne.refresh_from_db()
+        self.assertEqual(self.municipality_ne.region_id, self.region_s.id)
+        self.assertEqual(list(Municipality.objects.in_regions([self.region_ne.id])), [])
+
+    def test_moving_an_intermediate_region_updates_municipalities(self):
+        self.intermediate_ne.state = self.state_s
+        self.intermediate_ne.save()
+
+        self.municipality_ne.refresh_from_db()
+        self.assertEqual(self.municipality_ne.state_id, self.state_s.id)
+        self.assertEqual(self.municipality_ne.region_id, self.region_s.id)
+
+    def test_sync_restores_columns_after_bulk_update(self):
+        Municipality.objects.update(state=None, region=None)
+
+        sync_hierarchy_columns()
+
+        self.municipality_s.refresh_from_db()
+        self.assertEqual(self.municipality_s.state_id, self.state_s.id)
+        self.assertEqual(self.municipality_s.region_id, self.region_s.id)
+
+
+class GeoClosureTests(RegionScopedPermissionTests):
+    """
+    This class is responsible for testing the geographic closure table and grants on any hierarchy node.
+    """
+
+    def _closure(self):
+        return set(GeoClosure.objects.values_list(
+            "ancestor_level", "ancestor_id", "descendant_level", "descendant_id", "depth"
+        ))
+
+    def test_inserts_build_full_paths(self):
+        self.assertEqual(
+            set(GeoClosure.objects.filter(
+                descendant_level="municipality", descendant_id=self.municipality_ne.id
+            ).values_list("ancestor_level", "ancestor_id", "depth")),
+            {
+                ("municipality", self.municipality_ne.id, 0),
+                ("immediateregion", self.immediate_ne.id, 1),
+                ("intermediateregion", self.intermediate_ne.id, 2),
+                ("state", self.state_ne.id, 3),
+                ("region", self.region_ne.id, 4),
+            },
+        )
+
+    def test_move_rewires_subtree_and_matches_rebuild(self):
+        self.intermediate_ne.state = self.state_s
+        self.intermediate_ne.save()
+
+        self.assertEqual(
+            set(Municipality.objects.under("state", self.state_s.id)),
+            {self.municipality_ne, self.municipality_s},
+        )
+        self.assertFalse(Municipality.objects.under("region", self.region_ne.id).exists())
+
+        incremental = self._closure()
+        rebuild_geo_closure()
+        self.assertEqual(self._closure(), incremental)
+
+    def test_delete_removes_rows(self):
+        self.intermediate_s.delete()
+
+        self.assertFalse(GeoClosure.objects.filter(descendant_level="municipality", descendant_id=self.municipality_s.id).exists())
+        self.assertFalse(GeoClosure.objects.filter(ancestor_level="intermediateregion", ancestor_id=self.intermediate_s.id).exists())
+
+    def test_grant_on_immediate_region_scopes_checks_and_querysets(self):
+        self.user.groups.add(self.group_ne)
+        GroupResourcePermission.objects.create(
+            group=self.group_ne,
+            resource_permission=self.view_perm,
+            scope_level="immediateregion",
+            scope_id=self.immediate_ne.id,
+        )
+        sibling = ImmediateRegion.objects.create(
+            code="100102", name="Immediate NE 2", intermediate_region=self.intermediate_ne
+        )
+        other = Municipality.objects.create(code="1000002", name="City NE 2", immediate_region=sibling)
+
+        self.assertTrue(check_resource_permission(self.user, "cities.municipality", "view", region=self.municipality_ne))
+        self.assertFalse(check_resource_permission(self.user, "cities.municipality", "view", region=other))
+        self.assertFalse(check_resource_permission(self.user, "cities.municipality", "view", region=self.region_ne))
+        self.assertEqual(get_user_permitted_regions(self.user, "cities.municipality", "view"), [])
+        self.assertEqual(
+            list(Municipality.objects.for_user(self.user, "view", resource_name="cities.municipality")),
+            [self.municipality_ne],
+        )
+
+    def test_deleting_scoped_node_removes_grants(self):
+        GroupResourcePermission.objects.create(
+            group=self.group_ne,
+            resource_permission=self.view_perm,
+            scope_level="municipality",
+            scope_id=self.municipality_ne.id,
+        )
+
+        self.municipality_ne.delete()
+
+        self.assertFalse(GroupResourcePermission.objects.filter(scope_level="municipality").exists())
+
+    def test_cascaded_deletes_remove_grants_on_every_node_below(self):
+        for level, node in [
+            ("state", self.state_ne),
+            ("immediateregion", self.immediate_ne),
+            ("municipality", self.municipality_ne),
+            ("state", self.state_s),
+        ]:
+            GroupResourcePermission.objects.create(
+                group=self.group_ne, resource_permission=self.view_perm, scope_level=level, scope_id=node.id
+            )
+
+        self.state_ne.delete()
+
+        self.assertEqual(
+            list(GroupResourcePermission.objects.values_list("scope_level", "scope_id")),
+            [("state", self.state_s.id)],
+        )
+
+
+class MunicipalitySearchTestCase(TestCase):
+    """
+    This class is responsible for setting up a small São Paulo hierarchy for search tests.
+    """
+
+    def setUp(self):
+        region = Region.objects.create(code="SE", name="Sudeste")
+        state = State.objects.create(code="35", name="São Paulo", abbreviation="SP", region=region)
+        intermediate = IntermediateRegion.objects.create(code="3501", name="São Paulo", state=state)
+        immediate = ImmediateRegion.objects.create(code="350001", name="São Paulo", intermediate_region=intermediate)
+        self.sao_paulo = Municipality.objects.create(
+            code="3550308", name="São Paulo", immediate_region=immediate, mayor_name="Ricardo Nunes"
+        )
+        self.sao_jose = Municipality.objects.create(
+            code="3549904", name="São José dos Campos", immediate_region=immediate
+        )
+        self.paulo_de_faria = Municipality.objects.create(
+            code="3536208", name="Paulo de Faria", immediate_region=immediate
+        )
+
+
+class MunicipalitySearchTests(MunicipalitySearchTestCase):
+    """
+    This class is responsible for testing accent-insensitive municipality search.
+    """
+
+    def _search(self, query):
+        return list(search_municipalities(Municipality.objects.all(), query))
+
+    def test_normalization_strips_accents_and_case(self):
+        self.assertEqual(normalize_search_text("  São   JOSÉ "), "sao jose")
+        self.assertEqual(self.sao_paulo.search_name, "sao paulo")
+
+    def test_unaccented_query_matches_and_ranks_by_position(self):
+        self.assertEqual(self._search("Sao Paulo"), [self.sao_paulo])
+        self.assertEqual(self._search("paulo"), [self.paulo_de_faria, self.sao_paulo])
+
+    def test_matches_mayor_state_abbreviation_and_code(self):
+        self.assertEqual(self._search("nunes"), [self.sao_paulo])
+        self.assertEqual(len(self._search("SP")), 3)
+        self.assertEqual(self._search("35503"), [self.sao_paulo])
+
+    def test_search_columns_follow_mayor_updates(self):
+        self.sao_jose.mayor_name = "Anderson Farias"
+        self.sao_jose.save(update_fields=["mayor_name"])
+
+        self.assertEqual(self._search("anderson"), [self.sao_jose])
+
+
+class MunicipalityAutocompleteTests(MunicipalitySearchTestCase):
+    """
+    This class is responsible for testing the in-memory autocomplete index and endpoint.
+    """
+
+    def test_prefix_matches_rank_name_before_word_and_code(self):
+        index = municipality_autocomplete.refresh()
+
+        self.assertEqual(
+            [entry.name for entry in index.search("pau")],
+            ["Paulo de Faria", "São Paulo"],
+        )
+        self.assertEqual([entry.name for entry in index.search("campos sp")], ["São José dos Campos"])
+        self.assertEqual([entry.name for entry in index.search("3550")], ["São Paulo"])
+
+    def test_index_follows_edits(self):
+        municipality_autocomplete.get()
+        self.paulo_de_faria.name = "Paulínia"
+        self.paulo_de_faria.save()
+
+        self.assertEqual(
+            [entry.name for entry in municipality_autocomplete.get().search("paulinia")],
+            ["Paulínia"],
+        )
+
+    def test_endpoint_is_scoped_and_query_free(self):
+        user = User.objects.create_user(email="ac@example.com", username="ac", password="password")
+        group = Group.objects.create(name="Immediate scope")
+        user.groups.add(group)
+        GroupResourcePermission.objects.create(
+            group=group,
+            resource_permission=ResourcePermission.objects.create(
+                name="View City", codename="view_cities_city", permission_type="view", resource_name="cities.city"
+            ),
+            scope_level="municipality",
+            scope_id=self.sao_paulo.id,
+        )
+        self.client.force_login(user)
+        url = reverse("cities:autocomplete_api")
+        self.client.get(url, {"q": "sao"})
+        municipality_autocomplete.get()
+
+        # Session and user lookups only; the index and permission set come from memory/cache
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {"q": "sao"})
+
+        self.assertEqual([city["name"] for city in response.json()["results"]], ["São Paulo"])
+
+
+class KeysetPaginationTests(MunicipalitySearchTestCase):
+    """
+    This class is responsible for testing keyset pagination of municipalities.
+    """
+
+    def setUp(self):
+        super().setUp()
+        immediate = self.sao_paulo.immediate_region
+        for index, category in enumerate([2, None, 1, 2, None]):
+            Municipality.objects.create(
+                code=f"35000{index}0", name=f"Cidade {index}", immediate_region=immediate, seaf_category=category
+            )
+        self.sao_paulo.seaf_category = 1
+        self.sao_paulo.save()
+
+    def _walk(self, paginator, cursor=None, backwards=False):
+        pages = []
+        page = paginator.page(cursor)
+        while True:
+            pages.insert(0, page.object_list) if backwards else pages.append(page.object_list)
+            cursor = page.previous_cursor if backwards else page.next_cursor
+            if cursor is None:
+                return [city.pk for rows in pages for city in rows]
+            page = paginator.page(cursor)
+
+    def test_walk_matches_offset_order_with_nulls_and_ties(self):
+        for descending in (False, True):
+            ascending = [F("seaf_category").asc(nulls_last=True), "pk"]
+            expected = list(Municipality.objects.order_by(*ascending).values_list("pk", flat=True))
+            if descending:
+                expected.reverse()
+            paginator = KeysetPaginator(
+                Municipality.objects.all(), 'seaf_category', descending=descending, per_page=3
+            )
+            first = paginator.page()
+
+            self.assertEqual(self._walk(paginator), expected)
+            self.assertEqual(self._walk(paginator, first.last_cursor, backwards=True), expected)
+
+    def test_seek_uses_an_index_range(self):
+        pk = self.sao_paulo.pk
+        for descending in (False, True):
+            paginator = KeysetPaginator(Municipality.objects.all(), 'seaf_category', descending=descending)
+            seek = paginator._seek_segments(1, pk, not descending)[0]
+            plan = Municipality.objects.filter(seek).order_by(*paginator._ordering(not descending)).explain()
+
+            if connection.vendor == 'sqlite':
+                bound = "seaf_category<?" if descending else "seaf_category>?"
+                self.assertIn(f"USING INDEX cities_muni_seaf_id_idx ({bound})", plan)
+            elif connection.vendor == 'postgresql':
+                self.assertIn("Index Cond", plan)
+
+    def test_cursor_is_bound_to_its_sort(self):
+        by_name = KeysetPaginator(Municipality.objects.all(), 'name', per_page=2)
+        by_mayor = KeysetPaginator(Municipality.objects.all(), 'mayor_name', per_page=2)
+        cursor = by_name.page().next_cursor
+
+        self.assertEqual(by_mayor.page(cursor).object_list, by_mayor.page().object_list)
+        self.assertEqual(by_name.page("not-a-cursor").object_list, by_name.page().object_list)
+
+    def test_cursors_past_the_rows_or_of_the_wrong_type_fall_back_to_an_end(self):
+        paginator = KeysetPaginator(Municipality.objects.all(), 'name', per_page=3)
+        cursor = paginator.page().next_cursor
+        Municipality.objects.filter(name__gt="Cidade 1").delete()
+
+        page = paginator.page(cursor)
+        self.assertEqual([city.name for city in page], ["Cidade 0", "Cidade 1"])
+        self.assertFalse(page.has_next())
+        self.assertIsNone(page.next_cursor)
+        self.assertIsNone(page.previous_cursor)
+
+        for value in ([5], True, 5, {"a": 1}):
+            cursor = encode_cursor({"s": "name", "v": value, "id": 1})
+            self.assertEqual(paginator.page(cursor).object_list, paginator.page().object_list)
+        cursor = encode_cursor({"s": "seaf_category", "v": "two", "id": 1})
+        by_category = KeysetPaginator(Municipality.objects.all(), 'seaf_category', per_page=3)
+        self.assertEqual(by_category.page(cursor).object_list, by_category.page().object_list)
+
+    def test_api_serves_stale_cursors(self):
+        user = User.objects.create_superuser(email="stale@example.com", username="stale", password="password")
+        self.client.force_login(user)
+        cursor = encode_cursor({"s": "name", "v": [5], "id": 1})
+        self.assertEqual(self.client.get(reverse("cities:municipalities_api"), {"cursor": cursor}).status_code, 200)
+        cursor = encode_cursor({"s": "name", "v": "zzz", "id": 10 ** 6})
+        response = self.client.get(reverse("cities:municipalities_api"), {"cursor": cursor, "limit": 5})
+        self.assertEqual(len(response.json()["results"]), 5)
+        self.assertIsNone(response.json()["next_cursor"])
+
+    def test_api_pages_with_cursors(self):
+        user = User.objects.create_superuser(email="api@example.com", username="api", password="password")
+        self.client.force_login(user)
+        url = reverse("cities:city_api")
+
+        first = self.client.get(url, {"limit": 5}).json()
+        second = self.client.get(url, {"limit": 5, "cursor": first["next_cursor"]}).json()
+
+        self.assertEqual(len(first["cities"]) + len(second["cities"]), 8)
+        self.assertIsNone(second["next_cursor"])
+        self.assertEqual(first["cities"][0]["name"], "Cidade 0")
+        self.assertEqual(self.client.get(url, {"sort": "latitude"}).status_code, 400)
+
+    @override_settings(STORAGES={
+        "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+        "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    })
+    def test_list_view_links_pages_by_cursor(self):
+        user = User.objects.create_superuser(email="list@example.com", username="list", password="password")
+        self.client.force_login(user)
+
+        response = self.client.get(reverse("cities:city_list"), {"sort": "seaf_category"})
+
+        self.assertTrue(response.context["page_obj"].is_keyset)
+        self.assertEqual(len(response.context["cities"]), 8)
+
+
+class CityFacetTests(MunicipalitySearchTestCase):
+    """
+    This class is responsible for testing the cached result and facet counts of the city list.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.sao_paulo.is_capital = True
+        self.sao_paulo.seaf_category = 1
+        self.sao_paulo.mayor_party = "MDB"
+        self.sao_paulo.save()
+
+    def _facets(self, **params):
+        filters = CityFilters.from_query(params)
+        return get_facets(filters.apply(Municipality.objects.all()), filters, None)
+
+    def test_counts_every_facet_in_one_cached_query(self):
+        with self.assertNumQueries(1):
+            facets = self._facets(search="São")
+        with self.assertNumQueries(0):
+            self.assertEqual(self._facets(search="  sao "), facets)
+
+        self.assertEqual(facets["total"], 2)
+        self.assertEqual(facets["seaf_category"], {1: 1, None: 1})
+        self.assertEqual(facets["is_capital"], {True: 1, False: 1})
+        self.assertEqual(facets["state_id"], {self.sao_paulo.state_id: 2})
+        self.assertEqual(facets["mayor_party"], {"MDB": 1, None: 1})
+
+    def test_municipality_writes_invalidate_counts(self):
+        self.assertEqual(self._facets(is_capital="true")["total"], 1)
+
+        self.sao_jose.is_capital = True
+        self.sao_jose.save()
+
+        self.assertEqual(self._facets(is_capital="true")["total"], 2)
+
+    @override_settings(STORAGES={
+        "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+        "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    })
+    def test_list_view_reuses_cached_total(self):
+        user = User.objects.create_superuser(email="facets@example.com", username="facets", password="password")
+        self.client.force_login(user)
+        url = reverse("cities:city_list")
+        self.client.get(url, {"page": 1})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"page": 1})
+
+        self.assertEqual(response.context["paginator"].count, 3)
+        self.assertEqual(response.context["facets"]["capitals"], 1)
+        self.assertFalse(any("COUNT(" in query["sql"] for query in queries))
+
+
+class MunicipalityWikiProfileTests(MunicipalitySearchTestCase):
+    """
+    This class is responsible for testing the edit form across Municipality and its Wikipedia profile.
+    """
+
+    def _post(self, municipality, **changes):
+        form = MunicipalityEditForm(instance=Municipality.objects.get(pk=municipality.pk))
+        data = {name: value for name, value in form.initial.items() if value is not None}
+        data.update(changes)
+        return MunicipalityEditForm(data, instance=Municipality.objects.get(pk=municipality.pk))
+
+    def test_profile_is_created_only_when_wiki_data_is_entered(self):
+        form = self._post(self.sao_jose, mayor_party="PL")
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        self.assertFalse(MunicipalityWikiProfile.objects.filter(municipality=self.sao_jose).exists())
+
+        form = self._post(self.sao_jose, wiki_demonym="joseense", wiki_website="sjc.sp.gov.br")
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+
+        profile = MunicipalityWikiProfile.objects.get(municipality=self.sao_jose)
+        self.assertEqual((profile.wiki_demonym, profile.wiki_website), ("joseense", "sjc.sp.gov.br"))
+        self.assertEqual(Municipality.objects.get(pk=self.sao_jose.pk).mayor_party, "PL")
+
+    def test_existing_profile_fills_initial_and_tracks_changes(self):
+        MunicipalityWikiProfile.objects.create(municipality=self.sao_paulo, wiki_demonym="paulistano")
+
+        form = self._post(self.sao_paulo, wiki_demonym="paulistana")
+
+        self.assertEqual(form.initial["wiki_demonym"], "paulistano")
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.changed_data, ["wiki_demonym"])
+        form.save()
+        self.assertEqual(MunicipalityWikiProfile.objects.get(pk=self.sao_paulo.pk).wiki_demonym, "paulistana")
+
+
+class MunicipalityIndicatorTests(MunicipalitySearchTestCase):
+    """
+    This class is responsible for testing the typed indicator columns parsed from Wikipedia strings.
+    """
+
+    def test_parses_pt_br_numbers_units_and_scales(self):
+        cases = {
+            "12.325.232 hab. (IBGE/2020)": Decimal("12325232"),
+            "1 521,11 km²": Decimal("1521.11"),
+            "7.398,26 hab./km²": Decimal("7398.26"),
+            "0,805 (muito alto)": Decimal("0.805"),
+            "0.62": Decimal("0.62"),
+            "R$ 699,28 bilhões": Decimal("699280000000"),
+            "R$ 56.584,26": Decimal("56584.26"),
+            "760 m": Decimal("760"),
+            "1,2 mil": Decimal("1200"),
+            "—": None,
+        }
+        for text, expected in cases.items():
+            with self.subTest(text=text):
+                self.assertEqual(parse_decimal(text), expected)
+
+    def test_profile_saves_fill_and_deletes_clear_indicators(self):
+        profile = MunicipalityWikiProfile.objects.create(
+            municipality=self.sao_paulo,
+            wiki_population="11.451.999",
+            wiki_idh="0,805",
+            wiki_gdp="R$ 828,9 bilhões",
+        )
+        self.sao_paulo.refresh_from_db()
+        self.assertEqual(self.sao_paulo.population, 11451999)
+        self.assertEqual(self.sao_paulo.idh, Decimal("0.805"))
+        self.assertEqual(self.sao_paulo.gdp, Decimal("828900000000.00"))
+
+        profile.delete()
+        self.sao_paulo.refresh_from_db()
+        self.assertIsNone(self.sao_paulo.population)
+
+    def test_backfill_command_parses_existing_profiles(self):
+        MunicipalityWikiProfile.objects.create(municipality=self.sao_jose, wiki_population="697.054")
+        Municipality.objects.filter(pk=self.sao_jose.pk).update(population=None)
+
+        call_command("parse_wiki_indicators", stdout=StringIO())
+
+        self.assertEqual(Municipality.objects.get(pk=self.sao_jose.pk).population, 697054)
+
+    def test_api_filters_and_sorts_by_indicator(self):
+        MunicipalityWikiProfile.objects.create(municipality=self.sao_paulo, wiki_population="11.451.999")
+        MunicipalityWikiProfile.objects.create(municipality=self.sao_jose, wiki_population="697.054")
+        MunicipalityWikiProfile.objects.create(municipality=self.paulo_de_faria, wiki_population="8.900")
+        user = User.objects.create_superuser(email="ind@example.com", username="ind", password="password")
+        self.client.force_login(user)
+
+        response = self.client.get(
+            reverse("cities:city_api"), {"sort": "-population", "population_min": "10000", "limit": 1}
+        ).json()
+        following = self.client.get(
+            reverse("cities:city_api"),
+            {"sort": "-population", "population_min": "10000", "limit": 1, "cursor": response["next_cursor"]}
+        ).json()
+
+        self.assertEqual([city["name"] for city in response["cities"]], ["São Paulo"])
+        self.assertEqual([city["name"] for city in following["cities"]], ["São José dos Campos"])
+        self.assertIsNone(following["next_cursor"])
+
+
+class MunicipalityExportTestCase(MunicipalitySearchTestCase):
+    """
+    This class is responsible for setting up a user allowed to download one municipality.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(email="export@example.com", username="export", password="password")
+        group = Group.objects.create(name="Export scope")
+        self.user.groups.add(group)
+        GroupResourcePermission.objects.create(
+            group=group,
+            resource_permission=ResourcePermission.objects.create(
+                name="Download City", codename="download_cities_city", permission_type="download",
+                resource_name="cities.city"
+            ),
+            scope_level="municipality",
+            scope_id=self.sao_paulo.id,
+        )
+        self.client.force_login(self.user)
+        self.url = reverse("cities:download_cities")
+
+
+class MunicipalityExportTests(MunicipalityExportTestCase):
+    """
+    This class is responsible for testing the streaming municipality exports.
+    """
+
+    def test_csv_streams_selected_columns_in_scope(self):
+        response = self.client.get(self.url, {"format": "csv", "columns": "code,name,mayor_name"})
+
+        self.assertTrue(response.streaming)
+        content = b"".join(response.streaming_content).decode("utf-8-sig")
+        self.assertEqual(content.splitlines(), ["Código IBGE,Município,Prefeito", "3550308,São Paulo,Ricardo Nunes"])
+
+    def test_jsonl_and_xlsx_apply_list_filters(self):
+        User.objects.filter(pk=self.user.pk).update(is_superuser=True)
+
+        response = self.client.get(self.url, {"format": "jsonl", "search": "paulo"})
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)["name"] for line in lines], ["Paulo de Faria", "São Paulo"])
+
+        response = self.client.get(self.url, {"format": "xlsx", "columns": "code,population", "search": "jose"})
+        sheet = load_workbook(BytesIO(b"".join(response.streaming_content))).active
+        self.assertEqual(list(sheet.values), [("Código IBGE", "População"), ("3549904", None)])
+
+    def test_rejects_unknown_columns_and_formats(self):
+        self.assertEqual(self.client.get(self.url, {"columns": "code,password"}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"format": "pdf"}).status_code, 400)
+
+
+class ExportArtifactTests(MunicipalityExportTestCase):
+    """
+    This class is responsible for testing that full exports are served from the pre-built files.
+    """
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_full_export_redirects_to_immutable_scope_file(self):
+        manifest = build_artifacts()
+        key = scope_key([("municipality", self.sao_paulo.id)])
+        self.assertEqual(set(manifest["files"]), {"all", key})
+
+        response = self.client.get(self.url, {"format": "csv", "columns": "all"})
+        self.assertRedirects(
+            response,
+            reverse("cities:download_artifact", args=[manifest["version"], f"municipios-{key}.csv"]),
+            fetch_redirect_response=False
+        )
+
+        response = self.client.get(response["Location"])
+        self.assertEqual(response["Cache-Control"], "private, max-age=31536000, immutable")
+        content = b"".join(response.streaming_content).decode("utf-8-sig").splitlines()
+        self.assertEqual(len(content), 2)
+        self.assertTrue(content[1].startswith("3550308,São Paulo"))
+
+        not_modified = self.client.get(response.wsgi_request.path, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(not_modified.status_code, 304)
+        other_scope = reverse("cities:download_artifact", args=[manifest["version"], "municipios-all.csv"])
+        self.assertEqual(self.client.get(other_scope).status_code, 404)
+
+    def test_filtered_or_unbuilt_exports_are_generated(self):
+        response = self.client.get(self.url, {"format": "csv", "columns": "all"})
+        self.assertTrue(response.streaming)
+        # Unbuilt yet, or never built where pyarrow is missing
+        parquet = self.client.get(self.url, {"format": "parquet", "columns": "all"})
+        self.assertEqual(parquet.status_code, 503 if "parquet" in ARTIFACT_FORMATS else 501)
+
+        build_artifacts()
+        response = self.client.get(self.url, {"format": "csv", "columns": "all", "search": "paulo"})
+        self.assertTrue(response.streaming)
+
+    def test_outdated_manifests_fall_back_to_streaming(self):
+        build_artifacts()
+        params = {"format": "csv", "columns": "all"}
+        self.assertEqual(self.client.get(self.url, params).status_code, 302)
+
+        # A write the builder has not caught up with yet
+        self.sao_paulo.mayor_name = "Outro Prefeito"
+        self.sao_paulo.save()
+        response = self.client.get(self.url, params)
+        self.assertTrue(response.streaming)
+        self.assertIn("Outro Prefeito", b"".join(response.streaming_content).decode("utf-8-sig"))
+
+        build_artifacts()
+        self.assertEqual(self.client.get(self.url, params).status_code, 302)
+        with override_settings(EXPORT_ARTIFACT_MAX_AGE=0):
+            self.assertTrue(self.client.get(self.url, params).streaming)
+
+    def test_watcher_survives_failed_builds_and_republishes(self):
+        messages = []
+        with mock.patch("apps.cities.artifacts.build_artifacts", side_effect=OSError("disk full")), \
+                mock.patch("apps.cities.artifacts.time.sleep"):
+            watch_artifacts(log=messages.append, iterations=2)
+        self.assertEqual(len([message for message in messages if "disk full" in message]), 2)
+
+        manifest = build_artifacts()
+        bump_dataset_version()
+        with mock.patch("apps.cities.artifacts.time.sleep"):
+            watch_artifacts(iterations=1)
+        republished = read_manifest()
+        self.assertEqual(republished["version"], manifest["version"])
+        self.assertNotEqual(republished["dataset_version"], manifest["dataset_version"])
+        self.assertEqual(self.client.get(self.url, {"format": "csv", "columns": "all"}).status_code, 302)
+
+    def test_fingerprint_follows_exported_data(self):
+        version = dataset_fingerprint()
+        Municipality.objects.filter(pk=self.sao_paulo.pk).update(mayor_name="Outro Prefeito")
+        self.assertNotEqual(dataset_fingerprint(), version)
+
+
+class SeafPayloadTests(MunicipalitySearchTestCase):
+    """
+    This class is responsible for testing the pre-encoded SEAF map payload.
+    """
+
+    def setUp(self):
+        super().setUp()
+        Municipality.objects.filter(pk__in=[self.sao_paulo.pk, self.sao_jose.pk]).update(seaf_category=2)
+        self.user = User.objects.create_superuser(email="map@example.com", username="map", password="password")
+        self.client.force_login(self.user)
+        self.url = reverse("cities:seaf_data_api")
+
+    def test_payload_is_encoded_once_and_negotiated(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        data = json.loads(gzip.decompress(response.content))
+        self.assertEqual(set(data), {"3550308", "3549904"})
+        self.assertTrue(response["ETag"].endswith('-gzip"'))
+        self.assertEqual(data["3550308"]["mayor_name"], "Ricardo Nunes")
+
+        # Session and user lookups only
+        with self.assertNumQueries(2):
+            plain = self.client.get(self.url)
+        self.assertNotIn("Content-Encoding", plain)
+        self.assertEqual(json.loads(plain.content), data)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=plain["ETag"]).status_code, 304)
+        self.assertNotEqual(plain["ETag"], response["ETag"])
+        # A cached identity body does not validate the gzip representation
+        revalidated = self.client.get(self.url, HTTP_IF_NONE_MATCH=plain["ETag"], HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(revalidated.status_code, 200)
+        self.assertEqual(
+            self.client.get(self.url, HTTP_IF_NONE_MATCH=f'W/{response["ETag"]}', HTTP_ACCEPT_ENCODING="gzip").status_code,
+            304
+        )
+
+    def test_relevant_writes_publish_a_new_version(self):
+        etag = self.client.get(self.url)["ETag"]
+        self.sao_paulo.mayor_data_updated_at = None
+        self.sao_paulo.save(update_fields=["mayor_data_updated_at"])
+        self.assertEqual(self.client.get(self.url)["ETag"], etag)
+
+        self.sao_paulo.mayor_party = "MDB"
+        self.sao_paulo.save(update_fields=["mayor_party"])
+        response = self.client.get(self.url)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(json.loads(response.content)["3550308"]["mayor_party"], "MDB")
+
+    def test_columnar_and_binary_formats_carry_the_same_rows(self):
+        Municipality.objects.filter(pk=self.sao_paulo.pk).update(mayor_party="PSD")
+
+        columnar = json.loads(self.client.get(self.url, {"format": "columnar"}).content)
+        self.assertEqual(columnar, {
+            "codes": [3549904, 3550308],
+            "names": ["São José dos Campos", "São Paulo"],
+            "categories": [2, 2],
+            "mayor_names": ["", "Ricardo Nunes"],
+            "parties": ["PSD"],
+            "mayor_parties": [0, 1],
+        })
+
+        response = self.client.get(self.url, {"format": "binary"})
+        self.assertEqual(response["Content-Type"], "application/octet-stream")
+        body = response.content
+        magic, count, party_count, _ = struct.unpack_from("<4sIII", body)
+        self.assertEqual((magic, count, party_count), (b"SEAF", 2, 1))
+        self.assertEqual(struct.unpack_from("<2I2H2B", body, 16), (3549904, 404, 0, 1, 2, 2))
+        self.assertEqual(body[30:].decode().split("\n"), ["PSD", "São José dos Campos", "São Paulo", "", "Ricardo Nunes"])
+
+        self.assertEqual(self.client.get(self.url, {"format": "xml"}).status_code, 400)
+
+    def test_binary_format_sends_out_of_range_categories_as_uncategorized(self):
+        rows = [("3549904", "São José dos Campos", 300, None, None), ("3550308", "São Paulo", -1, None, None)]
+        body = seaf_binary(rows)
+        self.assertEqual(struct.unpack_from("<2B", body, 16 + 2 * 6), (0, 0))
+
+    def test_negotiation_honours_quality_values(self):
+        self.assertEqual(negotiate_encoding("br;q=0, gzip", {"br": b"", "gzip": b""}), "gzip")
+        self.assertEqual(negotiate_encoding("*", {"identity": b"", "gzip": b""}), "gzip")
+        self.assertEqual(negotiate_encoding("gzip;q=0", {"identity": b"", "gzip": b""}), "identity")
+
+
+class MunicipalityApiTests(MunicipalitySearchTestCase):
+    """
+    This class is responsible for testing the municipality read API.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(email="api@example.com", username="api", password="password")
+        group = Group.objects.create(name="API scope")
+        self.user.groups.add(group)
+        view_perm = ResourcePermission.objects.create(
+            name="View City", codename="view_cities_city", permission_type="view", resource_name="cities.city"
+        )
+        for municipality in (self.sao_paulo, self.sao_jose):
+            GroupResourcePermission.objects.create(
+                group=group, resource_permission=view_perm, scope_level="municipality", scope_id=municipality.id
+            )
+        MunicipalityWikiProfile.objects.create(municipality=self.sao_paulo, wiki_demonym="paulistano")
+        self.client.force_login(self.user)
+        self.url = reverse("cities:municipalities_api")
+
+    def test_pages_scoped_rows_with_selected_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {"fields": "code,wiki_demonym", "limit": 1})
+        page_query = queries.captured_queries[-1]["sql"]
+        self.assertNotIn('"mayor_name"', page_query)
+        self.assertEqual(response.json()["results"], [{"code": "3549904", "wiki_demonym": None}])
+
+        response = self.client.get(self.url, {"fields": "code,wiki_demonym", "cursor": response.json()["next_cursor"]})
+        self.assertEqual(response.json()["results"], [{"code": "3550308", "wiki_demonym": "paulistano"}])
+        self.assertIsNone(response.json()["next_cursor"])
+
+        response = self.client.get(self.url, {"search": "paulo", "sort": "-name"})
+        self.assertEqual([row["name"] for row in response.json()["results"]], ["São Paulo"])
+
+    def test_etag_revalidates_until_data_changes(self):
+        etag = self.client.get(self.url)["ETag"]
+        with self.assertNumQueries(2):  # session and user only
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.sao_jose.mayor_name = "Anderson Farias"
+        self.sao_jose.save(update_fields=["mayor_name"])
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_rejects_unknown_fields_and_sorts(self):
+        self.assertEqual(self.client.get(self.url, {"fields": "code,search_text"}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"sort": "search_text"}).status_code, 400)
+
+    def test_bulk_lookup_keeps_input_order_and_reports_misses(self):
+        url = reverse("cities:municipality_lookup_api")
+        codes = ["3550308", "9999999", 3549904, "3536208", "3550308"]
+
+        with self.assertNumQueries(4):  # session, user, permission set and the code__in query
+            response = self.client.post(
+                url, {"codes": codes, "fields": ["name", "wiki_demonym"]}, content_type="application/json"
+            )
+        sao_paulo = {"name": "São Paulo", "wiki_demonym": "paulistano"}
+        self.assertEqual(response.json(), {
+            "results": [sao_paulo, None, {"name": "São José dos Campos", "wiki_demonym": None}, None, sao_paulo],
+            # Paulo de Faria exists but is outside the user's scope
+            "missing": ["9999999", "3536208"],
+        })
+
+        self.assertEqual(self.client.post(url, {"codes": "3550308"}, content_type="application/json").status_code, 400)
+        self.assertEqual(self.client.get(url).status_code, 405)
+
+
+class SeafRollupTests(MunicipalitySearchTestCase):
+    """
+    This class is responsible for testing the incrementally maintained SEAF rollups.
+    """
+
+    def setUp(self):
+        # Run the rebuild the hierarchy creation schedules, as TestCase never commits
+        with self.captureOnCommitCallbacks(execute=True):
+            super().setUp()
+
+    def _totals(self):
+        return sorted(SeafRollup.objects.values_list(
+            "level", "node_id", "municipalities", "categorized", "category_1", "category_2", "seaf_sum", "average"
+        ))
+
+    def test_writes_update_every_ancestor_like_a_rebuild(self):
+        self.sao_paulo.seaf_category = 1
+        self.sao_paulo.save()
+        self.sao_jose.seaf_category = 2
+        self.sao_jose.save(update_fields=["seaf_category"])
+        self.sao_paulo.seaf_category = 2
+        self.sao_paulo.save(update_fields=["seaf_category"])
+        self.paulo_de_faria.delete()
+
+        totals = self._totals()
+        self.assertEqual(len(totals), 4)
+        self.assertEqual(
+            SeafRollup.objects.filter(level="state").values_list("municipalities", "categorized", "category_2", "average").get(),
+            (2, 2, 2, 2.0)
+        )
+        rebuild_seaf_rollups()
+        self.assertEqual(self._totals(), totals)
+
+    def test_hierarchy_changes_rebuild_once_per_transaction(self):
+        self.sao_paulo.seaf_category = 1
+        self.sao_paulo.save()
+        state = State.objects.get(code="35")
+        with mock.patch("apps.cities.rollups.rebuild_seaf_rollups", wraps=rebuild_seaf_rollups) as rebuild:
+            with self.captureOnCommitCallbacks(execute=True):
+                other = IntermediateRegion.objects.create(code="3502", name="Campinas", state=state)
+                immediate = self.sao_paulo.immediate_region
+                immediate.intermediate_region = other
+                immediate.save()
+            self.assertEqual(rebuild.call_count, 1)
+            self.assertEqual(
+                SeafRollup.objects.filter(level="intermediateregion").values_list("node_id", "municipalities").get(),
+                (other.id, 3)
+            )
+
+            with self.captureOnCommitCallbacks(execute=True):
+                state.delete()
+            self.assertEqual(rebuild.call_count, 2)
+        self.assertFalse(SeafRollup.objects.exists())
+
+    def test_rolled_back_changes_do_not_suppress_the_next_rebuild(self):
+        state = State.objects.get(code="35")
+        with mock.patch("apps.cities.rollups.rebuild_seaf_rollups") as rebuild:
+            with self.captureOnCommitCallbacks(execute=True):
+                with self.assertRaises(RuntimeError), transaction.atomic():
+                    IntermediateRegion.objects.create(code="3502", name="Campinas", state=state)
+                    raise RuntimeError
+            self.assertEqual(rebuild.call_count, 0)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                IntermediateRegion.objects.create(code="3503", name="Sorocaba", state=state)
+            self.assertEqual(rebuild.call_count, 1)
+
+    def test_endpoints_read_the_rollups(self):
+        Municipality.objects.filter(pk=self.sao_paulo.pk).update(seaf_category=1)
+        Municipality.objects.filter(pk=self.sao_jose.pk).update(seaf_category=2)
+        call_command("rebuild_seaf_rollups", stdout=StringIO())
+        user = User.objects.create_superuser(email="rollup@example.com", username="rollup", password="password")
+        self.client.force_login(user)
+
+        response = self.client.get(reverse("cities:seaf_rollup_api", args=["intermediateregion"]))
+        self.assertEqual(response.json()["nodes"], [{
+            "id": self.sao_paulo.immediate_region.intermediate_region_id,
+            "code": "3501",
+            "name": "São Paulo",
+            "municipalities": 3,
+            "categorized": 2,
+            "categories": {"1": 1, "2": 1, "3": 0, "4": 0},
+            "sum": 3,
+            "average": 1.5,
+        }])
+        self.assertEqual(self.client.get(reverse("cities:seaf_rollup_api", args=["municipality"])).status_code, 400)
+
+        response = self.client.get(reverse("cities:seaf_data_by_state_api"))
+        self.assertEqual(response.json(), {"35": {"name": "São Paulo", "avg_category": 1.5, "total_municipalities": 2}})
+
+    def test_state_totals_are_scoped_to_the_user_grants(self):
+        Municipality.objects.filter(pk=self.sao_paulo.pk).update(seaf_category=1)
+        call_command("rebuild_seaf_rollups", stdout=StringIO())
+        user = User.objects.create_user(email="nogrants@example.com", username="nogrants", password="password")
+        self.client.force_login(user)
+
+        self.assertEqual(self.client.get(reverse("cities:seaf_data_by_state_api")).json(), {})
+        self.assertEqual(self.client.get(reverse("cities:seaf_data_api")).json(), {})
+
+
+class PivotApiTests(MunicipalitySearchTestCase):
+    """
+    This class is responsible for testing the crosstab endpoint.
+    """
+
+    def setUp(self):
+        super().setUp()
+        Municipality.objects.filter(pk=self.sao_paulo.pk).update(seaf_category=1, is_capital=True, mayor_party="PSD")
+        Municipality.objects.filter(pk=self.sao_jose.pk).update(seaf_category=2, mayor_party="PSD", population=700000)
+        Municipality.objects.filter(pk=self.paulo_de_faria.pk).update(seaf_category=2, population=9000)
+        user = User.objects.create_superuser(email="pivot@example.com", username="pivot", password="password")
+        self.client.force_login(user)
+        self.url = reverse("cities:pivot_api")
+
+    def test_crosstab_in_one_cached_query(self):
+        params = {"rows": "party", "columns": "seaf_category"}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, params)
+        self.assertEqual(len([query for query in queries if "GROUP BY" in query["sql"]]), 1)
+        self.assertEqual(response.json()["row_keys"], ["PSD", None])
+        self.assertEqual(response.json()["column_keys"], [1, 2])
+        self.assertEqual(response.json()["values"], [[1, 1], [None, 1]])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url, params)
+        self.assertFalse([query for query in queries if "GROUP BY" in query["sql"]])
+
+    def test_measure_aggregates_and_filters(self):
+        response = self.client.get(self.url, {"rows": "state", "aggregate": "avg", "measure": "population"})
+        self.assertEqual(response.json()["row_keys"], ["SP"])
+        self.assertEqual(response.json()["values"], [354500.0])
+
+        response = self.client.get(self.url, {"rows": "is_capital", "search": "sao"})
+        self.assertEqual(response.json()["row_keys"], [False, True])
+        self.assertEqual(response.json()["values"], [1, 1])
+
+    def test_states_missing_from_the_hierarchy_snapshot_are_labelled_by_id(self):
+        snapshot = geo_hierarchy.get()
+        region = Region.objects.create(code="NE", name="Nordeste")
+        state = State.objects.create(code="29", name="Bahia", abbreviation="BA", region=region)
+        intermediate = IntermediateRegion.objects.create(code="2901", name="Salvador", state=state)
+        immediate = ImmediateRegion.objects.create(code="290001", name="Salvador", intermediate_region=intermediate)
+        Municipality.objects.create(code="2927408", name="Salvador", immediate_region=immediate)
+
+        with mock.patch("apps.cities.pivots.geo_hierarchy.get", return_value=snapshot):
+            response = self.client.get(self.url, {"rows": "state"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["row_keys"], [str(state.id), "SP"])
+
+    def test_rejects_dimensions_and_measures_outside_the_whitelist(self):
+        self.assertEqual(self.client.get(self.url, {"rows": "mayor_name"}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"rows": "state", "columns": "state"}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"rows": "state", "aggregate": "sum", "measure": "code"}).status_code, 400)
+
+
+class JsonSerializationTests(TestCase):
+    data = {"name": "São Paulo", "area": Decimal("1521.11"), "founded": date(1554, 1, 25), "categories": {1: 2}}
+
+    def test_fast_and_fallback_encoders_agree(self):
+        encoded = serialization.dumps(self.data)
+        with mock.patch.object(serialization, "orjson", None):
+            fallback = serialization.dumps(self.data)
+        self.assertIsInstance(encoded, bytes)
+        self.assertEqual(json.loads(encoded), json.loads(fallback))
+        self.assertEqual(
+            json.loads(encoded),
+            {"name": "São Paulo", "area": "1521.11", "founded": "1554-01-25", "categories": {"1": 2}}
+        )
+
+    def test_record_mapper_pairs_keys_with_row_values(self):
+        mapper = serialization.record_mapper(iter(["code", "it's \"quoted\"", "}"]))
+        self.assertEqual(mapper(("1", 2, None)), {"code": "1", "it's \"quoted\"": 2, "}": None})
+        self.assertEqual(mapper(("2", 3, 4)), {"code": "2", "it's \"quoted\"": 3, "}": 4})
+
+    def test_streams_records_in_batches(self):
+        mapper = serialization.record_mapper(["code", "name"])
+        rows = [(str(code), f"City {code}") for code in range(1201)]
+        with mock.patch.object(serialization, "STREAM_BATCH_SIZE", 500):
+            chunks = list(serialization.stream_json_array(map(mapper, rows), prefix=b'{"cities":[', suffix=b"]}"))
+            lines = b"".join(serialization.stream_json_lines(map(mapper, rows[:3]))).splitlines()
+        self.assertEqual(len(chunks), 5)
+        self.assertEqual(json.loads(b"".join(chunks))["cities"][1200], {"code": "1200", "name": "City 1200"})
+        self.assertEqual([json.loads(line)["code"] for line in lines], ["0", "1", "2"])
@@ -1,4 +1,4 @@
-from django.urls import path
+from django.urls import path, re_path
 from . import views
 
 app_name = 'cities'
@@ -6,9 +6,19 @@ app_name = 'cities'
 urlpatterns = [
     path('', views.CityListView.as_view(), name='city_list'),
     path('download/', views.download_cities, name='download_cities'),
+    re_path(
+        r'^download/(?P<version>[0-9a-f]{16})/(?P<filename>municipios-[0-9a-z]+\.(?:csv|jsonl|xlsx|parquet))$',
+        views.download_artifact,
+        name='download_artifact'
+    ),
     path('edit/<int:city_id>/', views.edit_city, name='edit_city'),
     path('api/', views.city_api, name='city_api'),
+    path('api/municipalities/', views.municipalities_api, name='municipalities_api'),
+    path('api/municipalities/lookup/', views.municipality_lookup_api, name='municipality_lookup_api'),
+    path('api/autocomplete/', views.autocomplete_api, name='autocomplete_api'),
     path('api/seaf-data/', views.seaf_data_api, name='seaf_data_api'),
     path('api/seaf-data-by-state/', views.seaf_data_by_state_api, name='seaf_data_by_state_api'),
+    path('api/pivot/', views.pivot_api, name='pivot_api'),
+    path('api/seaf-rollup/<str:level>/', views.seaf_rollup_api, name='seaf_rollup_api'),
 ]
 
@@ -4,6 +4,12 @@ This management command is responsible for loading initial fixture data in the c
 from django.core.management.base import BaseCommand
 from django.core.management import call_command
 
+from apps.cities.closure import rebuild_geo_closure
+from apps.cities.facets import bump_dataset_version
+from apps.cities.models import sync_hierarchy_columns
+from apps.cities.rollups import rebuild_seaf_rollups
+from apps.cities.search import sync_search_columns
+
 
 class Command(BaseCommand):
     help = 'Load initial data fixtures in the correct order'
@@ -31,6 +37,12 @@ class Command(BaseCommand):
             self.stdout.write('Loading cities data (regions, states, municipalities)...')
             try:
                 call_command('loaddata', 'cities_initial_data.json', verbosity=1)
+                # loaddata bypasses Model.save(), so fill the denormalized hierarchy and search columns here
+                sync_hierarchy_columns()
+                rebuild_geo_closure()
+                sync_search_columns()
+                rebuild_seaf_rollups()
+                bump_dataset_version()
                 self.stdout.write(self.style.SUCCESS('✓ Cities data loaded successfully'))
             except Exception as e:
                 self.stdout.write(self.style.ERROR(f'✗ Failed to load cities data: {e}'))
@@ -0,0 +1,95 @@
+"""
+This module is responsible for the JSON serialization shared by every JSON endpoint.
+Rows are read as `.values_list()` tuples and turned into records by record_mapper(), then
+encoded straight to bytes with orjson when installed, or the stdlib encoder otherwise; both
+produce the same document for the types the endpoints return.
+"""
+import json
+from decimal import Decimal
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.utils.functional import Promise
+
+try:
+    import orjson
+except ImportError:  # optional, the stdlib encoder is the fallback
+    orjson = None
+
+# Records per chunk in streaming mode
+STREAM_BATCH_SIZE = 500
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+
+    def _default(value):
+        # Decimals and lazy translations are sent as strings, as DjangoJSONEncoder does
+        if isinstance(value, (Decimal, Promise)):
+            return str(value)
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(data):
+    """
+    This function is responsible for encoding `data` as compact UTF-8 JSON bytes.
+    """
+    if orjson is not None:
+        return orjson.dumps(data, default=_default, option=_ORJSON_OPTIONS)
+    return json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def record_mapper(keys):
+    """
+    This function is responsible for a function turning a row tuple into a {key: value} record,
+    for rows selected with `.values_list()` in the order of `keys`.
+    """
+    keys = tuple(keys)
+
+    def record(row):
+        return dict(zip(keys, row))
+
+    return record
+
+
+class FastJsonResponse(HttpResponse):
+    """
+    This class is responsible for a JSON response encoded by dumps(), a drop-in for JsonResponse.
+    """
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
+
+
+def stream_json_array(items, prefix=b'[', suffix=b']'):
+    """
+    This function is responsible for streaming a JSON array of `items` (any iterable, e.g. a
+    queryset iterator mapped to records) in chunks of STREAM_BATCH_SIZE encoded items, so memory
+    stays flat however long the array. `prefix` and `suffix` wrap it, e.g. b'{"cities":[' and b']}'.
+    """
+    yield prefix
+    batch = []
+    separator = b''
+    for item in items:
+        batch.append(dumps(item))
+        if len(batch) == STREAM_BATCH_SIZE:
+            yield separator + b','.join(batch)
+            separator, batch = b',', []
+    if batch:
+        yield separator + b','.join(batch)
+    yield suffix
+
+
+def stream_json_lines(items):
+    """
+    This function is responsible for streaming `items` as JSON Lines, in chunks of STREAM_BATCH_SIZE.
+    """
+    batch = []
+    for item in items:
+        batch.append(dumps(item))
+        if len(batch) == STREAM_BATCH_SIZE:
+            yield b'\n'.join(batch) + b'\n'
+            batch = []
+    if batch:
+        yield b'\n'.join(batch) + b'\n'
+
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+# Served through ASGI: see ASGI_DEPLOYMENT in settings
+os.environ.setdefault("DJANGO_ASGI", "True")
 
 application = get_asgi_application()
@@ -60,6 +60,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "apps.core",
     "apps.cities",
     "apps.auth",
@@ -96,6 +97,10 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "config.wsgi.application"
 
+# True when served through config/asgi.py, which sets DJANGO_ASGI; views with both sync and
+# async handlers (e.g. the permission check APIs) then run async
+ASGI_DEPLOYMENT = os.environ.get('DJANGO_ASGI', 'False') == 'True'
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -116,6 +121,28 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Production should point this at a backend shared by all Gunicorn workers and background
+# commands: the compose files use Redis with maxmemory-policy volatile-lru, which only evicts
+# entries with a TTL, so the version tokens (stored without one) outlive every versioned entry.
+# File and local-memory caches cull entries at random past MAX_ENTRIES, tokens included, so
+# size it above the key volume (a few keys per user plus per-filter counts) when using them.
+
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get('CACHE_BACKEND', "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+if not CACHES["default"]["BACKEND"].endswith('RedisCache'):
+    # Redis passes OPTIONS to its connection pool instead
+    CACHES["default"]["OPTIONS"] = {'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 50000))}
+
+# Cache alias holding compiled resource permission sets (see apps.auth.permissions)
+PERMISSION_CACHE_ALIAS = 'default'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -165,6 +192,14 @@ STORAGES = {
 MEDIA_URL = os.environ.get('MEDIA_URL', '/media/')
 MEDIA_ROOT = os.environ.get('MEDIA_ROOT', '/vol/web/media')
 
+# Internal location that maps to MEDIA_ROOT/exports/ on a fronting proxy that honours
+# X-Accel-Redirect (e.g. '/protected-exports/'); empty means Django sends the files itself
+EXPORT_ACCEL_REDIRECT_PREFIX = os.environ.get('EXPORT_ACCEL_REDIRECT_PREFIX', '')
+
+# Seconds a pre-built export manifest stays usable without the builder re-verifying it; past
+# that, downloads stream from the database until build_export_artifacts publishes again
+EXPORT_ARTIFACT_MAX_AGE = int(os.environ.get('EXPORT_ARTIFACT_MAX_AGE', 60 * 60 * 24))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -25,6 +25,9 @@ echo "✓ Static files collected"
 python manage.py migrate
 echo "✓ Database migrations applied"
 
+python manage.py expire_permissions
+echo "✓ Expired permissions swept"
+
 # Load initial data if database is empty
 # Check if Region table has data
 echo "Checking if initial data needs to be loaded..."
@@ -47,6 +50,27 @@ if [ -n "$DJANGO_SUPERUSER_USERNAME" ] && [ -n "$DJANGO_SUPERUSER_EMAIL" ] && [
     python manage.py createsuperuser --noinput 2>/dev/null && echo "✓ Superuser created" || echo "✓ Superuser already exists"
 fi
 
+# Keep sweeping expired permissions every 5 minutes, restarting the sweeper if it ever exits
+(
+    while true; do
+        python manage.py expire_permissions --watch --interval 300
+        echo "⚠ Expired permission sweeper exited; restarting in 30s"
+        sleep 30
+    done
+) &
+echo "✓ Expired permission sweeper started"
+
+# Build the pre-generated exports in the background and keep them current,
+# restarting the watcher if it ever exits (downloads stream from the database meanwhile)
+(
+    while true; do
+        python manage.py build_export_artifacts --watch
+        echo "⚠ Export artifact builder exited; restarting in 30s"
+        sleep 30
+    done
+) &
+echo "✓ Export artifact builder started"
+
 echo "✅ Initialization complete"
 echo ""
 